@@ -0,0 +1,60 @@
+"""
+Analytics computations for RestaurantFlow_bhatiyani
+
+Pure functions over plain order dicts, so they can run inline, in a
+background job worker process, or over a slice of a larger dataset.
+"""
+
+from collections import Counter
+
+from store import order_total
+
+EXCLUDED_STATUSES = ("cancelled",)
+
+
+def item_counts(order):
+    """Yield ``(item name, quantity)`` for an order's items."""
+    if order.get("order_items"):
+        for line in order["order_items"]:
+            yield line.get("name", line.get("menu_item_id")), line.get("quantity", 1)
+        return
+    for ref in order.get("items") or ():
+        if isinstance(ref, str):
+            yield ref, 1
+        else:
+            yield ref.get("name", ref.get("menu_item_id")), ref.get("quantity", 1)
+
+
+def _selected(orders, restaurant_id=None):
+    return (
+        o for o in orders
+        if o["status"] not in EXCLUDED_STATUSES and restaurant_id in (None, o["restaurant_id"])
+    )
+
+
+def popular_items(orders, restaurant_id=None, limit=10):
+    """Most ordered items over the full history, in ``analytics_data`` format"""
+    counts = Counter()
+    for order in _selected(orders, restaurant_id):
+        for name, quantity in item_counts(order):
+            counts[name] += quantity
+    return [{"name": name, "orders": count} for name, count in counts.most_common(limit)]
+
+
+def monthly_sales(orders, restaurant_id=None):
+    """Orders, revenue and average order value per calendar month"""
+    months = {}
+    for order in _selected(orders, restaurant_id):
+        month = (order.get("created_at") or "unknown")[:7]
+        entry = months.setdefault(month, [0, 0.0])
+        entry[0] += 1
+        entry[1] += order_total(order)
+    return [
+        {
+            "month": month,
+            "orders": count,
+            "revenue": round(revenue, 2),
+            "average_order_value": round(revenue / count, 2),
+        }
+        for month, (count, revenue) in sorted(months.items())
+    ]
@@ -0,0 +1,359 @@
+"""
+Columnar archive for historical orders in RestaurantFlow_bhatiyani
+
+Finished orders never change, so they are moved out of the in-memory store
+into compressed column files partitioned by month::
+
+    <archive dir>/month=2024-08/part-<timestamp>.rfcol
+
+Each file starts with a JSON header holding the row count and, per column,
+its type, byte range and min/max statistics; the column blocks follow,
+zlib-compressed (numbers as packed arrays, anything else as JSON). Readers
+skip whole months and files whose statistics cannot match the query and
+decompress only the columns they need.
+
+An ``OrderArchive`` reads every header once when it opens and keeps them,
+so pruning (and a lookup that misses) never touches files it skips. It also
+keeps per-restaurant totals of the archived orders, so reports over the
+store can include them without reading any files.
+"""
+
+import bisect
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+
+from store import COMPLETED_STATUSES, order_total
+
+MAGIC = b"RFCOL1\n"
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+def _column_type(values):
+    if all(type(v) is int for v in values):
+        return "int"
+    if all(type(v) in (int, float) for v in values):
+        return "float"
+    return "json"
+
+
+def _encode(kind, values):
+    if kind == "int":
+        raw = array("q", values).tobytes()
+    elif kind == "float":
+        raw = array("d", values).tobytes()
+    else:
+        raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, 6)
+
+
+def _decode(kind, blob):
+    raw = zlib.decompress(blob)
+    if kind == "int":
+        values = array("q")
+        values.frombytes(raw)
+        return values.tolist()
+    if kind == "float":
+        values = array("d")
+        values.frombytes(raw)
+        return values.tolist()
+    return json.loads(raw)
+
+
+def _stats(values):
+    comparable = [v for v in values if isinstance(v, (int, float, str)) and not isinstance(v, bool)]
+    if not comparable or len({type(v) is str for v in comparable}) > 1:
+        return None, None
+    return min(comparable), max(comparable)
+
+
+def write_column_file(path, rows):
+    """Write ``rows`` (dicts) as a column file; returns the header."""
+    names = sorted({key for row in rows for key in row})
+    header = {"rows": len(rows), "columns": {}}
+    blobs = []
+    offset = 0
+    for name in names:
+        values = [row.get(name) for row in rows]
+        kind = _column_type(values)
+        blob = _encode(kind, values)
+        low, high = _stats(values)
+        header["columns"][name] = {"type": kind, "offset": offset, "length": len(blob), "min": low, "max": high}
+        blobs.append(blob)
+        offset += len(blob)
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(encoded)))
+        f.write(encoded)
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return header
+
+
+class ColumnFile:
+    """Reads selected columns of one archive file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.month = os.path.basename(os.path.dirname(path))[len("month="):]
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an archive column file")
+            (length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+            self.header = json.loads(f.read(length))
+            self._data_start = len(MAGIC) + _HEADER_LENGTH.size + length
+            self.size = os.fstat(f.fileno()).st_size
+
+    @property
+    def rows(self):
+        return self.header["rows"]
+
+    def stats(self, column):
+        meta = self.header["columns"].get(column)
+        return (meta["min"], meta["max"]) if meta else (None, None)
+
+    def read(self, columns):
+        """Return ``{column: values}``; absent columns come back as all None."""
+        result = {}
+        with open(self.path, "rb") as f:
+            for name in columns:
+                meta = self.header["columns"].get(name)
+                if meta is None:
+                    result[name] = [None] * self.rows
+                    continue
+                f.seek(self._data_start + meta["offset"])
+                result[name] = _decode(meta["type"], f.read(meta["length"]))
+        return result
+
+
+def _overlaps(low, high, start, end):
+    if low is None or high is None:
+        return True
+    return (start is None or high >= start) and (end is None or low <= end)
+
+
+class ArchiveTotals:
+    """Orders and revenue of archived orders per restaurant and status.
+
+    ``restaurants`` maps restaurant id -> status -> ``(orders, revenue in
+    cents)``. ``version`` is the store version these totals go with: a
+    snapshot older than it may still hold some of the orders counted here.
+    Immutable; ``plus`` returns a new instance.
+    """
+
+    __slots__ = ("version", "restaurants")
+
+    def __init__(self, version=0, restaurants=None):
+        self.version = version
+        self.restaurants = restaurants or {}
+
+    def plus(self, orders, version):
+        restaurants = dict(self.restaurants)
+        copied = set()
+        for order in orders:
+            restaurant_id = order["restaurant_id"]
+            if restaurant_id not in copied:
+                restaurants[restaurant_id] = dict(restaurants.get(restaurant_id, {}))
+                copied.add(restaurant_id)
+            by_status = restaurants[restaurant_id]
+            count, cents = by_status.get(order["status"], (0, 0))
+            by_status[order["status"]] = (count + 1, cents + int(round(order_total(order) * 100)))
+        return ArchiveTotals(version, restaurants)
+
+
+def _written_order(column_file):
+    # part-<time_ns>.rfcol; files written together share a stamp
+    return os.path.basename(column_file.path), column_file.month
+
+
+class OrderArchive:
+    """Month-partitioned column files of archived orders."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # Every file, in the order it was written; replaced, never mutated, on append
+        self._catalog = tuple(sorted(self._load(), key=_written_order))
+        # Serializes archive runs with building the totals, so no order is counted twice
+        self._lock = threading.Lock()
+        self._totals = None
+
+    def _load(self):
+        for entry in sorted(os.listdir(self.directory)):
+            if not entry.startswith("month="):
+                continue
+            partition = os.path.join(self.directory, entry)
+            for name in sorted(os.listdir(partition)):
+                if name.endswith(".rfcol"):
+                    yield ColumnFile(os.path.join(partition, name))
+
+    def append(self, orders):
+        """Write ``orders`` into one new file per month; returns the file paths."""
+        by_month = {}
+        for order in orders:
+            by_month.setdefault((order.get("created_at") or "unknown")[:7], []).append(order)
+        paths = []
+        stamp = time.time_ns()
+        for month, rows in sorted(by_month.items()):
+            partition = os.path.join(self.directory, f"month={month}")
+            os.makedirs(partition, exist_ok=True)
+            path = os.path.join(partition, f"part-{stamp}.rfcol")
+            write_column_file(path, sorted(rows, key=lambda o: o["id"]))
+            paths.append(path)
+        self._catalog = self._catalog + tuple(ColumnFile(path) for path in paths)
+        return paths
+
+    def _files(self, start=None, end=None):
+        for column_file in self._catalog:
+            # Partition pruning: months are compared as YYYY-MM prefixes
+            if (start and column_file.month < start[:7]) or (end and column_file.month > end[:7]):
+                continue
+            yield column_file
+
+    def scan(self, columns=None, start=None, end=None, restaurant_id=None):
+        """Yield archived orders (as dicts of ``columns``) matching the filters.
+
+        ``start`` / ``end`` are inclusive ``YYYY-MM-DD`` bounds on
+        ``created_at``. Files whose min/max statistics rule out a match are
+        skipped without decompressing anything.
+        """
+        end_bound = end + "\uffff" if end else None
+        for column_file in self._files(start, end):
+            if not _overlaps(*column_file.stats("created_at"), start, end_bound):
+                continue
+            if restaurant_id is not None and not _overlaps(*column_file.stats("restaurant_id"), restaurant_id, restaurant_id):
+                continue
+            wanted = list(columns) if columns else list(column_file.header["columns"])
+            needed = list(dict.fromkeys(wanted + ["created_at", "restaurant_id"]))
+            data = column_file.read(needed)
+            for i in range(column_file.rows):
+                created = data["created_at"][i] or ""
+                if start and created < start or end_bound and created > end_bound:
+                    continue
+                if restaurant_id is not None and data["restaurant_id"][i] != restaurant_id:
+                    continue
+                yield {name: data[name][i] for name in wanted}
+
+    def find(self, order_id):
+        """The archived order with ``order_id``, or None."""
+        return self.find_many([order_id]).get(order_id)
+
+    def find_many(self, order_ids):
+        """``{order_id: archived order}`` for those of ``order_ids`` in the archive.
+
+        Files whose id range rules them all out are skipped; in the others the
+        sorted id column is searched before any other column is decoded. An
+        order archived more than once comes back as its latest copy.
+        """
+        wanted = sorted(set(order_ids))
+        found = {}
+        if not wanted:
+            return found
+        for column_file in self._files():
+            if not _overlaps(*column_file.stats("id"), wanted[0], wanted[-1]):
+                continue
+            ids = column_file.read(["id"])["id"]
+            rows = []
+            for order_id in wanted[bisect.bisect_left(wanted, ids[0]):bisect.bisect_right(wanted, ids[-1])]:
+                index = bisect.bisect_left(ids, order_id)
+                if ids[index] == order_id:
+                    rows.append(index)
+            if not rows:
+                continue
+            data = column_file.read(list(column_file.header["columns"]))
+            for index in rows:
+                # Keys the order did not have were stored as None
+                found[ids[index]] = {name: values[index] for name, values in data.items() if values[index] is not None}
+        return found
+
+    def totals(self, store):
+        """``ArchiveTotals`` for the archived orders that have left ``store``.
+
+        Built from the files on first use, then kept up to date by
+        ``archive_orders``.
+        """
+        totals = self._totals
+        if totals is not None:
+            return totals
+        with self._lock:
+            if self._totals is None:
+                latest = {}
+                for order in self.scan(["id", "restaurant_id", "status", "total", "total_amount"]):
+                    latest[order["id"]] = order
+                # One caught mid-archive is still counted with the store
+                archived = [o for o in latest.values() if store.get_order(o["id"]) is None]
+                self._totals = ArchiveTotals().plus(archived, store.snapshot().version)
+            return self._totals
+
+    def stats(self):
+        months = {}
+        for column_file in self._files():
+            entry = months.setdefault(column_file.month, {"files": 0, "orders": 0, "bytes": 0})
+            entry["files"] += 1
+            entry["orders"] += column_file.rows
+            entry["bytes"] += column_file.size
+        return dict(sorted(months.items()))
+
+
+def order_history(live, archive, is_live, columns=None, start=None, end=None, restaurant_id=None):
+    """``live`` orders plus archived ones, filtered and projected to ``columns``.
+
+    ``is_live(order_id)`` tells whether an order is still in the store: one
+    caught mid-archive exists in both places, and the store's copy wins.
+    Of an order archived more than once, the latest copy wins.
+    """
+    hot = [
+        o for o in live
+        if restaurant_id in (None, o["restaurant_id"])
+        and (not start or (o.get("created_at") or "") >= start)
+        and (not end or (o.get("created_at") or "")[:10] <= end)
+    ]
+    if columns:
+        hot = [{c: o.get(c) for c in columns} for o in hot]
+    if archive is None:
+        return hot
+    archived = archive.scan(list(dict.fromkeys(list(columns) + ["id"])) if columns else None,
+                            start, end, restaurant_id)
+    latest = {}
+    for order in archived:
+        latest[order["id"]] = order
+    archived = [o for o in latest.values() if not is_live(o["id"])]
+    if columns and "id" not in columns:
+        archived = [{c: o[c] for c in columns} for o in archived]
+    return archived + hot
+
+
+def archive_orders(store, archive, cutoff):
+    """Move finished orders created before ``cutoff`` (YYYY-MM-DD) into the archive.
+
+    The archive file is durable before the orders leave the store; if the
+    process dies in between, the orders exist in both and readers prefer the
+    store's copy. The next run finds them archived already and only removes
+    them. An order updated while it was being archived stays in the store,
+    and a later run archives its new version. The archive's totals take in
+    exactly the orders removed.
+    """
+    finished = [
+        o for o in store.list_orders()
+        if o["status"] in COMPLETED_STATUSES and (o.get("created_at") or "") < cutoff
+    ]
+    if not finished:
+        return 0
+    with archive._lock:
+        archived = archive.find_many(o["id"] for o in finished)
+        fresh = [o for o in finished if archived.get(o["id"]) != {k: v for k, v in o.items() if v is not None}]
+        if fresh:
+            archive.append(fresh)
+        removed = store.remove_orders([o["id"] for o in finished], expected={o["id"]: o for o in finished})
+        if archive._totals is not None:
+            archive._totals = archive._totals.plus(removed, store.snapshot().version)
+    return len(removed)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Performance Benchmarks for RestaurantFlow_bhatiyani
+Measures the backend data layer at production-like sizes
+"""
+
+import argparse
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from array import array
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chain_analytics import STATUSES, ChainAnalytics, ColumnEncoder, OrderColumns, merge
+from datagen import SyntheticData, write_store
+from geo import GeoIndex
+from store import DataStore
+from wal import WriteAheadLog
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_RESTAURANTS = [
+    {"id": i, "name": f"Restaurant {i}", "address": f"{i} Main St", "phone": "555-0000", "cuisine": "Mixed"}
+    for i in range(1, 51)
+]
+
+
+def benchmark_wal(args):
+    """Write throughput with group commit, then recovery time"""
+    directory = args.dir or tempfile.mkdtemp(prefix="restaurantflow-wal-")
+    print(f"📁 WAL directory: {directory}")
+    try:
+        journal = WriteAheadLog(directory, checkpoint_every=args.checkpoint_every)
+        journal.recover()
+        store = DataStore(SAMPLE_RESTAURANTS, journal=journal)
+
+        per_thread = args.orders // args.threads
+
+        def writer(worker):
+            for i in range(per_thread):
+                store.create_order({
+                    "restaurant_id": (worker * per_thread + i) % len(SAMPLE_RESTAURANTS) + 1,
+                    "customer_name": f"Customer {i}",
+                    "status": "pending",
+                    "total": 25.0,
+                    "items": ["Butter Chicken", "Naan"],
+                    "created_at": "2024-08-05T10:30:00Z",
+                })
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        written = per_thread * args.threads
+        print(f"✍️  Wrote {written:,} orders with {args.threads} threads in {elapsed:.2f}s "
+              f"({written / elapsed:,.0f} orders/s, every write fsynced)")
+
+        start = time.perf_counter()
+        store.checkpoint()
+        print(f"📸 Checkpoint of {written:,} orders took {time.perf_counter() - start:.2f}s")
+
+        # Leave a log tail behind the snapshot, as after a crash
+        tail = min(args.tail, written)
+        for i in range(tail):
+            store.update_order(i + 1, {"status": "completed"})
+        journal.close()
+
+        start = time.perf_counter()
+        journal = WriteAheadLog(directory, checkpoint_every=args.checkpoint_every)
+        recovered = DataStore(**journal.recover(), journal=journal)
+        elapsed = time.perf_counter() - start
+        journal.close()
+        print(f"♻️  Recovered {len(recovered.list_orders()):,} orders (snapshot + {tail:,} log records) "
+              f"in {elapsed:.2f}s")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def _benchmark_column_build(args, rng):
+    """Column build from a store, as the endpoint does it: first build and after a write"""
+    orders = [
+        {"id": i, "restaurant_id": rng.randint(1, args.restaurants), "status": rng.choice(STATUSES),
+         "total": rng.randrange(500, 9000) / 100}
+        for i in range(1, args.store_orders + 1)
+    ]
+    store = DataStore(SAMPLE_RESTAURANTS, orders, [])
+    del orders
+    encoder = ColumnEncoder()
+    start = time.perf_counter()
+    columns = encoder.columns(store.snapshot())
+    first = time.perf_counter() - start
+    columns.close()
+    store.update_order(1, {"status": "delivered"})
+    store.create_order({"restaurant_id": 1, "status": "pending", "total": 12.5})
+    start = time.perf_counter()
+    columns = encoder.columns(store.snapshot())
+    again = time.perf_counter() - start
+    start = time.perf_counter()
+    ChainAnalytics(None, workers=1).reduce(columns)
+    reduced = time.perf_counter() - start
+    columns.close()
+    print(f"🧱 Columns from a {args.store_orders:,}-order store: first build {first:.2f}s, "
+          f"after two writes {again * 1000:.1f}ms; inline reduce {reduced * 1000:.1f}ms")
+
+
+def benchmark_chain(args):
+    """Sharded chain analytics over synthetic columns, by worker count"""
+    rng = random.Random(args.seed)
+    if args.store_orders:
+        _benchmark_column_build(args, rng)
+    start = time.perf_counter()
+    # Skewed restaurant sizes: a few flagships, a long tail of small sites
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(args.restaurants)]
+    scale = args.orders / sum(weights)
+    offsets = array('q', [0])
+    for weight in weights:
+        offsets.append(offsets[-1] + int(weight * scale))
+    rows = offsets[-1]
+    prices = array('q', (rng.randrange(500, 9000) for _ in range(4096)))
+    revenue = array('q', (prices[i & 4095] for i in range(rows)))
+    status = bytes(rng.choices(range(len(STATUSES)), weights=(5, 2, 3, 2, 40, 45, 3), k=rows))
+    columns = OrderColumns(array('q', range(1, args.restaurants + 1)), offsets, revenue, status, STATUSES)
+    del revenue, status
+    print(f"🧱 Built {rows:,} synthetic order rows over {args.restaurants:,} restaurants "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    max_workers = args.workers or os.cpu_count() or 1
+    try:
+        baseline = None
+        workers = 1
+        while workers <= max_workers:
+            chain = ChainAnalytics(None, workers=workers, inline_rows=0)
+            if workers > 1:
+                chain.reduce(columns)  # warm up the pool
+            start = time.perf_counter()
+            report = merge(chain.reduce(columns), columns.statuses)
+            elapsed = time.perf_counter() - start
+            chain.close()
+            baseline = baseline or elapsed
+            print(f"⚙️  {workers:>3} worker(s): {elapsed:.2f}s ({baseline / elapsed:.2f}x), "
+                  f"revenue {report['revenue']:,.2f}")
+            workers *= 2
+    finally:
+        columns.close()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get(port, path, timeout=300):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=timeout) as response:
+        return response.read()
+
+
+def _memory_kb(pid):
+    """(RSS, PSS) in kB; PSS splits shared pages between the processes using them"""
+    values = {}
+    for name, key in ((f"/proc/{pid}/status", "VmRSS:"), (f"/proc/{pid}/smaps_rollup", "Pss:")):
+        try:
+            with open(name) as f:
+                values[key] = next((int(line.split()[1]) for line in f if line.startswith(key)), 0)
+        except OSError:
+            values[key] = 0
+    return values["VmRSS:"], values["Pss:"]
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    return sorted(children)
+
+
+def benchmark_startup(args):
+    """Time to first request and memory under gunicorn, lazy vs preloaded"""
+    base = tempfile.mkdtemp(prefix="restaurantflow-startup-")
+    try:
+        seed = os.path.join(base, "seed")
+        start = time.perf_counter()
+        write_store(SyntheticData(args.orders, seed=args.seed), seed)
+        print(f"🧪 Generated {args.orders:,} orders in {time.perf_counter() - start:.2f}s")
+        for mode in ('lazy', 'preload'):
+            wal_dir = os.path.join(base, mode)
+            shutil.copytree(seed, wal_dir)
+            port = _free_port()
+            # Repeated requests must not trip rate limits
+            env = dict(os.environ, WAL_DIR=wal_dir, PORT=str(port), WEB_CONCURRENCY='1',
+                       PRELOAD_APP='1' if mode == 'preload' else '0',
+                       RATE_LIMIT_PER_CLIENT='100000', RATE_LIMIT_BURST='100000')
+            start = time.perf_counter()
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', 'main:create_app()', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+                cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                while True:
+                    try:
+                        _get(port, '/health', timeout=5)
+                        break
+                    except OSError:
+                        if server.poll() is not None:
+                            raise SystemExit(f"❌ gunicorn exited with status {server.returncode}")
+                        time.sleep(0.05)
+                ready = time.perf_counter() - start
+                timings = []
+                for path in ('/api/restaurants', '/api/menu-items/1', '/api/analytics?approx=1'):
+                    started = time.perf_counter()
+                    _get(port, path)
+                    timings.append(f"{path} {(time.perf_counter() - started) * 1000:,.0f}ms")
+                print(f"🚀 {mode:>7}: first request after {ready:.2f}s; first {', '.join(timings)}")
+                # Settle memory after the worker has built what it lazily needs
+                for _ in range(4):
+                    for path in ('/api/restaurants', '/api/menu-items/1', '/api/analytics?approx=1'):
+                        _get(port, path)
+                master_rss, master_pss = _memory_kb(server.pid)
+                print(f"   master RSS {master_rss / 1024:,.0f} MiB, PSS {master_pss / 1024:,.0f} MiB")
+                for worker in _children(server.pid):
+                    rss, pss = _memory_kb(worker)
+                    print(f"   worker {worker} RSS {rss / 1024:,.0f} MiB, PSS {pss / 1024:,.0f} MiB")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+def benchmark_geo(args):
+    """Nearby search and delivery zone checks over many restaurants"""
+    store = DataStore(SyntheticData(0, restaurants=args.restaurants, days=1, seed=args.seed).restaurants, [], [])
+    start = time.perf_counter()
+    index = GeoIndex(store)
+    print(f"🗺️  Indexed {len(index):,} restaurants in {time.perf_counter() - start:.2f}s")
+    rng = random.Random(args.seed)
+    points = [(40.7128 + rng.uniform(-0.2, 0.2), -74.0060 + rng.uniform(-0.25, 0.25)) for _ in range(args.queries)]
+    for radius in (1.0, 5.0, 20.0):
+        start = time.perf_counter()
+        for lat, lon in points:
+            index.nearby(lat, lon, radius, limit=20)
+        elapsed = time.perf_counter() - start
+        print(f"📍 nearby r={radius:g}km: {elapsed / len(points) * 1000:.3f} ms/query")
+    start = time.perf_counter()
+    for lat, lon in points:
+        index.delivering_to(lat, lon, limit=20)
+    print(f"🛵 delivering_to: {(time.perf_counter() - start) / len(points) * 1000:.3f} ms/query")
+    ids = [rng.randint(1, args.restaurants) for _ in points]
+    start = time.perf_counter()
+    for rid, (lat, lon) in zip(ids, points):
+        index.delivers(rid, lat, lon)
+    print(f"✅ delivers: {(time.perf_counter() - start) / len(points) * 1000:.4f} ms/check")
+
+
+def main():
+    """Main function with CLI arguments"""
+    parser = argparse.ArgumentParser(description='RestaurantFlow Performance Benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    wal = subparsers.add_parser('wal', help='Write-ahead log throughput and recovery time')
+    wal.add_argument('--orders', type=int, default=1_000_000, help='Orders to write (default: 1000000)')
+    wal.add_argument('--threads', type=int, default=16, help='Concurrent writer threads (default: 16)')
+    wal.add_argument('--tail', type=int, default=100_000, help='Log records after the snapshot (default: 100000)')
+    wal.add_argument('--checkpoint-every', type=int, default=10**9, help='Automatic checkpoint interval')
+    wal.add_argument('--dir', help='WAL directory to keep (default: temporary)')
+    wal.set_defaults(func=benchmark_wal)
+
+    chain = subparsers.add_parser('chain', help='Sharded chain analytics scaling by worker count')
+    chain.add_argument('--orders', type=int, default=10_000_000, help='Synthetic order rows (default: 10000000)')
+    chain.add_argument('--restaurants', type=int, default=5000, help='Restaurants (default: 5000)')
+    chain.add_argument('--workers', type=int, default=0, help='Largest worker count (default: CPU count)')
+    chain.add_argument('--store-orders', type=int, default=1_000_000,
+                       help='Orders in a store for timing the column build (default: 1000000, 0 skips)')
+    chain.add_argument('--seed', type=int, default=42)
+    chain.set_defaults(func=benchmark_chain)
+
+    startup = subparsers.add_parser('startup', help='Gunicorn time to first request and memory')
+    startup.add_argument('--orders', type=int, default=200_000, help='Orders in the store (default: 200000)')
+    startup.add_argument('--seed', type=int, default=42)
+    startup.set_defaults(func=benchmark_startup)
+
+    geo = subparsers.add_parser('geo', help='Nearby search and delivery zone check latency')
+    geo.add_argument('--restaurants', type=int, default=100_000, help='Restaurants (default: 100000)')
+    geo.add_argument('--queries', type=int, default=2000, help='Queries per measurement (default: 2000)')
+    geo.add_argument('--seed', type=int, default=42)
+    geo.set_defaults(func=benchmark_geo)
+
+    args = parser.parse_args()
+    print(f"⏱️  RestaurantFlow benchmark: {args.benchmark}")
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Chain-wide analytics for RestaurantFlow_bhatiyani
+
+Orders are laid out as columns (revenue in cents, status code) sorted by
+restaurant, with an offsets index marking each restaurant's row range. The
+columns live in one shared memory block, so pool workers attach to it by name
+instead of receiving pickled orders. Each worker reduces a shard of
+restaurants (a contiguous row range) with C-level ``sum`` / ``bytes.count``
+over memoryview slices, and the parent merges the per-restaurant partials,
+together with the totals of orders that have moved to the archive.
+
+Columns are encoded per store order chunk and the encodings are kept between
+builds. A write replaces only the chunk it touches, so rebuilding after
+writes re-encodes a few chunks and concatenates the rest at C speed.
+"""
+
+import atexit
+import bisect
+import multiprocessing
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from analytics import EXCLUDED_STATUSES
+from store import ORDER_STATUSES, order_total
+
+STATUSES = ORDER_STATUSES
+
+
+class OrderColumns:
+    """Columnar orders in a shared memory block.
+
+    Layout: ``restaurant_ids`` int64[r], ``offsets`` int64[r + 1],
+    ``revenue`` int64[n] (cents, 0 for excluded statuses), ``status`` uint8[n].
+    """
+
+    def __init__(self, restaurant_ids, offsets, revenue, status, statuses, version=None):
+        self.rows = len(status)
+        self.restaurants = len(restaurant_ids)
+        self.statuses = tuple(statuses)
+        self.version = version
+        self.offsets = offsets
+        self.restaurant_ids = restaurant_ids
+        # ``revenue`` may be an int64 array or its raw bytes
+        parts = [restaurant_ids.tobytes(), offsets.tobytes(), bytes(revenue), bytes(status)]
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, sum(len(p) for p in parts)))
+        self._owner_pid = os.getpid()
+        position = 0
+        for part in parts:
+            self.shm.buf[position:position + len(part)] = part
+            position += len(part)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Build columns from a store snapshot, one partition at a time."""
+        return ColumnEncoder().columns(snapshot)
+
+    def describe(self):
+        """Picklable handle that workers use to attach to the block."""
+        return (self.shm.name, self.restaurants, self.rows)
+
+    def shards(self, count):
+        """Split restaurants into ``count`` ranges holding similar row counts."""
+        bounds = [0]
+        for i in range(1, count):
+            target = self.rows * i // count
+            bounds.append(max(bounds[-1], min(self.restaurants, bisect.bisect_left(self.offsets, target))))
+        bounds.append(self.restaurants)
+        return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+    def close(self):
+        self.shm.close()
+        # A worker forked from a preloading master inherits the block; the master removes it
+        if os.getpid() == self._owner_pid:
+            self.shm.unlink()
+
+
+class ColumnEncoder:
+    """Builds ``OrderColumns`` from snapshots, reusing encoded order chunks.
+
+    Store partitions keep orders in persistent chunks (``OrderChunks``): a
+    write copies the one chunk it changes and shares the rest with the
+    previous snapshot. Encodings are cached by chunk identity, so only new
+    chunks are walked in Python. Status codes only ever grow, so cached
+    encodings stay valid.
+    """
+
+    def __init__(self):
+        self._codes = {status: code for code, status in enumerate(STATUSES)}
+        self.statuses = list(STATUSES)
+        self._chunks = {}  # id(chunk) -> (chunk, revenue bytes, status bytes); holding chunk keeps the id unique
+
+    def _encode(self, chunk):
+        codes = self._codes
+        revenue, status = array("q"), bytearray()
+        for order in chunk:
+            code = codes.get(order["status"])
+            if code is None:
+                code = codes[order["status"]] = len(self.statuses)
+                self.statuses.append(order["status"])
+            status.append(code)
+            excluded = order["status"] in EXCLUDED_STATUSES
+            revenue.append(0 if excluded else int(round(order_total(order) * 100)))
+        return chunk, revenue.tobytes(), bytes(status)
+
+    def columns(self, snapshot):
+        cached = self._chunks
+        live = {}
+        restaurant_ids, offsets = array("q"), array("q", [0])
+        revenue, status = [], []
+        rows = 0
+        for restaurant_id in sorted(snapshot.partitions):
+            for chunk in snapshot.partitions[restaurant_id].orders.chunks:
+                entry = cached.get(id(chunk))
+                if entry is None or entry[0] is not chunk:
+                    entry = self._encode(chunk)
+                live[id(chunk)] = entry
+                revenue.append(entry[1])
+                status.append(entry[2])
+                rows += len(chunk)
+            restaurant_ids.append(restaurant_id)
+            offsets.append(rows)
+        self._chunks = live
+        return OrderColumns(restaurant_ids, offsets, b"".join(revenue), b"".join(status), self.statuses, snapshot.version)
+
+
+def _views(buf, restaurants, rows):
+    mv = memoryview(buf)
+    ids_end = restaurants * 8
+    offsets_end = ids_end + (restaurants + 1) * 8
+    revenue_end = offsets_end + rows * 8
+    return (
+        mv[:ids_end].cast("q"),
+        mv[ids_end:offsets_end].cast("q"),
+        mv[offsets_end:revenue_end].cast("q"),
+        mv[revenue_end:revenue_end + rows],
+    )
+
+
+def _reduce(buf, restaurants, rows, status_count, first, last):
+    ids, offsets, revenue, status = _views(buf, restaurants, rows)
+    partials = []
+    for r in range(first, last):
+        a, b = offsets[r], offsets[r + 1]
+        codes = status[a:b].tobytes()
+        partials.append((ids[r], b - a, sum(revenue[a:b]), [codes.count(c) for c in range(status_count)]))
+    return partials
+
+
+def reduce_shard(handle, status_count, first, last):
+    """Per-restaurant ``(id, orders, revenue_cents, status_counts)`` for a shard."""
+    name, restaurants, rows = handle
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # The views must be gone (with _reduce's frame) before the block is closed
+        return _reduce(shm.buf, restaurants, rows, status_count, first, last)
+    finally:
+        shm.close()
+
+
+def with_archived(partials, archived, statuses):
+    """Fold archived ``{restaurant_id: {status: (orders, revenue_cents)}}`` into
+    the partials; ``statuses`` is extended with any it did not have."""
+    codes = {status: code for code, status in enumerate(statuses)}
+    combined = {p[0]: [p[0], p[1], p[2], list(p[3])] for p in partials}
+    for restaurant_id, by_status in archived.items():
+        entry = combined.setdefault(restaurant_id, [restaurant_id, 0, 0, []])
+        for status, (count, cents) in by_status.items():
+            code = codes.get(status)
+            if code is None:
+                code = codes[status] = len(statuses)
+                statuses.append(status)
+            counts = entry[3]
+            counts.extend([0] * (code + 1 - len(counts)))
+            counts[code] += count
+            entry[1] += count
+            if status not in EXCLUDED_STATUSES:
+                entry[2] += cents
+    return [tuple(entry) for entry in combined.values()]
+
+
+def merge(partials, statuses, top=10, names=None):
+    """Combine per-restaurant partials into the chain report."""
+    names = names or {}
+    orders = sum(p[1] for p in partials)
+    revenue = sum(p[2] for p in partials)
+    status_counts = [0] * len(statuses)
+    for partial in partials:
+        for code, count in enumerate(partial[3]):
+            status_counts[code] += count
+    excluded = sum(status_counts[statuses.index(s)] for s in EXCLUDED_STATUSES if s in statuses)
+    billable = orders - excluded
+    best = sorted(partials, key=lambda p: (-p[2], p[0]))[:top]
+    return {
+        "restaurants_with_orders": len(partials),
+        "orders": orders,
+        "revenue": revenue / 100,
+        "average_order_value": round(revenue / 100 / billable, 2) if billable else 0,
+        "status_counts": {s: c for s, c in zip(statuses, status_counts) if c},
+        "top_restaurants": [
+            {"restaurant_id": p[0], "name": names.get(p[0]), "orders": p[1], "revenue": p[2] / 100}
+            for p in best
+        ],
+    }
+
+
+class ChainAnalytics:
+    """Shards chain-wide reductions across a process pool.
+
+    ``archived`` returns the archive's ``ArchiveTotals`` (or None); columns
+    older than those totals are rebuilt so no order is counted in both.
+    """
+
+    def __init__(self, store, workers=None, max_age=30.0, inline_rows=200_000, archived=None):
+        self._store = store
+        self._archived = archived
+        self.workers = workers or os.cpu_count() or 1
+        self.max_age = max_age
+        self.inline_rows = inline_rows
+        self._lock = threading.Lock()
+        self._encoder = ColumnEncoder()
+        self._columns = None
+        self._built_at = 0.0
+        self._executor = None
+        atexit.register(self.close)
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def columns(self, min_version=0):
+        """Current columns; rebuilt when the store changed and they are older than
+        ``max_age``, or when they predate ``min_version``."""
+        snapshot = self._store.snapshot()
+        stale = self._columns is None or self._columns.version < min_version or (
+            self._columns.version != snapshot.version and time.monotonic() - self._built_at > self.max_age
+        )
+        if stale:
+            if self._columns is not None:
+                self._columns.close()
+            self._columns = self._encoder.columns(snapshot)
+            self._built_at = time.monotonic()
+        return self._columns
+
+    def reduce(self, columns, workers=None):
+        """Per-restaurant partials, computed inline for small datasets."""
+        workers = workers or self.workers
+        handle = columns.describe()
+        status_count = len(columns.statuses)
+        if columns.rows <= self.inline_rows or workers == 1:
+            return reduce_shard(handle, status_count, 0, columns.restaurants)
+        # A few shards per worker keeps them busy when restaurants are skewed
+        shards = columns.shards(workers * 4)
+        pool = self._pool()
+        futures = [pool.submit(reduce_shard, handle, status_count, a, b) for a, b in shards]
+        return [p for future in futures for p in future.result()]
+
+    def report(self, top=10):
+        with self._lock:
+            archived = self._archived() if self._archived else None
+            columns = self.columns(archived.version if archived else 0)
+            partials = self.reduce(columns)
+            statuses = list(columns.statuses)
+            if archived:
+                partials = with_archived(partials, archived.restaurants, statuses)
+            names = {r["id"]: r.get("name") for r in self._store.snapshot().restaurants}
+            result = merge(partials, statuses, top, names)
+            result["data_version"] = columns.version
+            return result
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._columns is not None:
+            self._columns.close()
+            self._columns = None
@@ -0,0 +1,153 @@
+"""
+Change tracking for delta sync in RestaurantFlow_bhatiyani
+
+Every collection (orders, menu items, restaurants) keeps a change sequence
+number and, per row, the sequence of its last change. Rows are held in change
+order, so "what changed since N" walks back from the newest change and stops
+at N; only the tail it needs is copied while writers are held off, and the
+walk itself runs outside the lock. Deleted rows leave tombstones; once too many pile up the oldest are
+dropped and clients asking from before that point get a full resync.
+
+Sequence numbers start at the process start time in microseconds, so they
+keep increasing across restarts and can double as ETags. A process forked
+from one that built the log (a preloading gunicorn master) moves its
+sequences on to its own start time, so it never reuses an ETag another
+process handed out for different data.
+"""
+
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from itertools import islice
+
+COLLECTIONS = {"order": "orders", "menu_item": "menu_items", "restaurant": "restaurants"}
+
+
+class CollectionChanges:
+    """Change sequence numbers and tombstones for one collection."""
+
+    def __init__(self, rows, base_seq, tombstone_limit=10000):
+        self.seq = base_seq
+        self.horizon = base_seq  # deltas from before this need a full resync
+        self.tombstone_limit = tombstone_limit
+        self.tombstones = 0
+        self.entries = OrderedDict()  # id -> (changed seq, created seq, row or None)
+        for row in rows:
+            self.entries[row["id"]] = (base_seq, base_seq, row)
+
+    def record(self, row_id, row):
+        """Record an insert/update (``row``) or a delete (``row`` None)."""
+        self.seq += 1
+        previous = self.entries.pop(row_id, None)
+        if previous is not None and previous[2] is None:
+            self.tombstones -= 1
+        created = self.seq if previous is None or previous[2] is None else previous[1]
+        self.entries[row_id] = (self.seq, created, row)
+        if row is None:
+            self.tombstones += 1
+            if self.tombstones > self.tombstone_limit:
+                self._compact()
+
+    def _compact(self):
+        target = self.tombstone_limit // 2
+        for row_id, (seq, _, row) in list(self.entries.items()):
+            if self.tombstones <= target:
+                break
+            if row is None:
+                del self.entries[row_id]
+                self.tombstones -= 1
+                self.horizon = seq
+
+    def tail(self, seq):
+        """``(id, entry)`` pairs that may have changed after ``seq``, newest
+        first, or None if the client must resync fully.
+
+        Every change bumps ``self.seq``, so at most ``self.seq - seq`` entries
+        are newer; copying that many references is cheap enough to do under
+        the change log's lock.
+        """
+        if seq < self.horizon or seq > self.seq:
+            return None
+        return list(islice(reversed(self.entries.items()), self.seq - seq))
+
+    def since(self, seq):
+        """Changes after ``seq``, or None if the client must resync fully."""
+        tail = self.tail(seq)
+        return None if tail is None else split_changes(tail, seq)
+
+
+def split_changes(tail, seq):
+    """Sort a ``CollectionChanges.tail`` into created rows, updated rows and deleted ids."""
+    created, updated, deleted = [], [], []
+    for row_id, (changed, first_seen, row) in tail:
+        if changed <= seq:
+            break
+        if row is None:
+            deleted.append(row_id)
+        elif first_seen > seq:
+            created.append(row)
+        else:
+            updated.append(row)
+    return created[::-1], updated[::-1], deleted[::-1]
+
+
+class ChangeLog:
+    """Per-collection change tracking kept in step with the data store."""
+
+    def __init__(self, store, tombstone_limit=10000):
+        base_seq = time.time_ns() // 1000
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self.collections = {
+            "orders": CollectionChanges(store.list_orders(), base_seq, tombstone_limit),
+            "menu_items": CollectionChanges(store.list_menu_items(), base_seq, tombstone_limit),
+            "restaurants": CollectionChanges(store.list_restaurants(), base_seq, tombstone_limit),
+        }
+        store.subscribe(self._on_change)
+        restart = weakref.WeakMethod(self._restart)
+        os.register_at_fork(after_in_child=lambda: restart() and restart()())
+
+    def _restart(self):
+        """In a forked child: continue from a fresh base; older sequences need a full resync."""
+        base_seq = time.time_ns() // 1000
+        self._lock = threading.Lock()
+        self._bodies = {}
+        for changes in self.collections.values():
+            changes.seq = changes.horizon = max(base_seq, changes.seq + 1)
+
+    def _on_change(self, op, data, previous):
+        with self._lock:
+            if op == "order_deleted":
+                self.collections["orders"].record(data["id"], None)
+            elif op in COLLECTIONS:
+                self.collections[COLLECTIONS[op]].record(data["id"], data)
+
+    def seq(self, collection):
+        return self.collections[collection].seq
+
+    def etag(self, collection):
+        return f"{collection}-{self.seq(collection)}"
+
+    def since(self, collection, seq):
+        """``{"seq", "created", "updated", "deleted"}`` or None (resync needed)."""
+        with self._lock:
+            changes = self.collections[collection]
+            tail = changes.tail(seq)
+            current = changes.seq
+        if tail is None:
+            return None
+        # Writers only wait for the copy above, not for this walk
+        created, updated, deleted = split_changes(tail, seq)
+        return {"seq": current, "full": False, "created": created, "updated": updated, "deleted": deleted}
+
+    def body(self, collection, seq, rows):
+        """Encoded full list as of ``seq``; ``rows()`` runs only when it changed."""
+        cached = self._bodies.get(collection)
+        if cached is not None and cached[0] == seq:
+            return cached[1]
+        body = json.dumps(rows(), separators=(",", ":")).encode("utf-8")
+        self._bodies[collection] = (seq, body)
+        return body
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for RestaurantFlow_bhatiyani
+
+Produces db.json-shaped restaurants, menu items, orders and order items at
+production sizes. Output is deterministic for a given seed and arguments and
+is streamed one day at a time, so memory stays flat up to tens of millions of
+orders; ``--workers`` generates days in parallel without changing a byte.
+
+Popularity is skewed (Zipf-like) across restaurants, menu items and repeat
+customers; orders follow lunch/dinner peaks, busier weekends and slow growth
+over the period. Orders younger than about an hour at the end of the period
+are still in progress, everything older is delivered or cancelled.
+
+Usage:
+    python datagen.py --orders 1000000 --format ndjson --out data/
+    python datagen.py --orders 10000 --format json --out db.json
+    python datagen.py --orders 1000000 --format store --out ./wal  # then start with WAL_DIR=./wal
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import multiprocessing
+from bisect import bisect
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from geo import OfflineGeocoder
+from wal import SNAPSHOT_PREFIX
+
+CUISINES = {
+    "Italian": ["Margherita Pizza", "Spaghetti Carbonara", "Lasagna", "Risotto", "Bruschetta",
+                "Tiramisu", "Penne Arrabbiata", "Calzone", "Panna Cotta", "Minestrone"],
+    "Indian": ["Butter Chicken", "Naan", "Samosa", "Chicken Tikka", "Palak Paneer",
+               "Biryani", "Dal Makhani", "Mango Lassi", "Gulab Jamun", "Chana Masala"],
+    "Japanese": ["Salmon Nigiri", "California Roll", "Ramen", "Miso Soup", "Tempura",
+                 "Gyoza", "Teriyaki Chicken", "Edamame", "Mochi", "Udon"],
+    "American": ["Classic Cheeseburger", "Fries", "Buffalo Wings", "Caesar Salad", "Milkshake",
+                 "BBQ Ribs", "Onion Rings", "Mac & Cheese", "Apple Pie", "Club Sandwich"],
+    "Seafood": ["Fish & Chips", "Grilled Salmon", "Shrimp Scampi", "Clam Chowder", "Lobster Roll",
+                "Calamari", "Crab Cakes", "Oysters", "Key Lime Pie", "Seafood Paella"],
+    "Mexican": ["Tacos al Pastor", "Burrito", "Quesadilla", "Guacamole", "Nachos",
+                "Enchiladas", "Churros", "Elote", "Fajitas", "Horchata"],
+}
+CATEGORIES = ("main", "appetizer", "dessert", "beverage")
+FIRST_NAMES = ["John", "Jane", "Mike", "Sarah", "David", "Emma", "Raj", "Priya", "Carlos", "Ana",
+               "Wei", "Mei", "Omar", "Fatima", "Liam", "Olivia", "Noah", "Ava", "Kenji", "Yuki"]
+LAST_NAMES = ["Smith", "Johnson", "Patel", "Garcia", "Chen", "Kim", "Brown", "Singh", "Lopez", "Nguyen",
+              "Williams", "Khan", "Tanaka", "Rossi", "Martin", "Silva", "Ali", "Davis", "Moore", "Clark"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St", "Lake Blvd", "Hill St"]
+
+# Relative order volume per hour of day (UTC): lunch and dinner peaks
+HOURLY_WEIGHTS = (1, 1, 0, 0, 0, 1, 2, 4, 6, 5, 6, 14, 22, 16, 8, 6, 8, 14, 22, 24, 16, 9, 5, 2)
+HOURS_CUM = list(accumulate(HOURLY_WEIGHTS))
+# Monday .. Sunday
+WEEKDAY_WEIGHTS = (0.85, 0.85, 0.9, 0.95, 1.2, 1.3, 1.1)
+ORDER_TYPES = ("delivery", "pickup", "dine-in")
+ORDER_TYPE_WEIGHTS = (60, 30, 10)
+LINES_PER_ORDER = (1, 2, 3, 4, 5, 6)
+LINES_WEIGHTS = (30, 32, 20, 10, 5, 3)
+QUANTITIES = (1, 2, 3, 4)
+IN_PROGRESS = ((600, "pending"), (1200, "confirmed"), (2400, "preparing"), (3600, "ready"))
+CANCEL_RATE = 0.05
+PAYMENT_STATUS = {"delivered": "paid", "cancelled": "refunded"}
+
+_encode = json.JSONEncoder(separators=(",", ":"), check_circular=False).encode
+
+
+def _zipf_cumulative(n, exponent):
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def _iso(epoch):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+class SyntheticData:
+    """Deterministic generator for a restaurant chain's data."""
+
+    def __init__(self, orders, restaurants=None, customers=None, days=90,
+                 end=None, seed=42, skew=1.0):
+        self.order_count = orders
+        self.restaurant_count = restaurants or max(3, min(100_000, orders // 2000))
+        self.customer_count = customers or max(10, orders // 8)
+        self.days = days
+        self.end = end or datetime(2024, 8, 5, tzinfo=timezone.utc)
+        self.seed = seed
+        self.skew = skew
+        self._cached_tables = None
+        self._build_catalog()
+
+    def _build_catalog(self):
+        rng = random.Random(f"{self.seed}-catalog")
+        cuisines = sorted(CUISINES)
+        self.restaurants = []
+        self.menu_items = []
+        self._menus = []  # per restaurant: (item ids, names, price cents, prep minutes, cumulative weights)
+        opened = _iso((self.end - timedelta(days=self.days + 365)).timestamp())
+        geocoder = OfflineGeocoder()
+        for rid in range(1, self.restaurant_count + 1):
+            cuisine = cuisines[rng.randrange(len(cuisines))]
+            name = f"{rng.choice(LAST_NAMES)}'s {cuisine} Kitchen #{rid}"
+            address = f"{rng.randint(1, 9999)} {rng.choice(STREETS)}, Food City"
+            lat, lon = geocoder.geocode(address)
+            self.restaurants.append({
+                "id": rid,
+                "name": name,
+                "address": address,
+                "latitude": lat,
+                "longitude": lon,
+                "delivery_radius_km": rng.choice((3.0, 5.0, 5.0, 8.0)),
+                "phone": f"+1-555-{rid % 10000:04d}",
+                "email": f"info@restaurant{rid}.example.com",
+                "description": f"{cuisine} food, made to order",
+                "cuisine": cuisine,
+                "is_active": True,
+                "created_at": opened,
+                "updated_at": opened,
+            })
+            dishes = CUISINES[cuisine]
+            count = rng.randint(8, 30)
+            ids, names, prices, prep = [], [], [], []
+            for n in range(count):
+                dish = dishes[n % len(dishes)]
+                label = dish if n < len(dishes) else f"{dish} ({n // len(dishes) + 1})"
+                category = CATEGORIES[n % len(CATEGORIES)] if n >= 3 else "main"
+                cents = rng.randint(300, 3500) if category != "beverage" else rng.randint(150, 600)
+                item = {
+                    "id": len(self.menu_items) + 1,
+                    "restaurant_id": rid,
+                    "name": label,
+                    "description": f"House {label.lower()}",
+                    "price": cents / 100,
+                    "category": category,
+                    "is_available": rng.random() > 0.05,
+                    "preparation_time": rng.choice((5, 10, 15, 20, 25, 30)),
+                    "created_at": opened,
+                    "updated_at": opened,
+                }
+                self.menu_items.append(item)
+                ids.append(item["id"])
+                names.append(label)
+                prices.append(cents)
+                prep.append(item["preparation_time"])
+            # Shuffle which dishes are the favourites at each restaurant
+            order = list(range(count))
+            rng.shuffle(order)
+            self._menus.append((
+                [ids[i] for i in order], [names[i] for i in order], [prices[i] for i in order],
+                [prep[i] for i in order], _zipf_cumulative(count, 1.1 * self.skew),
+            ))
+        self._restaurant_order = list(range(self.restaurant_count))
+        rng.shuffle(self._restaurant_order)
+        self._restaurant_cum = _zipf_cumulative(self.restaurant_count, 0.8 * self.skew)
+
+    def _daily_counts(self):
+        """Orders per day, summing exactly to the requested total."""
+        start = self.end - timedelta(days=self.days)
+        weights = []
+        for d in range(self.days):
+            day = start + timedelta(days=d)
+            growth = 0.8 + 0.4 * d / max(1, self.days - 1)
+            weights.append(WEEKDAY_WEIGHTS[day.weekday()] * growth)
+        total = sum(weights)
+        exact = [self.order_count * w / total for w in weights]
+        counts = [int(x) for x in exact]
+        short = self.order_count - sum(counts)
+        for d in sorted(range(self.days), key=lambda d: counts[d] - exact[d])[:short]:
+            counts[d] += 1
+        return [(int((start + timedelta(days=d)).timestamp()), c) for d, c in enumerate(counts)]
+
+    def __getstate__(self):
+        return dict(self.__dict__, _cached_tables=None)
+
+    def _customer(self, number):
+        """Encoded customer fields and delivery address for customer ``number``."""
+        first = FIRST_NAMES[number % len(FIRST_NAMES)]
+        last = LAST_NAMES[number // len(FIRST_NAMES) % len(LAST_NAMES)]
+        fields = _encode({
+            "customer_name": f"{first} {last}",
+            "customer_phone": f"+1-555-{number % 10000:04d}",
+            "customer_email": f"{first.lower()}.{last.lower()}{number}@example.com",
+        })[1:-1]
+        address = _encode(f"{number % 9999 + 1} {STREETS[number % len(STREETS)]}, Food City")
+        return fields, address
+
+    def plan(self):
+        """``(day, start epoch, orders, first order id, first item id)`` per day.
+
+        Every day draws from its own random streams, so days can be generated
+        independently (and in parallel) with the same result. Line counts use
+        a separate stream so item ids can be allocated up front.
+        """
+        plan = []
+        order_id = item_id = 1
+        for day, (day_start, count) in enumerate(self._daily_counts()):
+            plan.append((day, day_start, count, order_id, item_id))
+            order_id += count
+            item_id += sum(self._line_counts(day, count))
+        return plan
+
+    def _line_counts(self, day, count):
+        rng = random.Random(f"{self.seed}-lines-{day}")
+        return rng.choices(LINES_PER_ORDER, weights=LINES_WEIGHTS, k=count)
+
+    def _tables(self):
+        """Lookup tables for formatting rows, built once per process."""
+        if self._cached_tables is None:
+            base = int((self.end - timedelta(days=self.days)).timestamp())
+            money = _Money()
+            self._cached_tables = {
+                "base": base,
+                # Timestamps are a day prefix plus one of 86400 precomputed times
+                "dates": [_iso(base + d * 86400)[:11] for d in range(self.days + 2)],
+                "clock": [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}Z" for s in range(86400)],
+                "money": money,
+                "customers": {},
+                # Per menu item and quantity: (line cents, order item fields, embedded order line)
+                "menus": [
+                    ([[None] + [(cents * q,
+                                 '"menu_item_id":%d,"quantity":%d,"unit_price":%s,"total_price":%s'
+                                 % (item_id, q, money[cents], money[cents * q]),
+                                 '{"menu_item_id":%d,"name":%s,"quantity":%d,"unit_price":%s,"total_price":%s}'
+                                 % (item_id, _encode(name), q, money[cents], money[cents * q]))
+                                for q in QUANTITIES]
+                      for item_id, name, cents in zip(ids, names, prices)],
+                     prep, cum, cum[-1], len(cum) - 1)
+                    for ids, names, prices, prep, cum in self._menus
+                ],
+            }
+        return self._cached_tables
+
+    def day(self, plan, embed_items=False):
+        """``(orders, order_items)`` lists of JSON lines for one ``plan()`` entry.
+
+        Rows are formatted from cached fragments instead of building and
+        encoding dicts, which is most of the generator's speed. With
+        ``embed_items`` each order carries its lines as ``order_items`` (the
+        backend store's shape) and the second list stays empty.
+        """
+        day, day_start, count, order_id, item_id = plan
+        tables = self._tables()
+        base, dates, clock, money = tables["base"], tables["dates"], tables["clock"], tables["money"]
+        customers, menus = tables["customers"], tables["menus"]
+        customer_count = self.customer_count
+        exponent = 1 + self.skew
+        end_epoch = int(self.end.timestamp())
+        rng = random.Random(f"{self.seed}-day-{day}")
+        rand = rng.random
+        hours = rng.choices(range(24), cum_weights=HOURS_CUM, k=count)
+        stamps = sorted(day_start + h * 3600 + int(rand() * 3600) for h in hours)
+        picks = rng.choices(self._restaurant_order, cum_weights=self._restaurant_cum, k=count)
+        kinds = rng.choices(ORDER_TYPES, weights=ORDER_TYPE_WEIGHTS, k=count)
+        orders, items = [], []
+        for created, index, lines, kind in zip(stamps, picks, self._line_counts(day, count), kinds):
+            menu_lines, prep, cum, menu_total, last = menus[index]
+            offset = created - base
+            created_at = dates[offset // 86400] + clock[offset % 86400]
+            total = 0
+            slowest = 0
+            order_lines = []
+            for _ in range(lines):
+                i = bisect(cum, rand() * menu_total)
+                if i > last:
+                    i = last
+                cents, fields, embedded = menu_lines[i][1 if rand() < 0.8 else 2 + int(rand() * 3)]
+                total += cents
+                if prep[i] > slowest:
+                    slowest = prep[i]
+                if embed_items:
+                    order_lines.append(embedded)
+                else:
+                    items.append('{"id":%d,"order_id":%d,%s,"special_requests":null,"created_at":"%s"}'
+                                 % (item_id, order_id, fields, created_at))
+                    item_id += 1
+            # Repeat customers: low customer numbers order far more often
+            number = int(customer_count * rand() ** exponent)
+            customer = customers.get(number)
+            if customer is None:
+                customer = customers[number] = self._customer(number)
+            eta = offset + (slowest + (25 if kind == "delivery" else 5)) * 60
+            status = "delivered"
+            if end_epoch - created < IN_PROGRESS[-1][0]:
+                status = next(state for limit, state in IN_PROGRESS if end_epoch - created < limit)
+                delivered = "null"
+            elif rand() < CANCEL_RATE:
+                status = "cancelled"
+                delivered = "null"
+            else:
+                done = eta - 600 + int(rand() * 1200)
+                delivered = '"' + dates[done // 86400] + clock[done % 86400] + '"'
+            orders.append(
+                '{"id":%d,"restaurant_id":%d,%s,"delivery_address":%s,"order_type":"%s","status":"%s",'
+                '"total_amount":%s,"payment_status":"%s","special_instructions":null,'
+                '"estimated_delivery_time":"%s","actual_delivery_time":%s,"created_at":"%s","updated_at":"%s"%s}'
+                % (order_id, index + 1, customer[0], customer[1] if kind == "delivery" else "null", kind, status,
+                   money[total], PAYMENT_STATUS.get(status, "pending"),
+                   dates[eta // 86400] + clock[eta % 86400], delivered, created_at, created_at,
+                   ',"order_items":[' + ",".join(order_lines) + "]" if embed_items else ""))
+            order_id += 1
+        return orders, items
+
+    def batches(self, embed_items=False, workers=1):
+        """Yield ``day()`` results for every day in order, using ``workers`` processes."""
+        plan = self.plan()
+        if workers <= 1:
+            for entry in plan:
+                yield self.day(entry, embed_items)
+            return
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(self,)) as pool:
+            # Keep a bounded window of days in flight so memory stays flat
+            pending = deque()
+            for entry in plan:
+                pending.append(pool.submit(_generate_day, entry, embed_items))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def rows(self, embed_items=False):
+        """Like ``batches`` but decoded into dicts, for small datasets and tests."""
+        for orders, items in self.batches(embed_items):
+            yield [json.loads(o) for o in orders], [json.loads(i) for i in items]
+
+
+_worker_data = None
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _generate_day(plan, embed_items):
+    return _worker_data.day(plan, embed_items)
+
+
+class _Money(dict):
+    """Cents -> JSON text of the dollar amount, as ``json.dumps(cents / 100)`` would write it."""
+
+    def __missing__(self, cents):
+        text = self[cents] = repr(cents / 100)
+        return text
+
+
+def write_ndjson(data, directory, workers=1):
+    """One ``<collection>.ndjson`` file per db.json collection."""
+    os.makedirs(directory, exist_ok=True)
+
+    def path(name):
+        return os.path.join(directory, f"{name}.ndjson")
+
+    for name, rows in (("restaurants", data.restaurants), ("menuItems", data.menu_items)):
+        with open(path(name), "w", encoding="utf-8") as f:
+            f.write("".join(_encode(r) + "\n" for r in rows))
+    with open(path("orders"), "w", encoding="utf-8", buffering=1 << 20) as orders_file, \
+            open(path("orderItems"), "w", encoding="utf-8", buffering=1 << 20) as items_file:
+        for orders, items in data.batches(workers=workers):
+            orders_file.write("\n".join(orders) + "\n")
+            if items:
+                items_file.write("\n".join(items) + "\n")
+
+
+def _write_array(f, key, batches, first):
+    """Write ``"key":[...]`` from batches of already-encoded rows."""
+    f.write(("" if first else ",") + f'"{key}":[')
+    separator = ""
+    for rows in batches:
+        if rows:
+            f.write(separator + ",".join(rows))
+            separator = ","
+    f.write("]")
+
+
+def write_json(data, out, workers=1):
+    """A single db.json-compatible document (``out`` may be ``-`` for stdout)."""
+    f = sys.stdout if out == "-" else open(out, "w", encoding="utf-8", buffering=1 << 20)
+    try:
+        f.write("{")
+        _write_array(f, "restaurants", [list(map(_encode, data.restaurants))], True)
+        _write_array(f, "menuItems", [list(map(_encode, data.menu_items))], False)
+        # Order items come after all orders, so they are spooled to disk meanwhile
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+            def orders():
+                for batch, items in data.batches(workers=workers):
+                    if items:
+                        spool.write(("," if spool.tell() else "") + ",".join(items))
+                    yield batch
+
+            _write_array(f, "orders", orders(), False)
+            f.write(',"orderItems":[')
+            spool.seek(0)
+            shutil.copyfileobj(spool, f, 1 << 20)
+            f.write("]}\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def write_store(data, wal_dir, workers=1):
+    """A write-ahead log snapshot that ``open_store(WAL_DIR)`` recovers on start."""
+    os.makedirs(wal_dir, exist_ok=True)
+    if os.listdir(wal_dir):
+        raise SystemExit(f"❌ {wal_dir} is not empty; refusing to overwrite store data")
+    path = os.path.join(wal_dir, f"{SNAPSHOT_PREFIX}{0:012d}.json")
+    with open(path + ".tmp", "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.write('{"seq":0')
+        _write_array(f, "restaurants", [list(map(_encode, data.restaurants))], False)
+        _write_array(f, "menu_items", [list(map(_encode, data.menu_items))], False)
+        _write_array(f, "orders", (orders for orders, _ in data.batches(embed_items=True, workers=workers)), False)
+        f.write("}")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+WRITERS = {"ndjson": write_ndjson, "json": write_json, "store": write_store}
+
+
+def main():
+    """Main function with CLI arguments"""
+    parser = argparse.ArgumentParser(description='RestaurantFlow synthetic data generator')
+    parser.add_argument('--orders', type=int, default=1_000_000, help='Orders to generate (default: 1000000)')
+    parser.add_argument('--restaurants', type=int, default=0, help='Restaurants (default: orders / 2000)')
+    parser.add_argument('--customers', type=int, default=0, help='Distinct customers (default: orders / 8)')
+    parser.add_argument('--days', type=int, default=90, help='Days of history ending 2024-08-05 (default: 90)')
+    parser.add_argument('--skew', type=float, default=1.0, help='Popularity skew multiplier (default: 1.0)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=1, help='Generator processes (output is identical)')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='ndjson')
+    parser.add_argument('--out', required=True, help='Directory (ndjson, store) or file, - for stdout (json)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = SyntheticData(args.orders, args.restaurants, args.customers, args.days, seed=args.seed, skew=args.skew)
+    WRITERS[args.format](data, args.out, args.workers)
+    print(f"🧪 Generated {args.orders:,} orders for {data.restaurant_count:,} restaurants "
+          f"({len(data.menu_items):,} menu items) as {args.format} in {time.perf_counter() - start:.2f}s",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
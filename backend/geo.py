@@ -0,0 +1,207 @@
+"""
+Spatial index for RestaurantFlow_bhatiyani
+
+Restaurants are bucketed into a fixed grid of roughly ``cell_km`` square
+cells. Nearest-restaurant queries walk outwards from the query point ring by
+ring and stop as soon as the closest matches are known, so they touch a few
+cells no matter how many restaurants there are. Distances are compared with
+an equirectangular approximation (a few metres off at delivery distances)
+and reported with the haversine formula.
+
+Columns are slightly narrowed so a whole number of them spans 360 degrees,
+which lets searches wrap around the antimeridian.
+
+Every restaurant delivers within ``delivery_radius_km`` of itself. Cells are
+replaced, never mutated, so queries run without locks while restaurants are
+added or moved.
+
+Addresses without coordinates go through ``OfflineGeocoder``, a
+deterministic stand-in for a real geocoding service: it hashes the address
+to a point near a configured city centre.
+"""
+
+import hashlib
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.radians(EARTH_RADIUS_KM)  # along a meridian, same sphere as haversine_km
+# Searches treat meridians as converging no further than at this latitude, so
+# the number of cells scanned stays bounded right up to the poles
+SEARCH_MAX_LATITUDE = 80.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def delivery_minutes(distance_km, prep_minutes=20, speed_kmh=25):
+    """Rough delivery estimate: kitchen time plus riding time at ``speed_kmh``"""
+    return math.ceil(prep_minutes + distance_km / speed_kmh * 60)
+
+
+class OfflineGeocoder:
+    """Deterministic address -> (lat, lon) within ``radius_km`` of ``center``."""
+
+    def __init__(self, center=(40.7128, -74.0060), radius_km=25.0):
+        self.center = center
+        self.radius_km = radius_km
+
+    def geocode(self, address):
+        if not address:
+            return None
+        digest = hashlib.blake2b(address.strip().casefold().encode("utf-8"), digest_size=16).digest()
+        u = int.from_bytes(digest[:8], "little") / 2 ** 64
+        v = int.from_bytes(digest[8:], "little") / 2 ** 64
+        # Uniform over the disc: the square root spreads points evenly by area
+        distance = self.radius_km * math.sqrt(u)
+        bearing = 2 * math.pi * v
+        lat = self.center[0] + distance * math.cos(bearing) / KM_PER_DEGREE
+        lon = self.center[1] + distance * math.sin(bearing) / (KM_PER_DEGREE * math.cos(math.radians(self.center[0])))
+        return round(lat, 6), round(lon, 6)
+
+
+def restaurant_location(restaurant, geocoder=None):
+    """``(lat, lon)`` from the restaurant's coordinates, else its geocoded address"""
+    lat, lon = restaurant.get("latitude"), restaurant.get("longitude")
+    if lat is not None and lon is not None:
+        return float(lat), float(lon)
+    return geocoder.geocode(restaurant.get("address")) if geocoder else None
+
+
+class GeoIndex:
+    """Grid index of restaurant locations and delivery zones."""
+
+    def __init__(self, store=None, geocoder=None, cell_km=0.5, delivery_radius_km=5.0):
+        self.geocoder = geocoder
+        self.delivery_radius_km = delivery_radius_km
+        self._step = cell_km / KM_PER_DEGREE  # cell height in degrees
+        self._columns = math.ceil(360 / self._step)  # cells around a parallel
+        self._lon_step = 360 / self._columns  # cell width in degrees, at most the height
+        self._cells = {}  # (row, col) -> tuple of (lat, lon, delivery radius, restaurant)
+        self._entries = {}  # restaurant id -> (cell, entry)
+        self._lock = threading.Lock()
+        self.max_delivery_radius_km = 0.0
+        if store is not None:
+            for restaurant in store.list_restaurants():
+                self._put(restaurant)
+            store.subscribe(self._on_change)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self._step)), int(math.floor((lon + 180) / self._lon_step)) % self._columns
+
+    def _put(self, restaurant):
+        location = restaurant_location(restaurant, self.geocoder)
+        with self._lock:
+            old = self._entries.pop(restaurant["id"], None)
+            if old is not None:
+                cell, entry = old
+                remaining = tuple(e for e in self._cells[cell] if e is not entry)
+                if remaining:
+                    self._cells[cell] = remaining
+                else:
+                    del self._cells[cell]
+            if location is None:
+                return
+            radius = float(restaurant.get("delivery_radius_km") or self.delivery_radius_km)
+            entry = (location[0], location[1], radius, restaurant)
+            cell = self._cell(*location)
+            self._cells[cell] = self._cells.get(cell, ()) + (entry,)
+            self._entries[restaurant["id"]] = (cell, entry)
+            self.max_delivery_radius_km = max(self.max_delivery_radius_km, radius)
+
+    def _on_change(self, op, data, previous):
+        if op == "restaurant":
+            self._put(data)
+
+    def location(self, restaurant_id):
+        """``(lat, lon, delivery radius km)`` of a restaurant, or None"""
+        found = self._entries.get(restaurant_id)
+        return found[1][:3] if found else None
+
+    def _ring(self, row, col, k, inner, outer):
+        """Cells within ``k`` rows and ``outer`` columns, but not ``k - 1`` rows and ``inner`` columns"""
+        if k == 0:
+            for c in range(col - outer, col + outer + 1):
+                yield row, c
+            return
+        for c in range(col - outer, col + outer + 1):
+            yield row - k, c
+            yield row + k, c
+        for r in range(row - k + 1, row + k):
+            for c in range(inner + 1, outer + 1):
+                yield r, col - c
+                yield r, col + c
+
+    def nearby(self, lat, lon, radius_km, limit=20, delivers_only=False):
+        """Closest restaurants within ``radius_km``, nearest first.
+
+        Returns ``(distance km, delivers here, restaurant)`` tuples. With
+        ``delivers_only`` only restaurants whose delivery zone contains the
+        point are kept. Cells are visited in rings around the point and the
+        search stops once ``limit`` hits are closer than any unvisited cell.
+
+        Above ``SEARCH_MAX_LATITUDE`` the scanned longitude span is capped,
+        so results there may miss restaurants far to the east or west.
+        """
+        if limit <= 0:
+            return []
+        kx = KM_PER_DEGREE * math.cos(math.radians(lat))
+        search_kx = max(kx, KM_PER_DEGREE * math.cos(math.radians(SEARCH_MAX_LATITUDE)))
+        row, col = self._cell(lat, lon)
+        # Ring k spans k rows and k * columns_per_row columns either side,
+        # never more than half way around so no cell is visited twice
+        rings = math.ceil(radius_km / KM_PER_DEGREE / self._step)
+        columns = min(math.ceil(radius_km / search_kx / self._lon_step), (self._columns - 1) // 2)
+        columns_per_row = self._step * KM_PER_DEGREE / (search_kx * self._lon_step)
+        ring_km = self._step * KM_PER_DEGREE * kx / search_kx  # every cell outside ring k is at least k * ring_km away
+        squared_limit = radius_km * radius_km
+        cells = self._cells
+        wrap = self._columns
+        found = []
+        inner = -1
+        for k in range(rings + 1):
+            outer = columns if k == rings else min(columns, math.ceil(k * columns_per_row))
+            keys = self._ring(row, col, k, inner, outer)
+            inner = outer
+            for r, c in keys:
+                cell = cells.get((r, c % wrap))
+                if cell is None:
+                    continue
+                for entry in cell:
+                    dy = (entry[0] - lat) * KM_PER_DEGREE
+                    dx = ((entry[1] - lon + 180) % 360 - 180) * kx
+                    d2 = dx * dx + dy * dy
+                    if d2 <= squared_limit and (not delivers_only or d2 <= entry[2] * entry[2]):
+                        found.append((d2, entry))
+            if len(found) >= limit:
+                found.sort(key=lambda f: f[0])
+                del found[limit:]
+                if found[-1][0] <= (k * ring_km) ** 2:
+                    break
+        found.sort(key=lambda f: f[0])
+        results = []
+        for d2, (r_lat, r_lon, radius, restaurant) in found[:limit]:
+            distance = haversine_km(lat, lon, r_lat, r_lon)
+            results.append((distance, distance <= radius, restaurant))
+        return results
+
+    def delivering_to(self, lat, lon, limit=20):
+        """Restaurants whose delivery zone contains the point, nearest first"""
+        return self.nearby(lat, lon, self.max_delivery_radius_km, limit, delivers_only=True)
+
+    def delivers(self, restaurant_id, lat, lon):
+        """``(delivers, distance km)`` for one restaurant, or None if it has no location"""
+        found = self.location(restaurant_id)
+        if found is None:
+            return None
+        r_lat, r_lon, radius = found
+        distance = haversine_km(lat, lon, r_lat, r_lon)
+        return distance <= radius, distance
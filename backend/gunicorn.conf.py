@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for RestaurantFlow_bhatiyani
+
+The data store lives in the worker's memory (and, with WAL_DIR, has a single
+writer), so the app runs as one worker process with several threads. The
+master imports the app once (``preload_app``) with PRELOAD_APP set, so the
+store and its derived structures are built before forking and the worker
+serves its first request without building them.
+"""
+
+import os
+
+from gunicorn.errors import HaltServer
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+if workers != 1:
+    # Each worker would hold its own diverging copy of the store: orders,
+    # ids, jobs and change sequences would differ from request to request
+    raise SystemExit(f"WEB_CONCURRENCY={workers}: the in-process store needs exactly one worker; "
+                     "raise GUNICORN_THREADS instead")
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Without preloading, the worker loads the store before it can heartbeat
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('PRELOAD_APP', '1').lower() in ('1', 'true')
+if preload_app:
+    os.environ.setdefault('PRELOAD_APP', '1')
+
+_forked = False
+
+
+def pre_fork(server, worker):
+    """Stop instead of forking a replacement worker from a stale preloaded store.
+
+    With the write-ahead log, writes since startup live only in the old
+    worker and the log; exiting lets the process supervisor restart gunicorn,
+    which recovers them.
+    """
+    global _forked
+    if _forked and preload_app and os.environ.get('WAL_DIR'):
+        raise HaltServer("worker exited; restarting to recover the store from the write-ahead log", 1)
+    _forked = True
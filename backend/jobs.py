@@ -0,0 +1,147 @@
+"""
+Background jobs for RestaurantFlow_bhatiyani
+
+Heavy analytics run in a process pool instead of inside a Flask request.
+Jobs are queued with a bound on how many may be outstanding, their results
+are kept (up to a limit) for polling, and queued jobs can be cancelled. A job
+that is already running cannot be interrupted; cancelling it discards its
+result instead.
+
+Given a ``source``, the worker reads the orders itself from the write-ahead
+log and the archive, so submitting a job only pickles its parameters.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import analytics
+from archive import OrderArchive, order_history
+from wal import read_state
+
+JOB_TYPES = {
+    "popular_items": analytics.popular_items,
+    "monthly_sales": analytics.monthly_sales,
+}
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+def load_orders(wal_dir, archive_dir=None, columns=None, restaurant_id=None):
+    """Live orders from the write-ahead log plus archived ones, projected to ``columns``."""
+    state = read_state(wal_dir) or {"orders": []}
+    live_ids = {o["id"] for o in state["orders"]}
+    archive = OrderArchive(archive_dir) if archive_dir else None
+    return order_history(state["orders"], archive, live_ids.__contains__, columns, restaurant_id=restaurant_id)
+
+
+def run_job(job_type, orders, source, params):
+    if orders is None:
+        orders = load_orders(**source, restaurant_id=params.get("restaurant_id"))
+    return JOB_TYPES[job_type](orders, **params)
+
+
+class JobQueueFull(Exception):
+    """Raised when the maximum number of outstanding jobs is reached."""
+
+
+class JobManager:
+    """Bounded process-pool job queue with result storage."""
+
+    def __init__(self, max_workers=None, max_pending=32, max_results=256):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.max_results = max_results
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._futures = {}
+
+    def _pool(self):
+        # Created on first use so forked gunicorn workers each get their own.
+        # Spawned (not forked) children never inherit locks held by threads.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def submit(self, job_type, orders=None, source=None, **params):
+        """Queue ``JOB_TYPES[job_type](orders, **params)`` and return the job.
+
+        Without ``orders``, the worker loads them with ``load_orders(**source)``.
+        """
+        if job_type not in JOB_TYPES:
+            raise KeyError(job_type)
+        with self._lock:
+            if len(self._futures) >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} jobs already queued or running")
+            job = {
+                "id": uuid.uuid4().hex,
+                "type": job_type,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._jobs[job["id"]] = job
+            future = self._pool().submit(run_job, job_type, orders, source, params)
+            self._futures[job["id"]] = future
+            self._evict()
+        future.add_done_callback(lambda f, job_id=job["id"]: self._finish(job_id, f))
+        return self.get(job["id"])
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_results)]:
+            del self._jobs[job_id]
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["finished_at"] = time.time()
+            if job["status"] == "cancelled" or future.cancelled():
+                job["status"] = "cancelled"
+            elif future.exception() is not None:
+                job["status"] = "failed"
+                job["error"] = str(future.exception())
+            else:
+                job["status"] = "completed"
+                job["result"] = future.result()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            future = self._futures.get(job_id)
+            if job["status"] == "queued" and future is not None and future.running():
+                job["status"] = "running"
+            return dict(job)
+
+    def cancel(self, job_id):
+        """Cancel a job; returns the job, or None if it does not exist."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            future = self._futures.get(job_id)
+            if job["status"] in FINISHED_STATUSES:
+                future = None
+            else:
+                job["status"] = "cancelled"
+        # Outside the lock: cancelling runs the done callback synchronously
+        if future is not None:
+            future.cancel()
+        return self.get(job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
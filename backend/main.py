@@ -5,18 +5,42 @@ RestaurantFlow_bhatiyani Backend Server
 Flask application for restaurant management
 """
 
-from flask import Flask, jsonify
+from flask import Blueprint, Flask, current_app, g, jsonify, request
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
+import gc
+import logging
+import math
 import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 
-app = Flask(__name__)
-CORS(app, origins=[
+from analytics import monthly_sales
+from archive import OrderArchive, archive_orders, order_history as merge_order_history
+from chain_analytics import ChainAnalytics
+from changes import ChangeLog
+from geo import GeoIndex, OfflineGeocoder, delivery_minutes
+from jobs import JOB_TYPES, JobManager, JobQueueFull
+from menu_cache import MenuCache
+from pricing import PricingEngine
+from ratelimit import AdmissionController, LocalBuckets, RateLimiter, SharedBuckets, queue_wait
+from sketches import ApproxAnalytics
+from store import COMPLETED_STATUSES, ORDER_STATUSES, DataStore
+from wal import WriteAheadLog
+
+api = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
+
+CORS_ORIGINS = [
     "http://localhost:3000", 
     "http://localhost:5173",
     "https://*.vercel.app",
     "https://*.netlify.app",
     "*"  # Allow all origins for demo
-])
+]
 
 # Sample data
 restaurants_data = [
@@ -56,7 +80,387 @@ analytics_data = {
     ]
 }
 
-@app.route('/')
+def open_store(wal_dir=None):
+    """Create the data store, recovering it from the write-ahead log if enabled"""
+    if not wal_dir:
+        return DataStore(restaurants_data, orders_data, menu_items_data)
+    journal = WriteAheadLog(wal_dir, int(os.environ.get('WAL_CHECKPOINT_EVERY', 100000)))
+    recovered = journal.recover()
+    if recovered is not None:
+        return DataStore(**recovered, journal=journal)
+    # First start: persist the sample data as the initial snapshot
+    data_store = DataStore(restaurants_data, orders_data, menu_items_data, journal=journal)
+    data_store.checkpoint()
+    return data_store
+
+class Lazy:
+    """Builds a subsystem on first use; attribute access goes to the built object"""
+
+    def __init__(self, build):
+        self._build = build
+        self._lock = threading.Lock()
+        self._target = None
+
+    @property
+    def built(self):
+        return self._target is not None
+
+    def get(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._build()
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+class Services:
+    """The store and everything built from it, plus rate limits, for one app.
+
+    Nothing here exists until ``create_app`` builds it, so importing this
+    module (as spawned pool workers do with ``python main.py``, under the
+    name ``__mp_main__``) never opens or recovers the write-ahead log.
+    """
+
+    def __init__(self, store, order_archive=None):
+        self.store = store
+        # Finished orders older than ARCHIVE_AFTER_DAYS move to columnar files under ARCHIVE_DIR
+        self.order_archive = order_archive
+        # Derived structures are built on first use, catching up on writes made meanwhile
+        self.menu_cache = Lazy(lambda: store.attach(MenuCache))
+        self.change_log = Lazy(lambda: store.attach(ChangeLog))
+        self.approx_analytics = Lazy(lambda: store.attach(ApproxAnalytics))
+        self.pricing = PricingEngine(store)
+        self.job_manager = JobManager(
+            int(os.environ.get('JOB_WORKERS', 0)) or None,
+            int(os.environ.get('JOB_MAX_PENDING', 32)),
+        )
+        self.chain_analytics = ChainAnalytics(
+            store,
+            int(os.environ.get('CHAIN_WORKERS', 0)) or None,
+            float(os.environ.get('CHAIN_MAX_AGE_SECONDS', 30)),
+            archived=self.archived_totals,
+        )
+        # Stand-in for a geocoding service: addresses hash to points around GEO_CENTER
+        self.geocoder = OfflineGeocoder(
+            tuple(float(v) for v in os.environ.get('GEO_CENTER', '40.7128,-74.0060').split(',')),
+            float(os.environ.get('GEO_RADIUS_KM', 25)),
+        )
+        self.geo_index = Lazy(lambda: store.attach(
+            lambda pinned: GeoIndex(pinned, self.geocoder, delivery_radius_km=float(os.environ.get('DELIVERY_RADIUS_KM', 5)))
+        ))
+        self.rate_limiter = build_rate_limiter()
+        self.admission = build_admission()
+        self.warned_untrusted_proxy = False
+        self._background_pid = None
+
+    @classmethod
+    def from_environment(cls):
+        """Open the store (recovering WAL_DIR) and the archive (ARCHIVE_DIR)"""
+        archive_dir = os.environ.get('ARCHIVE_DIR')
+        return cls(open_store(os.environ.get('WAL_DIR')), OrderArchive(archive_dir) if archive_dir else None)
+
+    def preload(self):
+        """Build every lazy subsystem now, e.g. in a gunicorn master before it forks"""
+        for subsystem in (self.menu_cache, self.change_log, self.approx_analytics, self.geo_index):
+            subsystem.get()
+        self.pricing.index()
+        self.archived_totals()
+        self.chain_analytics.columns()
+        # Keep the garbage collector from touching (and so copying) these pages in workers
+        gc.collect()
+        gc.freeze()
+
+    def archived_totals(self):
+        """Per-restaurant totals of archived orders, or None without an archive"""
+        return self.order_archive.totals(self.store) if self.order_archive is not None else None
+
+    def dashboard(self, restaurant_id):
+        """The store's dashboard for a restaurant, with its archived orders added in"""
+        dashboard_data = self.store.dashboard(restaurant_id)
+        archived = self.archived_totals()
+        by_status = archived.restaurants.get(restaurant_id) if archived else None
+        if by_status:
+            dashboard_data["today_orders"] += sum(count for count, _ in by_status.values())
+            completed_cents = sum(cents for status, (_, cents) in by_status.items() if status in COMPLETED_STATUSES)
+            dashboard_data["today_revenue"] = round(dashboard_data["today_revenue"] + completed_cents / 100, 2)
+        return dashboard_data
+
+    def run_archiver(self, interval, after_days):
+        while True:
+            time.sleep(interval)
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=after_days)).strftime("%Y-%m-%d")
+            try:
+                archive_orders(self.store, self.order_archive, cutoff)
+            except Exception as e:
+                logger.exception("Archiving failed: %s", e)
+
+    def start_background_tasks(self):
+        """Start background threads once per process (threads do not survive a fork)"""
+        if self._background_pid == os.getpid():
+            return
+        self._background_pid = os.getpid()
+        if self.order_archive is not None and float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 3600)) > 0:
+            threading.Thread(
+                target=self.run_archiver,
+                args=(float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 3600)), int(os.environ.get('ARCHIVE_AFTER_DAYS', 30))),
+                daemon=True,
+            ).start()
+
+def services():
+    """The ``Services`` of the app handling the current request"""
+    return current_app.extensions['restaurantflow']
+
+# Request handlers reach the current app's subsystems through these
+store = LocalProxy(lambda: services().store)
+menu_cache = LocalProxy(lambda: services().menu_cache)
+change_log = LocalProxy(lambda: services().change_log)
+approx_analytics = LocalProxy(lambda: services().approx_analytics)
+pricing = LocalProxy(lambda: services().pricing)
+job_manager = LocalProxy(lambda: services().job_manager)
+chain_analytics = LocalProxy(lambda: services().chain_analytics)
+geocoder = LocalProxy(lambda: services().geocoder)
+geo_index = LocalProxy(lambda: services().geo_index)
+MAX_NEARBY_RADIUS_KM = 50
+
+def order_history(columns=None, start=None, end=None, restaurant_id=None):
+    """Hot orders plus archived ones, projected to ``columns``"""
+    return merge_order_history(
+        store.list_orders(), services().order_archive, lambda order_id: store.get_order(order_id) is not None,
+        columns, start, end, restaurant_id,
+    )
+
+def find_order(order_id):
+    """A live order, or the archived copy once it has left the store"""
+    order = store.get_order(order_id)
+    order_archive = services().order_archive
+    if order is None and order_archive is not None:
+        order = order_archive.find(order_id)
+    return order
+
+# Orders that have not been prepared yet follow menu price changes
+REPRICEABLE_STATUSES = ("pending",)
+
+PRICING_FIELDS = ("subtotal", "tax", "total", "total_amount", "order_items")
+
+def priced(order, quote):
+    """Apply a pricing quote to an order when every item matched the menu"""
+    if quote["unmatched_items"] or not quote["order_items"]:
+        return order
+    order = dict(order, subtotal=quote["subtotal"], tax=quote["tax"], total=quote["total"],
+                 order_items=quote["order_items"])
+    if "total_amount" in order:
+        order["total_amount"] = quote["total"]
+    return order
+
+def iso_timestamp(value):
+    """Whether ``value`` is an ISO 8601 date or date-time string"""
+    if not isinstance(value, str) or not re.fullmatch(r"\d{4}-\d{2}-\d{2}([T ].*)?", value):
+        return False
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+def order_error(order):
+    """Why ``order`` (or changes to one) cannot be stored, or None; analytics group and sum on these fields"""
+    if "status" in order and order["status"] not in ORDER_STATUSES:
+        return f"status must be one of: {', '.join(ORDER_STATUSES)}"
+    if "created_at" in order and not iso_timestamp(order["created_at"]):
+        return "created_at must be an ISO 8601 timestamp"
+    for field in ("subtotal", "tax", "total", "total_amount"):
+        value = order.get(field)
+        if field in order and (isinstance(value, bool) or not isinstance(value, (int, float))
+                               or not (value >= 0 and math.isfinite(value))):
+            return f"{field} must be a number of at least 0"
+    if order.get("delivery_address") is not None and not isinstance(order["delivery_address"], str):
+        return "delivery_address must be a string"
+    # Same ranges as request_location(); the geo index measures distances from these
+    for field, bound in (("delivery_latitude", 90), ("delivery_longitude", 180)):
+        value = order.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                  or not -bound <= value <= bound):
+            return f"{field} must be a number between -{bound} and {bound}"
+    return None
+
+def unpriceable(quote):
+    """400 response when a quote cannot replace the client's totals, else None"""
+    if quote["unmatched_items"]:
+        return jsonify({"error": "Items not on this restaurant's menu",
+                        "unmatched_items": quote["unmatched_items"]}), 400
+    if not quote["order_items"]:
+        return jsonify({"error": "An order needs at least one item"}), 400
+    return None
+
+def located(order):
+    """Add delivery coordinates and, when missing, an estimated delivery time"""
+    if order.get("order_type", "delivery") != "delivery" or not order.get("delivery_address"):
+        return order
+    order = dict(order)
+    if order.get("delivery_latitude") is None or order.get("delivery_longitude") is None:
+        order["delivery_latitude"], order["delivery_longitude"] = geocoder.geocode(order["delivery_address"])
+    if not order.get("estimated_delivery_time"):
+        found = geo_index.delivers(order.get("restaurant_id"), order["delivery_latitude"], order["delivery_longitude"])
+        if found is not None:
+            eta = datetime.now(timezone.utc) + timedelta(minutes=delivery_minutes(found[1]))
+            order["estimated_delivery_time"] = eta.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return order
+
+def request_location():
+    """``(lat, lon)`` from ?lat=&lon=, else the geocoded ?address=; None if neither is usable"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return geocoder.geocode(request.args.get('address'))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+def with_distance(distance, delivers, restaurant):
+    lat, lon, radius = geo_index.location(restaurant["id"])
+    return dict(
+        restaurant,
+        latitude=lat,
+        longitude=lon,
+        delivery_radius_km=radius,
+        distance_km=round(distance, 3),
+        delivers=delivers,
+        estimated_delivery_minutes=delivery_minutes(distance) if delivers else None,
+    )
+
+def encoded_json(body, status=200):
+    """Return an already-encoded JSON body"""
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+def not_modified(etag):
+    """304 when the client already holds ``etag``, else None"""
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def revalidated(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def collection_response(collection, rows):
+    """Full list with an ETag, or only the changes after ``?since=<seq>``"""
+    # Read the sequence before the rows so nothing can fall between syncs
+    seq = change_log.seq(collection)
+    since = request.args.get('since', type=int)
+    if since is not None:
+        delta = change_log.since(collection, since)
+        if delta is None:
+            # Tombstones before ``since`` were dropped, or it came from another process
+            delta = {"seq": seq, "full": True, "created": rows(), "updated": [], "deleted": []}
+        return jsonify(delta)
+    etag = f"{collection}-{seq}"
+    response = not_modified(etag) or encoded_json(change_log.body(collection, seq, rows))
+    response.headers['X-Change-Seq'] = str(seq)
+    return revalidated(response, etag)
+
+def menu_response(restaurant_id, part):
+    # Any menu change moves the menu_items sequence, so it versions every menu document
+    etag = f"menu-{restaurant_id}-{part}-{change_log.seq('menu_items')}"
+    response = not_modified(etag) or encoded_json(getattr(menu_cache.document(restaurant_id), part))
+    return revalidated(response, etag)
+
+# Rate limiting and load shedding
+# Latency-critical endpoints are never shed (they still count against the client's limit)
+PRIORITY_ENDPOINTS = {"health_check", "get_order_status"}
+# Slow by design (whole-chain scans, exports, batch pricing); their latency is
+# not a sign of overload, so it stays out of the latency that sheds requests
+HEAVY_ENDPOINTS = {
+    "get_analytics", "get_chain_analytics", "get_history_analytics",
+    "export_orders", "quote_orders", "reprice_orders", "run_archive",
+}
+# endpoint -> (requests per second, burst) per client, on top of the global client limit
+ROUTE_LIMITS = {
+    "get_orders": (10, 30),
+    "create_order": (5, 20),
+    "quote_orders": (10, 20),
+    "reprice_orders": (0.2, 2),
+    "create_job": (1, 5),
+    "get_chain_analytics": (1, 5),
+    "export_orders": (1, 5),
+    "get_history_analytics": (2, 10),
+    "run_archive": (0.1, 1),
+}
+
+def build_rate_limiter():
+    shared_file = os.environ.get('RATE_LIMIT_SHARED_FILE')
+    buckets = SharedBuckets(shared_file) if shared_file else LocalBuckets()
+    return RateLimiter(
+        buckets,
+        float(os.environ.get('RATE_LIMIT_PER_CLIENT', 50)),
+        float(os.environ.get('RATE_LIMIT_BURST', 100)),
+        ROUTE_LIMITS,
+    )
+
+def build_admission():
+    # gunicorn never runs more requests at once than it has threads, so the
+    # in-flight limit only bites under servers without such a cap; behind a
+    # proxy the backlog shows up as queueing time instead.
+    return AdmissionController(
+        int(os.environ.get('SHED_MAX_IN_FLIGHT') or os.environ.get('GUNICORN_THREADS', 4)),
+        float(os.environ.get('SHED_MAX_LATENCY_MS', 1000)) / 1000,
+        float(os.environ.get('SHED_MAX_QUEUE_MS', 500)) / 1000,
+    )
+
+rate_limiter = LocalProxy(lambda: services().rate_limiter)
+admission = LocalProxy(lambda: services().admission)
+
+def client_id():
+    # With TRUST_PROXY, ProxyFix has already taken this from X-Forwarded-For
+    if 'X-Forwarded-For' in request.headers and 'werkzeug.proxy_fix.orig' not in request.environ:
+        warn_untrusted_proxy()
+    return request.remote_addr or 'unknown'
+
+def warn_untrusted_proxy():
+    app_services = services()
+    if app_services.warned_untrusted_proxy:
+        return
+    app_services.warned_untrusted_proxy = True
+    logger.warning(
+        "Requests carry X-Forwarded-For but TRUST_PROXY is unset: every client behind "
+        "the proxy shares one rate limit bucket. Set TRUST_PROXY to the number of proxies."
+    )
+
+def retry_later(status, message, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@api.before_app_request
+def admission_control():
+    services().start_background_tasks()
+    if request.method == 'OPTIONS':
+        return None
+    endpoint = (request.endpoint or '').rpartition('.')[2]
+    retry_after = rate_limiter.check(client_id(), endpoint)
+    if retry_after:
+        return retry_later(429, "Too many requests", retry_after)
+    if endpoint in PRIORITY_ENDPOINTS:
+        return None
+    # Only a trusted proxy's X-Request-Start counts; clients could forge it
+    queued = queue_wait(request.headers.get('X-Request-Start')) if os.environ.get('TRUST_PROXY') else 0.0
+    if not admission.admit(queued):
+        return retry_later(503, "Server is busy, please retry", 1)
+    g.admitted_at = time.monotonic() - queued
+    g.heavy = endpoint in HEAVY_ENDPOINTS
+
+@api.teardown_app_request
+def release_admission(exc):
+    started = g.pop('admitted_at', None)
+    if started is not None:
+        admission.release(time.monotonic() - started, sample=not g.pop('heavy', False))
+
+@api.route('/')
 def root():
     return jsonify({
         "message": "RestaurantFlow_bhatiyani API", 
@@ -64,67 +468,374 @@ def root():
         "status": "running"
     })
 
-@app.route('/health')
+@api.route('/health')
 def health_check():
     return jsonify({"status": "healthy", "message": "Flask API is running"})
 
-@app.route('/api/restaurants', methods=['GET'])
+@api.route('/api/restaurants', methods=['GET'])
 def get_restaurants():
-    return jsonify(restaurants_data)
+    return collection_response("restaurants", store.list_restaurants)
 
-@app.route('/api/restaurants/<int:restaurant_id>', methods=['GET'])
+@api.route('/api/restaurants/<int:restaurant_id>', methods=['GET'])
 def get_restaurant(restaurant_id):
-    restaurant = next((r for r in restaurants_data if r["id"] == restaurant_id), None)
+    restaurant = store.get_restaurant(restaurant_id)
     if restaurant:
         return jsonify(restaurant)
     return jsonify({"error": "Restaurant not found"}), 404
 
-@app.route('/api/orders', methods=['GET'])
+@api.route('/api/restaurants/nearby', methods=['GET'])
+def get_nearby_restaurants():
+    """Restaurants near ?lat=&lon= (or ?address=), nearest first"""
+    location = request_location()
+    if location is None:
+        return jsonify({"error": "lat and lon (or address) are required"}), 400
+    radius = request.args.get('radius', default=5.0, type=float)
+    limit = request.args.get('limit', default=20, type=int)
+    if not 0 < radius <= MAX_NEARBY_RADIUS_KM:
+        return jsonify({"error": f"radius must be between 0 and {MAX_NEARBY_RADIUS_KM} km"}), 400
+    if not 0 < limit <= 100:
+        return jsonify({"error": "limit must be between 1 and 100"}), 400
+    delivers_only = request.args.get('delivers_only', '').lower() == 'true'
+    return jsonify([with_distance(*found) for found in geo_index.nearby(*location, radius, limit, delivers_only)])
+
+@api.route('/api/restaurants/<int:restaurant_id>/delivery', methods=['GET'])
+def check_delivery_zone(restaurant_id):
+    """Whether ?lat=&lon= (or ?address=) is inside the restaurant's delivery zone"""
+    location = request_location()
+    if location is None:
+        return jsonify({"error": "lat and lon (or address) are required"}), 400
+    found = geo_index.delivers(restaurant_id, *location)
+    if found is None:
+        if store.get_restaurant(restaurant_id) is None:
+            return jsonify({"error": "Restaurant not found"}), 404
+        return jsonify({"error": "Restaurant has no address or coordinates"}), 422
+    delivers, distance = found
+    return jsonify({
+        "restaurant_id": restaurant_id,
+        "latitude": location[0],
+        "longitude": location[1],
+        "delivers": delivers,
+        "distance_km": round(distance, 3),
+        "delivery_radius_km": geo_index.location(restaurant_id)[2],
+        "estimated_delivery_minutes": delivery_minutes(distance) if delivers else None,
+    })
+
+@api.route('/api/orders', methods=['GET'])
 def get_orders():
-    return jsonify(orders_data)
+    return collection_response("orders", store.list_orders)
+
+@api.route('/api/orders', methods=['POST'])
+def create_order():
+    data = request.get_json(silent=True) or {}
+    if "restaurant_id" not in data:
+        return jsonify({"error": "restaurant_id is required"}), 400
+    error = order_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        quote = pricing.price_order(data)
+        # The client's total can't stand in for items the server cannot price
+        error = unpriceable(quote)
+        if error:
+            return error
+        order = store.create_order(located(priced(data, quote)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(order), 201
+
+@api.route('/api/orders/quote', methods=['POST'])
+def quote_orders():
+    """Price one order, or a batch under "orders", without saving anything"""
+    data = request.get_json(silent=True) or {}
+    try:
+        if isinstance(data.get("orders"), list):
+            return jsonify(pricing.price_orders(data["orders"]))
+        return jsonify(pricing.price_order(data))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@api.route('/api/orders/reprice', methods=['POST'])
+def reprice_orders():
+    """Re-price open orders after a menu change, optionally for one restaurant"""
+    data = request.get_json(silent=True) or {}
+    restaurant_id = data.get("restaurant_id")
+    orders = [
+        o for o in store.list_orders()
+        if o["status"] in REPRICEABLE_STATUSES and restaurant_id in (None, o["restaurant_id"])
+    ]
+    repriced = skipped = 0
+    for order in orders:
+        try:
+            quote = pricing.price_order(order)
+        except ValueError:
+            # Malformed items (e.g. stored before validation) leave this order as it is
+            skipped += 1
+            continue
+        updated = priced(order, quote)
+        if updated is order or updated.get("total") == order.get("total"):
+            continue
+        # Only the pricing fields, and only if the order was not moved on or edited meanwhile
+        changes = {k: updated[k] for k in PRICING_FIELDS if k in updated}
+        unchanged = lambda current, items=order.get("items"): (
+            current["status"] in REPRICEABLE_STATUSES and current.get("items") == items)
+        if store.update_order(order["id"], changes, only_if=unchanged) is not None:
+            repriced += 1
+    return jsonify({"checked": len(orders), "repriced": repriced, "skipped": skipped})
 
-@app.route('/api/orders/<int:order_id>', methods=['GET'])
+@api.route('/api/orders/export', methods=['GET'])
+def export_orders():
+    """Live and archived orders (?start=&end=YYYY-MM-DD&restaurant_id=&columns=id,total,...)"""
+    columns = [c for c in request.args.get('columns', '').split(',') if c] or None
+    orders = order_history(
+        columns, request.args.get('start'), request.args.get('end'), request.args.get('restaurant_id', type=int)
+    )
+    return jsonify(orders)
+
+@api.route('/api/archive', methods=['GET'])
+def get_archive_stats():
+    order_archive = services().order_archive
+    if order_archive is None:
+        return jsonify({"error": "Archive is not configured"}), 404
+    return jsonify(order_archive.stats())
+
+@api.route('/api/archive', methods=['POST'])
+def run_archive():
+    """Archive finished orders created before ``before`` (YYYY-MM-DD)"""
+    order_archive = services().order_archive
+    if order_archive is None:
+        return jsonify({"error": "Archive is not configured"}), 404
+    data = request.get_json(silent=True) or {}
+    before = data.get("before") or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return jsonify({"archived": archive_orders(store, order_archive, before)})
+
+@api.route('/api/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
-    order = next((o for o in orders_data if o["id"] == order_id), None)
+    order = find_order(order_id)
     if order:
         return jsonify(order)
     return jsonify({"error": "Order not found"}), 404
 
-@app.route('/api/menu-items', methods=['GET'])
+@api.route('/api/orders/<int:order_id>/status', methods=['GET'])
+def get_order_status(order_id):
+    order = find_order(order_id)
+    if not order:
+        return jsonify({"error": "Order not found"}), 404
+    return jsonify({
+        "order_id": order_id,
+        "status": order["status"],
+        "estimated_delivery_time": order.get("estimated_delivery_time"),
+        "created_at": order.get("created_at"),
+    })
+
+@api.route('/api/orders/<int:order_id>', methods=['PUT'])
+def update_order(order_id):
+    data = request.get_json(silent=True) or {}
+    error = order_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+    # Prices come from the menu, never from the client
+    changes = {k: v for k, v in data.items() if k not in PRICING_FIELDS}
+    try:
+        if "items" in changes:
+            current = store.get_order(order_id)
+            if current is None:
+                return jsonify({"error": "Order not found"}), 404
+            quote = pricing.price_order({"restaurant_id": current["restaurant_id"], "items": changes["items"]})
+            error = unpriceable(quote)
+            if error:
+                return error
+            updated = priced(dict(current, **changes), quote)
+            changes.update({k: updated[k] for k in PRICING_FIELDS if k in updated})
+        order = store.update_order(order_id, changes)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if order:
+        return jsonify(order)
+    return jsonify({"error": "Order not found"}), 404
+
+@api.route('/api/menu-items', methods=['GET'])
 def get_menu_items():
-    return jsonify(menu_items_data)
+    return collection_response("menu_items", store.list_menu_items)
+
+def menu_item_error(item):
+    """Why ``item`` cannot be stored, or None; menus sort and price on these fields"""
+    for field in ("name", "category"):
+        if not isinstance(item.get(field), str) or not item[field].strip():
+            return f"{field} must be a non-empty string"
+    price = item.get("price")
+    if isinstance(price, bool) or not isinstance(price, (int, float)) or not 0 <= price < float('inf'):
+        return "price must be a number of at least 0"
+    if not isinstance(item.get("is_available", True), bool):
+        return "is_available must be true or false"
+    return None
 
-@app.route('/api/menu-items/<int:restaurant_id>', methods=['GET'])
+@api.route('/api/menu-items', methods=['POST'])
+def create_menu_item():
+    data = request.get_json(silent=True) or {}
+    missing = [f for f in ("restaurant_id", "name", "price", "category") if f not in data]
+    if missing:
+        return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
+    error = menu_item_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+    if store.get_restaurant(data["restaurant_id"]) is None:
+        return jsonify({"error": "Restaurant not found"}), 400
+    data.pop("id", None)
+    data.setdefault("is_available", True)
+    return jsonify(store.upsert_menu_item(data)), 201
+
+@api.route('/api/menu-items/<int:item_id>', methods=['PUT'])
+def update_menu_item(item_id):
+    item = store.get_menu_item(item_id)
+    if item is None:
+        return jsonify({"error": "Menu item not found"}), 404
+    data = request.get_json(silent=True) or {}
+    if store.get_restaurant(data.get("restaurant_id", item["restaurant_id"])) is None:
+        return jsonify({"error": "Restaurant not found"}), 400
+    updated = dict(item, **data)
+    updated["id"] = item_id
+    error = menu_item_error(updated)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(store.upsert_menu_item(updated))
+
+@api.route('/api/menu-items/<int:restaurant_id>', methods=['GET'])
 def get_restaurant_menu(restaurant_id):
-    items = [item for item in menu_items_data if item["restaurant_id"] == restaurant_id]
-    return jsonify(items)
+    if request.args.get('available_only', '').lower() == 'true':
+        return menu_response(restaurant_id, 'available_items')
+    return menu_response(restaurant_id, 'items')
+
+@api.route('/api/menu-items/restaurant/<int:restaurant_id>/menu', methods=['GET'])
+def get_restaurant_menu_tree(restaurant_id):
+    """Menu grouped into sorted categories, with availability flags"""
+    return menu_response(restaurant_id, 'tree')
 
-@app.route('/api/analytics', methods=['GET'])
+@api.route('/api/menu-items/restaurant/<int:restaurant_id>/categories', methods=['GET'])
+def get_menu_categories(restaurant_id):
+    return menu_response(restaurant_id, 'categories')
+
+@api.route('/api/analytics', methods=['GET'])
 def get_analytics():
-    return jsonify(analytics_data)
+    if request.args.get('approx') not in ('1', 'true'):
+        return jsonify(analytics_data)
+    # Streaming sketches over every order; unique customers are per restaurant per day
+    top = request.args.get('top', default=10, type=int)
+    report = approx_analytics.report(
+        top=max(1, min(top, 1000)),
+        restaurant_id=request.args.get('restaurant_id', type=int),
+        start=request.args.get('start'),
+        end=request.args.get('end'),
+    )
+    return jsonify(dict(analytics_data, **report))
+
+@api.route('/api/analytics/chain', methods=['GET'])
+def get_chain_analytics():
+    """Chain-wide totals and top restaurants, reduced in parallel shards"""
+    top = request.args.get('top', default=10, type=int)
+    return jsonify(chain_analytics.report(top=max(0, min(top, 1000))))
+
+@api.route('/api/analytics/history', methods=['GET'])
+def get_history_analytics():
+    """Monthly sales over live and archived orders (?start=&end=YYYY-MM-DD&restaurant_id=)"""
+    restaurant_id = request.args.get('restaurant_id', type=int)
+    orders = order_history(
+        JOB_COLUMNS["monthly_sales"], request.args.get('start'), request.args.get('end'), restaurant_id
+    )
+    return jsonify(monthly_sales(orders, restaurant_id))
 
-@app.route('/api/analytics/dashboard/<int:restaurant_id>', methods=['GET'])
+@api.route('/api/analytics/dashboard/<int:restaurant_id>', methods=['GET'])
 def get_dashboard_data(restaurant_id):
     """Get dashboard data for a specific restaurant"""
-    # Calculate dashboard metrics for the restaurant
-    restaurant_orders = [order for order in orders_data if order["restaurant_id"] == restaurant_id]
-    pending_orders = [order for order in restaurant_orders if order["status"] == "pending"]
-    
-    # Calculate today's revenue (using sample data)
-    today_revenue = sum(order["total"] for order in restaurant_orders if order["status"] == "completed")
-    
-    # Count active menu items for the restaurant
-    active_menu_items = len([item for item in menu_items_data if item["restaurant_id"] == restaurant_id])
-    
-    dashboard_data = {
-        "today_orders": len(restaurant_orders),
-        "pending_orders": len(pending_orders),
-        "today_revenue": today_revenue,
-        "active_menu_items": active_menu_items
-    }
+    # Aggregates are maintained by the store on every write, and by the archive
+    dashboard_data = services().dashboard(restaurant_id)
     
     return jsonify(dashboard_data)
 
+# Keyword parameters each background job type accepts
+JOB_PARAMS = {
+    "popular_items": ("restaurant_id", "limit"),
+    "monthly_sales": ("restaurant_id",),
+}
+
+# Order columns each job reads, so archived history is decoded selectively
+JOB_COLUMNS = {
+    "popular_items": ("restaurant_id", "status", "items", "order_items"),
+    "monthly_sales": ("restaurant_id", "status", "created_at", "total", "total_amount"),
+}
+
+def job_source(job_type):
+    """Where a job worker reads orders itself: the write-ahead log and archive"""
+    wal_dir = os.environ.get('WAL_DIR')
+    if not wal_dir:
+        return None
+    order_archive = services().order_archive
+    return {
+        "wal_dir": wal_dir,
+        "archive_dir": order_archive.directory if order_archive is not None else None,
+        "columns": JOB_COLUMNS[job_type],
+    }
+
+@api.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Run a heavy analytics computation in the background"""
+    data = request.get_json(silent=True) or {}
+    job_type = data.get("type")
+    if job_type not in JOB_TYPES:
+        return jsonify({"error": f"Unknown job type. Choose one of: {', '.join(sorted(JOB_TYPES))}"}), 400
+    params = data.get("params") or {}
+    if not isinstance(params, dict):
+        return jsonify({"error": "params must be an object"}), 400
+    unknown = set(params) - set(JOB_PARAMS[job_type])
+    if unknown:
+        return jsonify({"error": f"Unknown params: {', '.join(sorted(unknown))}"}), 400
+    try:
+        source = job_source(job_type)
+        # Without a write-ahead log the live orders exist only in this process
+        orders = None if source else order_history(JOB_COLUMNS[job_type], restaurant_id=params.get("restaurant_id"))
+        job = job_manager.submit(job_type, orders, source=source, **params)
+    except JobQueueFull as e:
+        return retry_later(503, str(e), 5)
+    return jsonify(job), 202
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job:
+        return jsonify(job)
+    return jsonify({"error": "Job not found"}), 404
+
+@api.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job:
+        return jsonify(job)
+    return jsonify({"error": "Job not found"}), 404
+
+def create_app(preload=None, app_services=None):
+    """Create the Flask app and the store it serves.
+
+    ``app_services`` defaults to ``Services.from_environment()``, which opens
+    (or recovers) the store here rather than at import. Heavy subsystems
+    (menu documents, change log, sketches, geo index, price index, chain
+    analytics columns) are built on first use. With ``preload`` (default: the PRELOAD_APP environment
+    variable) they are built now instead, so a ``gunicorn --preload`` master
+    builds them once and the forked worker shares them copy-on-write.
+    """
+    flask_app = Flask(__name__)
+    app_services = app_services or Services.from_environment()
+    flask_app.extensions['restaurantflow'] = app_services
+    proxies = int(os.environ.get('TRUST_PROXY') or 0)
+    if proxies:
+        # Only the addresses our own proxies appended count; anything to their
+        # left in X-Forwarded-For is client-controlled
+        flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app, x_for=proxies)
+    CORS(flask_app, origins=CORS_ORIGINS, expose_headers=["ETag", "X-Change-Seq"])
+    flask_app.register_blueprint(api)
+    if preload if preload is not None else os.environ.get('PRELOAD_APP', '').lower() in ('1', 'true'):
+        app_services.preload()
+    return flask_app
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
-    app.run(host='0.0.0.0', port=port, debug=True)
+    # No reloader: it would run a second process recovering the same log
+    create_app().run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
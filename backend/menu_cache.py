@@ -0,0 +1,80 @@
+"""
+Precomputed menu documents for RestaurantFlow_bhatiyani
+
+Each restaurant's menu is kept as a sorted category -> items tree together
+with its JSON encodings, so the menu endpoints return ready-made bytes
+instead of filtering and serializing ``menu_items`` on every request. When a
+single item changes only the restaurant(s) it belongs to are rebuilt.
+"""
+
+import json
+import threading
+
+
+def _encode(value):
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _is_available(item):
+    # Backend sample items predate the db.json ``is_available`` flag
+    return item.get("is_available", True)
+
+
+class MenuDocument:
+    """Immutable, pre-encoded menu for one restaurant."""
+
+    __slots__ = ("restaurant_id", "items", "available_items", "categories", "tree")
+
+    def __init__(self, restaurant_id, items):
+        self.restaurant_id = restaurant_id
+        by_category = {}
+        for item in items:
+            by_category.setdefault(item["category"], []).append(item)
+        tree = {
+            "restaurant_id": restaurant_id,
+            "categories": [
+                {
+                    "name": name,
+                    "available": any(_is_available(i) for i in rows),
+                    "items": [
+                        dict(i, is_available=_is_available(i))
+                        for i in sorted(rows, key=lambda i: (i["name"], i["id"]))
+                    ],
+                }
+                for name, rows in sorted(by_category.items())
+            ],
+        }
+        self.items = _encode(items)
+        self.available_items = _encode([i for i in items if _is_available(i)])
+        self.categories = _encode(sorted(by_category))
+        self.tree = _encode(tree)
+
+
+class MenuCache:
+    """Per-restaurant menu documents kept in step with the data store."""
+
+    def __init__(self, store):
+        self._items = {}  # restaurant id -> {item id: item}, in store order
+        for item in store.list_menu_items():
+            self._items.setdefault(item["restaurant_id"], {})[item["id"]] = item
+        self._documents = {rid: MenuDocument(rid, list(items.values())) for rid, items in self._items.items()}
+        self._lock = threading.Lock()
+        store.subscribe(self._on_change)
+
+    def document(self, restaurant_id):
+        """Menu document for ``restaurant_id`` (empty if it has no items)."""
+        document = self._documents.get(restaurant_id)
+        return document if document is not None else MenuDocument(restaurant_id, [])
+
+    def _on_change(self, op, data, previous):
+        if op != "menu_item":
+            return
+        with self._lock:
+            touched = {data["restaurant_id"]}
+            if previous is not None and previous["restaurant_id"] != data["restaurant_id"]:
+                self._items[previous["restaurant_id"]].pop(previous["id"], None)
+                touched.add(previous["restaurant_id"])
+            self._items.setdefault(data["restaurant_id"], {})[data["id"]] = data
+            for rid in touched:
+                # Single-key assignment: readers see the old or the new document
+                self._documents[rid] = MenuDocument(rid, list(self._items[rid].values()))
@@ -0,0 +1,151 @@
+"""
+Order pricing for RestaurantFlow_bhatiyani
+
+Resolves order items (bare names such as "Naan", or dicts carrying a
+``menu_item_id`` / ``name``, ``quantity`` and ``modifiers``) to menu items and
+computes line totals, subtotal, tax and total. All arithmetic is done in
+integer cents so that batch results add up exactly. Malformed items raise
+ValueError; items that are not on the restaurant's menu are reported as
+unmatched.
+"""
+
+import math
+import os
+
+DEFAULT_TAX_RATE = float(os.environ.get('TAX_RATE', 0.08))
+
+
+def _cents(amount):
+    return int(round(float(amount) * 100))
+
+
+def _dollars(cents):
+    return cents / 100
+
+
+def _price_cents(amount):
+    """Cents for a finite, non-negative price, or None if it is not one"""
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not (amount >= 0 and math.isfinite(amount)):
+        return None
+    return _cents(amount)
+
+
+class PriceIndex:
+    """Menu prices keyed by (restaurant id, item id) and (restaurant id, item name).
+
+    Items without a usable price or name are left out, so they price as
+    unmatched instead of failing every quote.
+    """
+
+    def __init__(self, menu_items):
+        self.by_id = {}
+        self.by_name = {}
+        for item in menu_items:
+            unit = _price_cents(item.get("price"))
+            if unit is None or not isinstance(item.get("name"), str):
+                continue
+            entry = (item["id"], item["name"], unit)
+            self.by_id[(item["restaurant_id"], item["id"])] = entry
+            self.by_name[(item["restaurant_id"], item["name"].casefold())] = entry
+
+    def resolve(self, restaurant_id, ref):
+        """Return ``(id, name, unit_cents)`` for an item reference, or None."""
+        if isinstance(ref, str):
+            return self.by_name.get((restaurant_id, ref.casefold()))
+        if ref.get("menu_item_id") is not None:
+            if isinstance(ref["menu_item_id"], (list, dict)):
+                raise ValueError("menu_item_id must be an integer")
+            return self.by_id.get((restaurant_id, ref["menu_item_id"]))
+        if isinstance(ref.get("name"), str):
+            return self.by_name.get((restaurant_id, ref["name"].casefold()))
+        return None
+
+
+def _quantity(ref):
+    if isinstance(ref, str):
+        return 1
+    quantity = ref.get("quantity", 1)
+    if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+        raise ValueError("Item quantity must be a whole number of at least 1")
+    return quantity
+
+
+def _modifiers_cents(ref):
+    if isinstance(ref, str):
+        return 0
+    modifiers = ref.get("modifiers") or []
+    if not isinstance(modifiers, list) or not all(isinstance(m, dict) for m in modifiers):
+        raise ValueError("Item modifiers must be a list of objects")
+    total = 0
+    for modifier in modifiers:
+        cents = _price_cents(modifier.get("price", 0))
+        if cents is None:
+            raise ValueError("Modifier price must be a number of at least 0")
+        total += cents
+    return total
+
+
+class PricingEngine:
+    """Prices orders against the store's current menu."""
+
+    def __init__(self, store, tax_rate=DEFAULT_TAX_RATE):
+        self._store = store
+        self.tax_rate = tax_rate
+        self._cached = (None, None)
+
+    def index(self):
+        """Price index for the current menu, rebuilt only when the menu changes."""
+        menu_items = self._store.snapshot().menu_items
+        cached_items, index = self._cached
+        if cached_items is not menu_items:
+            index = PriceIndex(menu_items)
+            self._cached = (menu_items, index)
+        return index
+
+    def price_order(self, order):
+        return self.price_orders([order])[0]
+
+    def price_orders(self, orders):
+        """Price a batch of orders in one pass over a single index."""
+        resolve = self.index().resolve
+        tax_rate = self.tax_rate
+        results = []
+        for order in orders:
+            if not isinstance(order, dict):
+                raise ValueError("Each order must be an object")
+            restaurant_id = order.get("restaurant_id")
+            if isinstance(restaurant_id, (list, dict)):
+                raise ValueError("restaurant_id must be an integer")
+            items = order.get("items") or []
+            if not isinstance(items, list) or not all(isinstance(ref, (str, dict)) for ref in items):
+                raise ValueError("Order items must be a list of names or objects")
+            lines = []
+            unmatched = []
+            subtotal = 0
+            for ref in items:
+                quantity = _quantity(ref)
+                modifiers = _modifiers_cents(ref)
+                match = resolve(restaurant_id, ref)
+                if match is None:
+                    unmatched.append(ref if isinstance(ref, str) else ref.get("name", ref.get("menu_item_id")))
+                    continue
+                item_id, name, unit = match
+                line = (unit + modifiers) * quantity
+                subtotal += line
+                lines.append({
+                    "menu_item_id": item_id,
+                    "name": name,
+                    "quantity": quantity,
+                    "unit_price": _dollars(unit),
+                    "modifiers_price": _dollars(modifiers),
+                    "total_price": _dollars(line),
+                })
+            tax = int(round(subtotal * tax_rate))
+            results.append({
+                "order_items": lines,
+                "unmatched_items": unmatched,
+                "subtotal": _dollars(subtotal),
+                "tax": _dollars(tax),
+                "total": _dollars(subtotal + tax),
+            })
+        return results
@@ -0,0 +1,191 @@
+"""
+Rate limiting and admission control for RestaurantFlow_bhatiyani
+
+Token buckets limit each client overall and per route. Buckets live either in
+process memory or, for several gunicorn workers, in a memory-mapped file that
+all workers share (byte-range locks keep slots independent). The admission
+controller sheds load with 503s when too many requests are in flight, when
+recent latency is too high or when a request already waited too long in the
+proxy's queue, so priority routes stay responsive. Under gunicorn the backlog
+builds up in front of the worker rather than inside it, so the proxy's
+X-Request-Start header (see ``queue_wait``) is the useful signal there.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_SLOT = struct.Struct("dd")  # tokens, last refill time
+_STRIPES = 64
+
+
+def _refill(tokens, last, now, rate, burst):
+    if last == 0:
+        return float(burst)
+    return min(float(burst), tokens + (now - last) * rate)
+
+
+def _take(tokens, rate):
+    """Consume one token; returns ``(tokens, retry_after or 0)``."""
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class LocalBuckets:
+    """Token buckets for a single process.
+
+    Each lock stripe keeps its buckets in least-recently-used order. Buckets
+    that have refilled completely are dropped (a full bucket is the same as
+    none), and beyond ``max_keys`` the least recently used go first, so
+    clients rotating their address cannot grow memory without bound.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self._per_stripe = max(1, max_keys // _STRIPES)
+        self._stripes = [OrderedDict() for _ in range(_STRIPES)]  # key -> (tokens, last, full at)
+        self._locks = [threading.Lock() for _ in range(_STRIPES)]
+
+    def __len__(self):
+        return sum(len(buckets) for buckets in self._stripes)
+
+    def take(self, key, rate, burst, now=None):
+        now = time.monotonic() if now is None else now
+        stripe = hash(key) % _STRIPES
+        buckets = self._stripes[stripe]
+        with self._locks[stripe]:
+            tokens, last, _ = buckets.pop(key, (0.0, 0.0, 0.0))
+            tokens, retry_after = _take(_refill(tokens, last, now, rate, burst), rate)
+            buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            while len(buckets) > self._per_stripe:
+                buckets.popitem(last=False)
+            while buckets:
+                oldest = next(iter(buckets.values()))
+                if oldest[2] > now:
+                    break
+                buckets.popitem(last=False)
+        return retry_after
+
+
+class SharedBuckets:
+    """Token buckets in a memory-mapped file shared by all workers.
+
+    Keys are hashed into a fixed number of slots, so two clients can
+    occasionally share a bucket; size ``slots`` well above the number of
+    active clients. Wall-clock time is used because monotonic clocks are not
+    comparable across processes.
+    """
+
+    def __init__(self, path, slots=65536):
+        self.slots = slots
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = slots * _SLOT.size
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # POSIX record locks do not exclude threads of the same process
+        self._locks = [threading.Lock() for _ in range(_STRIPES)]
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        slot = zlib.crc32(key.encode("utf-8")) % self.slots
+        offset = slot * _SLOT.size
+        with self._locks[slot % _STRIPES]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _SLOT.size, offset)
+            try:
+                tokens, last = _SLOT.unpack_from(self._map, offset)
+                tokens, retry_after = _take(_refill(tokens, last, now, rate, burst), rate)
+                _SLOT.pack_into(self._map, offset, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _SLOT.size, offset)
+        return retry_after
+
+
+class RateLimiter:
+    """Per-client and per-route token bucket limits."""
+
+    def __init__(self, buckets, client_rate, client_burst, route_limits=None):
+        self.buckets = buckets
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.route_limits = route_limits or {}  # endpoint -> (rate, burst)
+
+    def check(self, client, route):
+        """Seconds until ``client`` may call ``route`` again; 0 if allowed now."""
+        retry_after = self.buckets.take(f"client:{client}", self.client_rate, self.client_burst)
+        if retry_after:
+            return retry_after
+        limit = self.route_limits.get(route)
+        if limit is None:
+            return 0.0
+        return self.buckets.take(f"route:{route}:{client}", *limit)
+
+
+def queue_wait(header, now=None):
+    """Seconds since the proxy received a request, from its X-Request-Start.
+
+    Accepts ``t=<time>`` or a bare number, in seconds, milliseconds or
+    microseconds since the epoch (proxies differ). Returns 0.0 when the header
+    is missing or unparseable.
+    """
+    if not header:
+        return 0.0
+    try:
+        started = float(header.strip().removeprefix("t="))
+    except ValueError:
+        return 0.0
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    now = time.time() if now is None else now
+    return max(0.0, now - started)
+
+
+class AdmissionController:
+    """Sheds load when in-flight requests, recent latency or queueing cross a threshold."""
+
+    def __init__(self, max_in_flight, max_latency, max_queue_wait=None, decay_seconds=1.0):
+        self.max_in_flight = max_in_flight
+        self.max_latency = max_latency
+        self.max_queue_wait = max_queue_wait
+        self.decay_seconds = decay_seconds
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latency = 0.0
+        self._updated = time.monotonic()
+
+    def latency(self, now=None):
+        """Smoothed latency, decaying while nothing completes so shedding ends."""
+        now = time.monotonic() if now is None else now
+        return self._latency * 0.5 ** ((now - self._updated) / self.decay_seconds)
+
+    def admit(self, queued=0.0):
+        """Start a request that spent ``queued`` seconds in the proxy's queue;
+        returns False if it should be shed."""
+        if self.max_queue_wait is not None and queued > self.max_queue_wait:
+            return False
+        with self._lock:
+            if self._in_flight >= self.max_in_flight or self.latency() > self.max_latency:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, elapsed, sample=True):
+        """Finish a request; ``elapsed`` should include its queueing time.
+
+        Requests that are slow by design pass ``sample=False`` so they only
+        free their slot and never push up the latency that others are shed on.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if not sample:
+                return
+            now = time.monotonic()
+            self._latency = 0.8 * self.latency(now) + 0.2 * elapsed
+            self._updated = now
@@ -76,7 +76,7 @@ fi
 echo -e "${YELLOW}🔍 Testing server startup...${NC}"
 timeout 5 python3 -c "
 import main
-app = main.app
+app = main.create_app()
 with app.test_client() as client:
     response = client.get('/')
     if response.status_code == 200:
@@ -0,0 +1,375 @@
+"""
+Streaming sketches for approximate analytics in RestaurantFlow_bhatiyani
+
+Count-Min + Space-Saving track the most ordered menu items and HyperLogLog
+counts distinct customers, all in fixed memory. Every sketch supports
+``merge`` (sketches from different days or gunicorn workers combine into the
+sketch of the union) and pickles as plain arrays.
+
+Most (restaurant, day) customer sets are small, so a HyperLogLog starts out
+sparse (only the registers that are set) and turns dense once that stops
+saving memory.
+"""
+
+import hashlib
+import heapq
+import itertools
+import math
+import threading
+from array import array
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from analytics import item_counts
+
+
+@lru_cache(maxsize=1 << 16)  # item names and regular customers repeat a lot
+def _hash128(key):
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+@lru_cache(maxsize=1 << 14)
+def _cells(key, width, depth):
+    h1, h2 = _hash128(key)
+    return tuple((h1 + i * h2) % width for i in range(depth))
+
+
+class CountMinSketch:
+    """Frequency estimates that never undercount.
+
+    With probability ``1 - delta`` an estimate exceeds the true count by at
+    most ``epsilon * total``, where ``epsilon = e / width`` and
+    ``delta = e ** -depth``.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.rows = [array("q", bytes(8 * width)) for _ in range(depth)]
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def _cells(self, key):
+        return _cells(key, self.width, self.depth)
+
+    def add(self, key, count=1):
+        for row, cell in zip(self.rows, _cells(key, self.width, self.depth)):
+            row[cell] += count
+        self.total += count
+
+    def estimate(self, key):
+        return min(row[cell] for row, cell in zip(self.rows, self._cells(key)))
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Count-Min sketches must have the same shape to merge")
+        for mine, theirs in zip(self.rows, other.rows):
+            for cell, value in enumerate(theirs):
+                if value:
+                    mine[cell] += value
+        self.total += other.total
+        return self
+
+
+class SpaceSaving:
+    """Candidate heavy hitters: any key with frequency above total / capacity is kept."""
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}  # key -> (count, overestimate)
+        self._heap = []  # (count, tiebreak, key), one per key; counts may be stale (too low)
+        self._tiebreak = itertools.count()
+
+    def __getstate__(self):
+        return {"capacity": self.capacity, "counts": self.counts}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reheap()
+
+    def _reheap(self):
+        self._tiebreak = itertools.count()
+        self._heap = [(count, next(self._tiebreak), key) for key, (count, _) in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        """Remove and return the key with the smallest count."""
+        heap = self._heap
+        while True:
+            count, _, key = heapq.heappop(heap)
+            current = self.counts[key][0]
+            if current == count:
+                return key
+            heapq.heappush(heap, (current, next(self._tiebreak), key))
+
+    def add(self, key, count=1):
+        if key in self.counts:
+            current, error = self.counts[key]
+            self.counts[key] = (current + count, error)
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = (count, 0)
+        else:
+            floor = self.counts.pop(self._pop_min())[0]
+            count, self.counts[key] = floor + count, (floor + count, floor)
+        heapq.heappush(self._heap, (count, next(self._tiebreak), key))
+
+    def merge(self, other):
+        # Keys missing from a full summary may have up to its minimum count
+        mine_floor = min((c for c, _ in self.counts.values()), default=0) if len(self.counts) >= self.capacity else 0
+        their_floor = min((c for c, _ in other.counts.values()), default=0) if len(other.counts) >= other.capacity else 0
+        merged = {}
+        for key in set(self.counts) | set(other.counts):
+            c1, e1 = self.counts.get(key, (mine_floor, mine_floor))
+            c2, e2 = other.counts.get(key, (their_floor, their_floor))
+            merged[key] = (c1 + c2, e1 + e2)
+        top = sorted(merged.items(), key=lambda kv: -kv[1][0])[:self.capacity]
+        self.counts = dict(top)
+        self._reheap()
+        return self
+
+    def candidates(self):
+        return list(self.counts)
+
+
+class HyperLogLog:
+    """Distinct count with relative standard error ``1.04 / sqrt(2 ** precision)``.
+
+    Starts sparse: parallel arrays of set register indices and ranks (three
+    bytes per register) until more than 1/8 of the registers are set, then
+    switches to one dense byte per register. Estimates are the same either way.
+    """
+
+    __slots__ = ("precision", "registers", "_indices", "_ranks")
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = None  # dense bytearray once ``_indices`` grows too long
+        self._indices = array("I")
+        self._ranks = bytearray()
+
+    def __getstate__(self):
+        return {"precision": self.precision, "registers": self.registers,
+                "_indices": self._indices, "_ranks": self._ranks}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def standard_error(self):
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    @property
+    def sparse(self):
+        return self.registers is None
+
+    def _set(self, index, rank):
+        if self.registers is not None:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+            return
+        try:
+            position = self._indices.index(index)
+        except ValueError:
+            self._indices.append(index)
+            self._ranks.append(rank)
+            if len(self._indices) > (1 << self.precision) // 8:
+                self._densify()
+            return
+        if rank > self._ranks[position]:
+            self._ranks[position] = rank
+
+    def _densify(self):
+        registers = bytearray(1 << self.precision)
+        for index, rank in zip(self._indices, self._ranks):
+            registers[index] = rank
+        self.registers = registers
+        self._indices = array("I")
+        self._ranks = bytearray()
+
+    def add(self, value):
+        h, _ = _hash128(value)
+        index = h >> (64 - self.precision)
+        rest = (h << self.precision) & ((1 << 64) - 1)
+        rank = 64 - self.precision + 1 if rest == 0 else 65 - rest.bit_length()
+        self._set(index, rank)
+
+    def count(self):
+        m = 1 << self.precision
+        if self.registers is None:
+            zeros = m - len(self._indices)
+            harmonic = zeros + sum(2.0 ** -r for r in self._ranks)
+        else:
+            zeros = self.registers.count(0)
+            harmonic = sum(2.0 ** -r for r in self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / harmonic
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def merge(self, other):
+        if self.precision != other.precision:
+            raise ValueError("HyperLogLogs must have the same precision to merge")
+        if other.registers is None:
+            for index, rank in zip(other._indices, other._ranks):
+                self._set(index, rank)
+            return self
+        if self.registers is None:
+            self._densify()
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+
+class ItemSketch:
+    """Top-K items: Space-Saving picks candidates, Count-Min ranks them."""
+
+    def __init__(self, capacity=100, width=2048, depth=4):
+        self.frequencies = CountMinSketch(width, depth)
+        self.heavy_hitters = SpaceSaving(capacity)
+
+    def add(self, key, count=1):
+        self.frequencies.add(key, count)
+        self.heavy_hitters.add(key, count)
+
+    def merge(self, other):
+        self.frequencies.merge(other.frequencies)
+        self.heavy_hitters.merge(other.heavy_hitters)
+        return self
+
+    def top(self, k):
+        estimates = [(key, self.frequencies.estimate(key)) for key in self.heavy_hitters.candidates()]
+        estimates.sort(key=lambda kv: (-kv[1], str(kv[0])))
+        return estimates[:k]
+
+    def error_bound(self):
+        return math.ceil(self.frequencies.epsilon * self.frequencies.total)
+
+
+def _customer_key(order):
+    return order.get("customer_email") or order.get("customer_phone") or order.get("customer_name")
+
+
+def _order_day(order):
+    created = order.get("created_at")
+    return created[:10] if created else datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class ApproxAnalytics:
+    """Per-day item and customer sketches, updated on every order insert.
+
+    Item sketches cover the whole chain; customer counts are per restaurant.
+    Sketches are only touched under ``_lock``; reports take it once per
+    sketch they read, so a long report never holds up writers for long.
+    """
+
+    def __init__(self, store=None, capacity=100, width=2048, depth=4, precision=12):
+        self._shape = (capacity, width, depth)
+        self.precision = precision
+        self._lock = threading.Lock()
+        self.items_by_day = {}  # day -> ItemSketch
+        self.items_all_time = ItemSketch(capacity, width, depth)
+        self.customers = {}  # (restaurant id, day) -> HyperLogLog
+        if store is not None:
+            for order in store.list_orders():
+                self.add_order(order)
+            store.subscribe(self._on_change)
+
+    def _on_change(self, op, data, previous):
+        if op == "order" and previous is None:
+            self.add_order(data)
+
+    def add_order(self, order):
+        with self._lock:
+            self._add_order(order)
+
+    def _add_order(self, order):
+        day = _order_day(order)
+        sketch = self.items_by_day.get(day)
+        if sketch is None:
+            sketch = self.items_by_day[day] = ItemSketch(*self._shape)
+        for name, quantity in item_counts(order):
+            sketch.add(name, quantity)
+            self.items_all_time.add(name, quantity)
+        customer = _customer_key(order)
+        if customer:
+            key = (order["restaurant_id"], day)
+            hll = self.customers.get(key)
+            if hll is None:
+                hll = self.customers[key] = HyperLogLog(self.precision)
+            hll.add(customer)
+
+    def merge(self, other):
+        """Fold in sketches from another worker."""
+        with self._lock:
+            return self._merge(other)
+
+    def _merge(self, other):
+        self.items_all_time.merge(other.items_all_time)
+        for day, sketch in other.items_by_day.items():
+            if day in self.items_by_day:
+                self.items_by_day[day].merge(sketch)
+            else:
+                self.items_by_day[day] = sketch
+        for key, hll in other.customers.items():
+            if key in self.customers:
+                self.customers[key].merge(hll)
+            else:
+                self.customers[key] = hll
+        return self
+
+    def report(self, top=10, restaurant_id=None, start=None, end=None):
+        """Approximate popular items and unique customers for a date range.
+
+        ``restaurant_id`` narrows the customer counts only: popular items are
+        always chain-wide (``popular_items_scope`` in the result says so).
+        """
+        def in_range(day):
+            return (start is None or day >= start) and (end is None or day <= end)
+
+        items = ItemSketch(*self._shape)
+        with self._lock:
+            if start is None and end is None:
+                items.merge(self.items_all_time)
+            days = [sketch for day, sketch in self.items_by_day.items() if in_range(day)]
+            selected = sorted(
+                (key, hll) for key, hll in self.customers.items() if in_range(key[1]) and restaurant_id in (None, key[0])
+            )
+        if start is not None or end is not None:
+            for sketch in days:
+                with self._lock:
+                    items.merge(sketch)
+        customers = []
+        for (rid, day), hll in selected:
+            with self._lock:
+                count = hll.count()
+            customers.append({"restaurant_id": rid, "date": day, "unique_customers": count})
+        hll_error = HyperLogLog(self.precision).standard_error
+        cms = items.frequencies
+        return {
+            "approximate": True,
+            "popular_items": [{"name": name, "orders": count} for name, count in items.top(top)],
+            "popular_items_scope": "chain",
+            "unique_customers": customers,
+            "error_bounds": {
+                "popular_items": {
+                    "max_overcount": items.error_bound(),
+                    "confidence": round(1 - cms.delta, 4),
+                    "description": "Counts never undercount and exceed the true count by at most "
+                                   "max_overcount with the given confidence",
+                },
+                "unique_customers": {
+                    "relative_standard_error": round(hll_error, 4),
+                    "description": "About 95% of estimates are within two standard errors of the true count",
+                },
+            },
+        }
@@ -0,0 +1,481 @@
+"""
+In-memory data store for RestaurantFlow_bhatiyani
+
+Readers never block: every read goes through an immutable snapshot that is
+swapped in atomically after a write. Writers are serialized per restaurant,
+so orders for different restaurants are built concurrently and only the
+final (cheap) snapshot swap is globally ordered.
+"""
+
+import bisect
+import heapq
+import itertools
+import logging
+import threading
+
+ORDER_STATUSES = ("pending", "confirmed", "preparing", "ready", "completed", "delivered", "cancelled")
+COMPLETED_STATUSES = ("completed", "delivered")
+
+logger = logging.getLogger(__name__)
+
+
+def _dispatch(listeners, op, data, previous):
+    # The write is already published (and journaled): one failing listener
+    # must not keep the others from seeing it
+    for listener in listeners:
+        try:
+            listener(op, data, previous)
+        except Exception:
+            logger.exception("Store listener failed on %s", op)
+
+
+def order_total(order):
+    """Orders carry either ``total`` (backend) or ``total_amount`` (db.json)."""
+    total = order.get("total")
+    if total is None:
+        total = order.get("total_amount")
+    return total or 0
+
+
+class OrderChunks:
+    """Persistent, id-sorted sequence of orders stored in fixed-size chunks.
+
+    Appending or replacing an order copies one chunk plus the (short) chunk
+    index, so a write costs O(n / CHUNK_SIZE) instead of O(n) and older
+    versions stay valid for readers that still hold them.
+    """
+
+    CHUNK_SIZE = 512
+
+    __slots__ = ("chunks", "size")
+
+    def __init__(self, chunks=(), size=0):
+        self.chunks = chunks
+        self.size = size
+
+    @classmethod
+    def from_orders(cls, orders):
+        orders = tuple(orders)
+        chunks = tuple(orders[i:i + cls.CHUNK_SIZE] for i in range(0, len(orders), cls.CHUNK_SIZE))
+        return cls(chunks, len(orders))
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.chunks)
+
+    def _locate(self, order_id):
+        index = bisect.bisect_right(self.chunks, order_id, key=lambda c: c[0]["id"]) - 1
+        if index < 0:
+            return None, None
+        chunk = self.chunks[index]
+        offset = bisect.bisect_left(chunk, order_id, key=lambda o: o["id"])
+        if offset < len(chunk) and chunk[offset]["id"] == order_id:
+            return index, offset
+        return index, None
+
+    def get(self, order_id):
+        index, offset = self._locate(order_id)
+        return None if offset is None else self.chunks[index][offset]
+
+    def with_order(self, order):
+        """Return ``(new_sequence, previous_order_or_None)``."""
+        index, offset = self._locate(order["id"])
+        if offset is not None:
+            chunk = self.chunks[index]
+            previous = chunk[offset]
+            chunk = chunk[:offset] + (order,) + chunk[offset + 1:]
+            return OrderChunks(self.chunks[:index] + (chunk,) + self.chunks[index + 1:], self.size), previous
+        if self.chunks and order["id"] < self.chunks[-1][-1]["id"]:
+            raise ValueError("Orders must be appended in id order")
+        if self.chunks and len(self.chunks[-1]) < self.CHUNK_SIZE:
+            chunks = self.chunks[:-1] + (self.chunks[-1] + (order,),)
+        else:
+            chunks = self.chunks + ((order,),)
+        return OrderChunks(chunks, self.size + 1), None
+
+
+class RestaurantPartition:
+    """Immutable orders and aggregates for a single restaurant."""
+
+    __slots__ = ("restaurant_id", "orders", "status_counts", "completed_revenue")
+
+    def __init__(self, restaurant_id, orders=None, status_counts=None, completed_revenue=0.0):
+        self.restaurant_id = restaurant_id
+        self.orders = orders if orders is not None else OrderChunks()
+        if status_counts is None:
+            status_counts = {}
+            completed_revenue = 0.0
+            for order in self.orders:
+                status_counts[order["status"]] = status_counts.get(order["status"], 0) + 1
+                if order["status"] in COMPLETED_STATUSES:
+                    completed_revenue += order_total(order)
+        self.status_counts = status_counts
+        self.completed_revenue = round(completed_revenue, 2)
+
+    def get(self, order_id):
+        return self.orders.get(order_id)
+
+    def with_order(self, order):
+        """Return a new partition with ``order`` inserted or replaced."""
+        orders, previous = self.orders.with_order(order)
+        status_counts = dict(self.status_counts)
+        revenue = self.completed_revenue
+        if previous is not None:
+            status_counts[previous["status"]] -= 1
+            if not status_counts[previous["status"]]:
+                del status_counts[previous["status"]]
+            if previous["status"] in COMPLETED_STATUSES:
+                revenue -= order_total(previous)
+        status_counts[order["status"]] = status_counts.get(order["status"], 0) + 1
+        if order["status"] in COMPLETED_STATUSES:
+            revenue += order_total(order)
+        return RestaurantPartition(self.restaurant_id, orders, status_counts, revenue)
+
+
+def _positions(rows):
+    return {row["id"]: i for i, row in enumerate(rows)}
+
+
+class Snapshot:
+    """A consistent, read-only view of the whole store.
+
+    ``restaurant_index`` and ``menu_item_index`` map ids to positions in
+    their tuples; they are published together with the tuples they index.
+    """
+
+    __slots__ = ("version", "restaurants", "menu_items", "partitions", "restaurant_index", "menu_item_index")
+
+    def __init__(self, version, restaurants, menu_items, partitions, restaurant_index=None, menu_item_index=None):
+        self.version = version
+        self.restaurants = restaurants
+        self.menu_items = menu_items
+        self.partitions = partitions
+        self.restaurant_index = _positions(restaurants) if restaurant_index is None else restaurant_index
+        self.menu_item_index = _positions(menu_items) if menu_item_index is None else menu_item_index
+
+    def restaurant(self, restaurant_id):
+        position = self.restaurant_index.get(restaurant_id)
+        return None if position is None else self.restaurants[position]
+
+    def menu_item(self, item_id):
+        position = self.menu_item_index.get(item_id)
+        return None if position is None else self.menu_items[position]
+
+    def orders(self):
+        """All orders in id order, merged from the per-restaurant partitions."""
+        return list(heapq.merge(*(p.orders for p in self.partitions.values()), key=lambda o: o["id"]))
+
+
+class PinnedStore:
+    """Read-only store interface fixed at one snapshot, for ``DataStore.attach``."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self.listeners = []
+
+    def snapshot(self):
+        return self._snapshot
+
+    def list_restaurants(self):
+        return list(self._snapshot.restaurants)
+
+    def list_orders(self):
+        return self._snapshot.orders()
+
+    def list_menu_items(self):
+        return list(self._snapshot.menu_items)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+
+class DataStore:
+    """Copy-on-write store for restaurants, menu items and orders."""
+
+    def __init__(self, restaurants=(), orders=(), menu_items=(), journal=None, last_order_id=0):
+        by_restaurant = {}
+        for order in sorted(orders, key=lambda o: o["id"]):
+            by_restaurant.setdefault(order["restaurant_id"], []).append(dict(order))
+        partitions = {rid: RestaurantPartition(rid, OrderChunks.from_orders(rows)) for rid, rows in by_restaurant.items()}
+        self._snapshot = Snapshot(
+            0,
+            tuple(dict(r) for r in restaurants),
+            tuple(dict(m) for m in menu_items),
+            partitions,
+        )
+        # order id -> restaurant id; single-key dict assignment is atomic, so
+        # readers may use it without locking.
+        self._order_locations = {o["id"]: o["restaurant_id"] for p in partitions.values() for o in p.orders}
+        # Ids of removed (archived) orders are never reused
+        self._last_order_id = max([last_order_id, *self._order_locations])
+        self._order_ids = itertools.count(self._last_order_id + 1)
+        self._publish_lock = threading.Lock()
+        self._locks_guard = threading.Lock()
+        self._restaurant_locks = {}
+        self._journal = journal
+        self._checkpointing = False
+        self._listeners = []
+
+    # Reads ---------------------------------------------------------------
+
+    def snapshot(self):
+        return self._snapshot
+
+    def list_restaurants(self):
+        return list(self._snapshot.restaurants)
+
+    def get_restaurant(self, restaurant_id):
+        return self._snapshot.restaurant(restaurant_id)
+
+    def list_orders(self):
+        return self._snapshot.orders()
+
+    def get_order(self, order_id):
+        restaurant_id = self._order_locations.get(order_id)
+        if restaurant_id is None:
+            return None
+        partition = self._snapshot.partitions.get(restaurant_id)
+        return partition.get(order_id) if partition else None
+
+    def list_menu_items(self):
+        return list(self._snapshot.menu_items)
+
+    def get_menu_item(self, item_id):
+        return self._snapshot.menu_item(item_id)
+
+    def restaurant_menu(self, restaurant_id):
+        return [item for item in self._snapshot.menu_items if item["restaurant_id"] == restaurant_id]
+
+    def dashboard(self, restaurant_id):
+        snap = self._snapshot
+        partition = snap.partitions.get(restaurant_id) or RestaurantPartition(restaurant_id)
+        return {
+            "today_orders": len(partition.orders),
+            "pending_orders": partition.status_counts.get("pending", 0),
+            "today_revenue": partition.completed_revenue,
+            "active_menu_items": sum(1 for item in snap.menu_items if item["restaurant_id"] == restaurant_id),
+        }
+
+    # Writes --------------------------------------------------------------
+
+    def _restaurant_lock(self, restaurant_id):
+        lock = self._restaurant_locks.get(restaurant_id)
+        if lock is None:
+            with self._locks_guard:
+                lock = self._restaurant_locks.setdefault(restaurant_id, threading.Lock())
+        return lock
+
+    def _publish(self, **changes):
+        """Swap in a new snapshot; caller must hold ``_publish_lock``."""
+        snap = self._snapshot
+        fields = {
+            "restaurants": snap.restaurants,
+            "menu_items": snap.menu_items,
+            "partitions": snap.partitions,
+            "restaurant_index": snap.restaurant_index,
+            "menu_item_index": snap.menu_item_index,
+        }
+        fields.update(changes)
+        self._snapshot = Snapshot(snap.version + 1, **fields)
+        return self._snapshot
+
+    def subscribe(self, listener):
+        """Register ``listener(op, data, previous)`` to run on every write.
+
+        Listeners run under the publish lock, right after the new snapshot is
+        swapped in, so derived structures stay in step with the store. They
+        must be quick and must not write back to the store; an exception is
+        logged and does not stop the other listeners.
+        """
+        self._listeners.append(listener)
+
+    def attach(self, build):
+        """Build a derived structure after startup without blocking writers.
+
+        ``build(store)`` reads and subscribes exactly as it would at startup,
+        but against a store pinned at the current snapshot. Writes published
+        meanwhile are buffered and replayed to its listeners before they go
+        live, so nothing is missed or seen twice. Returns what ``build``
+        returns.
+        """
+        missed = []
+
+        def buffer(op, data, previous):
+            missed.append((op, data, previous))
+
+        with self._publish_lock:
+            pinned = PinnedStore(self._snapshot)
+            self._listeners.append(buffer)
+        try:
+            built = build(pinned)
+        except BaseException:
+            with self._publish_lock:
+                self._listeners.remove(buffer)
+            raise
+        with self._publish_lock:
+            self._listeners.remove(buffer)
+            for event in missed:
+                _dispatch(pinned.listeners, *event)
+            self._listeners.extend(pinned.listeners)
+        return built
+
+    def _notify(self, op, data, previous):
+        _dispatch(self._listeners, op, data, previous)
+
+    def _log(self, op, data):
+        """Journal a mutation; caller must hold ``_publish_lock``."""
+        return self._journal.append(op, data) if self._journal else 0
+
+    def _sync(self, seq):
+        """Wait for ``seq`` to be durable, outside of any store lock."""
+        if not self._journal:
+            return
+        self._journal.sync(seq)
+        if self._journal.needs_checkpoint() and not self._checkpointing:
+            self._checkpointing = True
+            threading.Thread(target=self.checkpoint, daemon=True).start()
+
+    def _write_order(self, order):
+        """Publish ``order``; returns its journal sequence number."""
+        restaurant_id = order["restaurant_id"]
+        # The restaurant lock is held by the caller, so nobody else can replace
+        # this partition while the new one is being built.
+        current = self._snapshot.partitions.get(restaurant_id) or RestaurantPartition(restaurant_id)
+        previous = current.get(order["id"])
+        partition = current.with_order(order)
+        with self._publish_lock:
+            seq = self._log("order", order)
+            partitions = dict(self._snapshot.partitions)
+            partitions[restaurant_id] = partition
+            self._publish(partitions=partitions)
+            self._order_locations[order["id"]] = restaurant_id
+            self._last_order_id = max(self._last_order_id, order["id"])
+            self._notify("order", order, previous)
+        return seq
+
+    def create_order(self, data):
+        """Insert a new order and return it with its assigned id."""
+        if self.get_restaurant(data.get("restaurant_id")) is None:
+            raise ValueError("Restaurant not found")
+        order = dict(data)
+        order.setdefault("status", "pending")
+        with self._restaurant_lock(order["restaurant_id"]):
+            order["id"] = next(self._order_ids)
+            seq = self._write_order(order)
+        self._sync(seq)
+        return order
+
+    def update_order(self, order_id, changes, only_if=None):
+        """Apply ``changes`` to an existing order; returns None if missing.
+
+        ``only_if(order)`` is checked against the current order under the
+        restaurant lock; when it is false nothing is written and None is
+        returned.
+        """
+        restaurant_id = self._order_locations.get(order_id)
+        if restaurant_id is None:
+            return None
+        if changes.get("restaurant_id", restaurant_id) != restaurant_id:
+            raise ValueError("Orders cannot move between restaurants")
+        with self._restaurant_lock(restaurant_id):
+            partition = self._snapshot.partitions.get(restaurant_id)
+            # Removed (e.g. archived) since the lookup above
+            current = partition.get(order_id) if partition else None
+            if current is None or only_if is not None and not only_if(current):
+                return None
+            order = dict(current)
+            order.update(changes)
+            order["id"] = order_id
+            seq = self._write_order(order)
+        self._sync(seq)
+        return order
+
+    def remove_orders(self, order_ids, expected=None):
+        """Drop orders (e.g. once archived); returns the orders removed.
+
+        With ``expected`` (order id -> order), an order is only removed while
+        it is still that exact version, so an update that landed meanwhile
+        is kept rather than lost.
+        """
+        by_restaurant = {}
+        for order_id in order_ids:
+            restaurant_id = self._order_locations.get(order_id)
+            if restaurant_id is not None:
+                by_restaurant.setdefault(restaurant_id, set()).add(order_id)
+        seq = 0
+        removed_orders = []
+        for restaurant_id, ids in by_restaurant.items():
+            with self._restaurant_lock(restaurant_id):
+                current = self._snapshot.partitions[restaurant_id]
+                removed = [o for o in current.orders if o["id"] in ids and (expected is None or expected.get(o["id"]) is o)]
+                if not removed:
+                    continue
+                ids = {o["id"] for o in removed}
+                kept = OrderChunks.from_orders(o for o in current.orders if o["id"] not in ids)
+                partition = RestaurantPartition(restaurant_id, kept)
+                with self._publish_lock:
+                    for order in removed:
+                        seq = self._log("order_deleted", {"id": order["id"]})
+                    partitions = dict(self._snapshot.partitions)
+                    partitions[restaurant_id] = partition
+                    self._publish(partitions=partitions)
+                    for order in removed:
+                        del self._order_locations[order["id"]]
+                        self._notify("order_deleted", {"id": order["id"], "restaurant_id": restaurant_id}, order)
+                removed_orders.extend(removed)
+        self._sync(seq)
+        return removed_orders
+
+    def add_restaurant(self, data):
+        with self._publish_lock:
+            snap = self._snapshot
+            restaurant = dict(data)
+            restaurant.setdefault("id", max(snap.restaurant_index, default=0) + 1)
+            index = dict(snap.restaurant_index)
+            index[restaurant["id"]] = len(snap.restaurants)
+            seq = self._log("restaurant", restaurant)
+            self._publish(restaurants=snap.restaurants + (restaurant,), restaurant_index=index)
+            self._notify("restaurant", restaurant, None)
+        self._sync(seq)
+        return restaurant
+
+    def upsert_menu_item(self, data):
+        """Insert a menu item, or replace the one with the same id."""
+        with self._publish_lock:
+            snap = self._snapshot
+            items, index = snap.menu_items, snap.menu_item_index
+            item = dict(data)
+            item.setdefault("id", max(index, default=0) + 1)
+            position = index.get(item["id"])
+            if position is not None:
+                # Same ids in the same places, so the index is shared
+                previous = items[position]
+                items = items[:position] + (item,) + items[position + 1:]
+            else:
+                previous = None
+                index = dict(index)
+                index[item["id"]] = len(items)
+                items = items + (item,)
+            seq = self._log("menu_item", item)
+            self._publish(menu_items=items, menu_item_index=index)
+            self._notify("menu_item", item, previous)
+        self._sync(seq)
+        return item
+
+    def checkpoint(self):
+        """Write a compact snapshot to the journal and truncate its log."""
+        try:
+            with self._publish_lock:
+                snap = self._snapshot
+                last_order_id = self._last_order_id
+                seq = self._journal.roll()
+            self._journal.write_checkpoint({
+                "restaurants": list(snap.restaurants),
+                "menu_items": list(snap.menu_items),
+                "orders": snap.orders(),
+                "last_order_id": last_order_id,
+            }, seq)
+        finally:
+            self._checkpointing = False
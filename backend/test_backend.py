@@ -13,7 +13,22 @@ from unittest.mock import patch, MagicMock
 # Add the backend directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from main import app, restaurants_data, orders_data, menu_items_data, analytics_data
+from main import restaurants_data, orders_data, menu_items_data, analytics_data
+import main
+from store import DataStore, COMPLETED_STATUSES
+from wal import WriteAheadLog
+from chain_analytics import ChainAnalytics, OrderColumns
+from sketches import CountMinSketch, HyperLogLog, ItemSketch
+from archive import ColumnFile, OrderArchive, archive_orders, order_history
+from changes import ChangeLog
+from datagen import SyntheticData, write_store
+from geo import GeoIndex, OfflineGeocoder, haversine_km
+from jobs import JobManager, JobQueueFull
+from ratelimit import AdmissionController, LocalBuckets, RateLimiter, SharedBuckets
+
+# The app (and store) the endpoint tests share
+app = main.create_app(preload=False)
+services = app.extensions['restaurantflow']
 
 
 class RestaurantFlowBackendTestSuite(unittest.TestCase):
@@ -349,6 +364,1296 @@ class RestaurantFlowPerformanceTests(unittest.TestCase):
         print("✅ Concurrent requests test passed")
 
 
+class RestaurantFlowStoreTests(unittest.TestCase):
+    """Concurrency tests for the copy-on-write data store"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.store = DataStore(restaurants_data, orders_data, menu_items_data)
+
+    def test_create_and_update_order(self):
+        """Test creating an order and updating its status through the API"""
+        response = self.app.post('/api/orders', json={
+            "restaurant_id": 2, "customer_name": "Test Customer", "total": 12.5, "items": ["Fish & Chips"]
+        })
+        self.assertEqual(response.status_code, 201)
+        order = json.loads(response.data)
+        self.assertEqual(order['status'], 'pending')
+
+        response = self.app.put(f"/api/orders/{order['id']}", json={"status": "completed"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['status'], 'completed')
+
+        dashboard = json.loads(self.app.get('/api/analytics/dashboard/2').data)
+        self.assertGreaterEqual(dashboard['today_revenue'], 12.5)
+
+        response = self.app.post('/api/orders', json={"restaurant_id": 999, "total": 1})
+        self.assertEqual(response.status_code, 400)
+
+        # Totals always come from the menu
+        for body in ({"restaurant_id": 1, "items": [], "total": 500}, {"restaurant_id": 1, "total": 500}):
+            self.assertEqual(self.app.post('/api/orders', json=body).status_code, 400)
+        path = f"/api/orders/{order['id']}"
+        forged = json.loads(self.app.put(path, json={"total": 0.01, "subtotal": 0, "order_items": []}).data)
+        self.assertEqual((forged['total'], forged['subtotal']), (order['total'], order['subtotal']))
+        doubled = json.loads(self.app.put(path, json={"items": ["Fish & Chips", "Fish & Chips"], "total": 1}).data)
+        self.assertEqual(doubled['subtotal'], 37.98)
+        self.assertEqual(doubled['order_items'][0]['quantity'], 1)
+        self.assertEqual(len(doubled['order_items']), 2)
+        self.assertEqual(self.app.put(path, json={"items": ["Caviar"]}).status_code, 400)
+        self.assertEqual(self.app.put(path, json={"items": []}).status_code, 400)
+        self.assertEqual(self.app.put('/api/orders/999999', json={"items": ["Naan"]}).status_code, 404)
+        print("✅ Create and update order test passed")
+
+    def test_concurrent_mixed_reads_and_writes(self):
+        """Hammer the store from many threads and verify the aggregates stay consistent"""
+        import threading
+
+        errors = []
+
+        def writer(seed):
+            try:
+                for i in range(200):
+                    order = self.store.create_order({
+                        "restaurant_id": (seed + i) % 3 + 1,
+                        "customer_name": f"Customer {seed}-{i}",
+                        "total": 10.0,
+                        "items": [],
+                    })
+                    if i % 3 == 0:
+                        self.store.update_order(order["id"], {"status": "completed"})
+            except Exception as e:  # pragma: no cover - surfaced below
+                errors.append(e)
+
+        def reader():
+            try:
+                for _ in range(200):
+                    snap = self.store.snapshot()
+                    for partition in snap.partitions.values():
+                        if sum(partition.status_counts.values()) != len(partition.orders):
+                            errors.append(AssertionError("status counts out of sync"))
+                    self.store.dashboard(1)
+                    self.store.list_orders()
+            except Exception as e:  # pragma: no cover - surfaced below
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        threads += [threading.Thread(target=reader) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        orders = self.store.list_orders()
+        ids = [o["id"] for o in orders]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(orders), len(orders_data) + 8 * 200)
+        for partition in self.store.snapshot().partitions.values():
+            expected = sum(o["total"] for o in partition.orders if o["status"] in COMPLETED_STATUSES)
+            self.assertAlmostEqual(partition.completed_revenue, round(expected, 2), places=2)
+        print("✅ Concurrent mixed reads and writes test passed")
+
+
+    def test_order_fields_are_validated(self):
+        """Test that fields analytics group and sum on are checked on create and update"""
+        # Its own app, so these requests do not use up the shared create_order limit
+        client = main.create_app(preload=False).test_client()
+        order = json.loads(client.post('/api/orders', json={
+            "restaurant_id": 1, "customer_name": "Valid", "items": ["Naan"], "created_at": "2024-09-02T12:00:00Z"}).data)
+        path = f"/api/orders/{order['id']}"
+        for body in ({"status": {"a": 1}}, {"status": "lost"}, {"created_at": 5}, {"created_at": "yesterday"},
+                     {"created_at": "20240902"}, {"total": "abc"}, {"total_amount": -1},
+                     {"delivery_address": 123}, {"delivery_address": "1 Main St", "delivery_latitude": "40.7",
+                                                 "delivery_longitude": "-74"},
+                     {"delivery_latitude": 91, "delivery_longitude": 0}, {"delivery_latitude": 0, "delivery_longitude": 200}):
+            self.assertEqual(client.post('/api/orders', json=dict(body, restaurant_id=1, items=["Naan"])).status_code,
+                             400, body)
+            self.assertEqual(client.put(path, json=body).status_code, 400, body)
+        self.assertEqual(client.put(path, json={"status": ["x"]}).status_code, 400)
+        self.assertEqual(client.put(path, json={"status": "ready"}).status_code, 200)
+        self.assertEqual(client.get('/api/analytics/history').status_code, 200)
+        self.assertEqual(client.get('/api/orders/export?start=2024-01-01').status_code, 200)
+        print("✅ Order validation test passed")
+
+    def test_reprice_skips_orders_it_cannot_price(self):
+        """Test that one malformed stored order does not fail the whole reprice"""
+        own = main.create_app(preload=False)
+        client = own.test_client()
+        order = json.loads(client.post('/api/orders', json={
+            "restaurant_id": 1, "customer_name": "Legacy", "items": ["Naan"]}).data)
+        own.extensions['restaurantflow'].store.update_order(order['id'], {"items": 5})
+        response = client.post('/api/orders/reprice', json={"restaurant_id": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['skipped'], 1)
+        print("✅ Reprice skip test passed")
+
+    def test_update_of_order_removed_meanwhile(self):
+        """Test that an update racing with archiving finds the order gone instead of failing"""
+        order = self.store.create_order({"restaurant_id": 1, "total": 5.0, "items": []})
+        original_lock = self.store._restaurant_lock
+
+        def lock_after_removal(restaurant_id):
+            # The archiver removes the order between the lookup and the lock
+            self.store._restaurant_lock = original_lock
+            self.store.remove_orders([order["id"]])
+            return original_lock(restaurant_id)
+
+        self.store._restaurant_lock = lock_after_removal
+        self.assertIsNone(self.store.update_order(order["id"], {"status": "completed"}))
+        self.assertIsNone(self.store.get_order(order["id"]))
+        print("✅ Update of removed order test passed")
+
+    def test_id_lookups_follow_published_snapshots(self):
+        """Test that restaurant and menu item lookups by id stay in step with writes"""
+        before = self.store.snapshot()
+        first = before.menu_items[0]
+        replaced = self.store.upsert_menu_item(dict(first, price=99.0))
+        added = self.store.upsert_menu_item({"restaurant_id": 1, "name": "Late Addition", "price": 3.0})
+        restaurant = self.store.add_restaurant({"name": "Newcomer"})
+        self.assertEqual(self.store.get_menu_item(first["id"])["price"], 99.0)
+        self.assertIs(self.store.get_menu_item(added["id"]), added)
+        self.assertIs(self.store.get_restaurant(restaurant["id"]), restaurant)
+        self.assertIsNone(self.store.get_menu_item(10 ** 9))
+        self.assertEqual([m["id"] for m in self.store.list_menu_items()][0], replaced["id"])
+        # Earlier snapshots keep their own rows
+        self.assertIs(before.menu_item(first["id"]), first)
+        self.assertIsNone(before.menu_item(added["id"]))
+        self.assertIsNone(before.restaurant(restaurant["id"]))
+        print("✅ Id lookup test passed")
+
+class RestaurantFlowMenuCacheTests(unittest.TestCase):
+    """Tests for the precomputed menu documents"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_menu_categories(self):
+        """Test the categories endpoint used by the frontend"""
+        response = self.app.get('/api/menu-items/restaurant/1/categories')
+        self.assertEqual(response.status_code, 200)
+        categories = json.loads(response.data)
+        self.assertEqual(categories, sorted(categories))
+        self.assertIn('Main Course', categories)
+        print("✅ Menu categories test passed")
+
+    def test_menu_tree_rebuilt_on_item_change(self):
+        """Test that updating one item refreshes its restaurant's menu"""
+        response = self.app.post('/api/menu-items', json={
+            "restaurant_id": 3, "name": "Pancakes", "price": 7.5, "category": "Breakfast"
+        })
+        self.assertEqual(response.status_code, 201)
+        item = json.loads(response.data)
+
+        tree = json.loads(self.app.get('/api/menu-items/restaurant/3/menu').data)
+        breakfast = next(c for c in tree['categories'] if c['name'] == 'Breakfast')
+        self.assertEqual([i['name'] for i in breakfast['items']], ['Pancakes'])
+        self.assertTrue(breakfast['available'])
+
+        response = self.app.put(f"/api/menu-items/{item['id']}", json={"is_available": False})
+        self.assertEqual(response.status_code, 200)
+        tree = json.loads(self.app.get('/api/menu-items/restaurant/3/menu').data)
+        breakfast = next(c for c in tree['categories'] if c['name'] == 'Breakfast')
+        self.assertFalse(breakfast['items'][0]['is_available'])
+        available = json.loads(self.app.get('/api/menu-items/3?available_only=true').data)
+        self.assertNotIn(item['id'], [i['id'] for i in available])
+        self.assertIn(item['id'], [i['id'] for i in json.loads(self.app.get('/api/menu-items/3').data)])
+
+        self.assertEqual(self.app.put('/api/menu-items/9999', json={}).status_code, 404)
+        print("✅ Menu tree rebuild test passed")
+
+    def test_invalid_menu_items_rejected(self):
+        """Test that menu items the menus cannot sort or price are refused"""
+        base = {"restaurant_id": 1, "name": "Lassi", "price": 2.5, "category": "Drinks"}
+        for bad in ({"category": None}, {"category": ""}, {"name": 5}, {"price": "abc"}, {"price": -1},
+                    {"is_available": "no"}):
+            self.assertEqual(self.app.post('/api/menu-items', json=dict(base, **bad)).status_code, 400, bad)
+            self.assertEqual(self.app.put('/api/menu-items/1', json=bad).status_code, 400, bad)
+        self.assertEqual(self.app.get('/api/menu-items/restaurant/1/categories').status_code, 200)
+        self.assertEqual(self.app.post('/api/orders/quote', json={"restaurant_id": 1, "items": ["Naan"]}).status_code, 200)
+
+        store = DataStore(restaurants_data, orders_data, menu_items_data)
+        seen = []
+        store.subscribe(lambda op, data, previous: 1 / 0)
+        store.subscribe(lambda op, data, previous: seen.append(op))
+        store.upsert_menu_item(dict(base))
+        self.assertEqual(seen, ["menu_item"])
+        print("✅ Menu item validation test passed")
+
+
+class RestaurantFlowPricingTests(unittest.TestCase):
+    """Tests for server-side order pricing"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_quote_resolves_names_ids_and_modifiers(self):
+        """Test pricing by item name, item id, quantity and modifiers"""
+        response = self.app.post('/api/orders/quote', json={
+            "restaurant_id": 1,
+            "items": ["butter chicken", {"menu_item_id": 2, "quantity": 2, "modifiers": [{"name": "Garlic", "price": 0.5}]}, "Pizza"],
+        })
+        self.assertEqual(response.status_code, 200)
+        quote = json.loads(response.data)
+        self.assertEqual(quote['unmatched_items'], ['Pizza'])
+        self.assertEqual(quote['subtotal'], 24.97)
+        self.assertEqual(quote['tax'], 2.0)
+        self.assertEqual(quote['total'], 26.97)
+        self.assertEqual(quote['order_items'][1]['total_price'], 8.98)
+        print("✅ Pricing quote test passed")
+
+    def test_rejects_foreign_and_malformed_items(self):
+        """Test that clients cannot price items from other menus or set their own totals"""
+        quote = json.loads(self.app.post('/api/orders/quote', json={
+            "restaurant_id": 2, "items": [{"menu_item_id": 1}]}).data)
+        self.assertEqual((quote['unmatched_items'], quote['total']), ([1], 0))
+        response = self.app.post('/api/orders', json={
+            "restaurant_id": 2, "customer_name": "Bogus", "total": 0.01, "items": ["Fish & Chips", "Caviar"]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['unmatched_items'], ['Caviar'])
+        for items in ([{"name": "Naan", "quantity": -3}], [{"name": "Naan", "quantity": 0}], [5], "Naan",
+                      [{"name": "Naan", "modifiers": [1]}], [{"name": "Naan", "modifiers": [{"price": "abc"}]}]):
+            body = {"restaurant_id": 1, "customer_name": "Bad", "items": items}
+            self.assertEqual(self.app.post('/api/orders', json=body).status_code, 400, items)
+            self.assertEqual(self.app.post('/api/orders/quote', json=body).status_code, 400, items)
+        # 1e999 is valid JSON and parses to infinity
+        body = '{"restaurant_id": 1, "items": [{"name": "Naan", "modifiers": [{"price": 1e999}]}]}'
+        for path in ('/api/orders', '/api/orders/quote'):
+            self.assertEqual(self.app.post(path, data=body, content_type='application/json').status_code, 400)
+        print("✅ Pricing validation test passed")
+
+    def test_bad_menu_price_does_not_break_pricing(self):
+        """Test that one unpriceable menu item only affects itself"""
+        from pricing import PriceIndex
+        index = PriceIndex(menu_items_data + [{"id": 99, "restaurant_id": 1, "name": "Broken", "price": "abc"}])
+        self.assertIsNone(index.resolve(1, "Broken"))
+        self.assertEqual(index.resolve(1, "Naan"), (2, "Naan", 399))
+        print("✅ Price index robustness test passed")
+
+    def test_batch_quote_and_reprice(self):
+        """Test batch pricing and re-pricing open orders after a price change"""
+        response = self.app.post('/api/orders/quote', json={"orders": [
+            {"restaurant_id": 1, "items": ["Samosa"]},
+            {"restaurant_id": 2, "items": ["Fish & Chips"]},
+        ]})
+        totals = [q['subtotal'] for q in json.loads(response.data)]
+        self.assertEqual(totals, [5.99, 18.99])
+
+        order = json.loads(self.app.post('/api/orders', json={
+            "restaurant_id": 2, "customer_name": "Reprice", "total": 1.0, "items": ["Grilled Salmon"]
+        }).data)
+        self.assertEqual(order['subtotal'], 22.99)
+        self.assertEqual(order['total'], 24.83)
+
+        self.app.put('/api/menu-items/5', json={"price": 24.99})
+        try:
+            result = json.loads(self.app.post('/api/orders/reprice', json={"restaurant_id": 2}).data)
+            self.assertGreaterEqual(result['repriced'], 1)
+            self.assertEqual(json.loads(self.app.get(f"/api/orders/{order['id']}").data)['subtotal'], 24.99)
+        finally:
+            self.app.put('/api/menu-items/5', json={"price": 22.99})
+        print("✅ Batch pricing test passed")
+
+    def test_reprice_skips_orders_changed_meanwhile(self):
+        """Test that re-pricing never writes back a stale status"""
+        order = json.loads(self.app.post('/api/orders', json={
+            "restaurant_id": 2, "customer_name": "Racing", "items": ["Grilled Salmon"]
+        }).data)
+        price_orders = services.pricing.price_orders
+
+        def accepted_while_pricing(orders):
+            services.store.update_order(order['id'], {"status": "preparing"})
+            return price_orders(orders)
+
+        self.app.put('/api/menu-items/5', json={"price": 24.99})
+        try:
+            with patch.object(services.pricing, 'price_orders', accepted_while_pricing):
+                self.app.post('/api/orders/reprice', json={"restaurant_id": 2})
+            current = json.loads(self.app.get(f"/api/orders/{order['id']}").data)
+            self.assertEqual(current['status'], 'preparing')
+            self.assertEqual(current['subtotal'], 22.99)
+        finally:
+            self.app.put('/api/menu-items/5', json={"price": 22.99})
+        print("✅ Reprice race test passed")
+
+
+class RestaurantFlowRateLimitTests(unittest.TestCase):
+    """Tests for rate limiting and load shedding"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_scraper_gets_429_but_status_routes_stay_up(self):
+        """Test that a client hammering /api/orders is limited per route"""
+        scraper = {'REMOTE_ADDR': '203.0.113.7'}
+        codes = [self.app.get('/api/orders', environ_base=scraper).status_code for _ in range(40)]
+        self.assertIn(429, codes)
+        response = self.app.get('/api/orders', environ_base=scraper)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+        self.assertEqual(self.app.get('/health', environ_base=scraper).status_code, 200)
+        response = self.app.get('/api/orders/1/status', environ_base=scraper)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['order_id'], 1)
+        self.assertEqual(self.app.get('/api/orders', environ_base={'REMOTE_ADDR': '203.0.113.8'}).status_code, 200)
+        print("✅ Rate limit test passed")
+
+    def test_token_buckets(self):
+        """Test local and shared token buckets refill at the configured rate"""
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            for buckets in (LocalBuckets(), SharedBuckets(os.path.join(tmp, 'buckets'), slots=128)):
+                self.assertEqual(buckets.take('a', 1, 2, now=100.0), 0)
+                self.assertEqual(buckets.take('a', 1, 2, now=100.0), 0)
+                self.assertAlmostEqual(buckets.take('a', 1, 2, now=100.0), 1.0)
+                self.assertEqual(buckets.take('a', 1, 2, now=101.5), 0)
+                self.assertEqual(buckets.take('b', 1, 2, now=101.5), 0)
+
+            # A second mapping of the same file sees the first one's state
+            first = SharedBuckets(os.path.join(tmp, 'shared'), slots=128)
+            second = SharedBuckets(os.path.join(tmp, 'shared'), slots=128)
+            limiter = RateLimiter(first, 1, 1)
+            self.assertEqual(limiter.check('client', 'route'), 0)
+            self.assertGreater(RateLimiter(second, 1, 1).check('client', 'route'), 0)
+        print("✅ Token bucket test passed")
+
+    def test_idle_buckets_are_evicted(self):
+        """Test that rotating client addresses cannot grow the bucket table without bound"""
+        buckets = LocalBuckets(max_keys=64 * 10)
+        for i in range(5000):
+            buckets.take(f"client:{i}", 1, 5, now=100.0)
+        self.assertLessEqual(len(buckets), 64 * 10)
+        buckets.take("client:late", 1, 5, now=200.0)
+        self.assertLessEqual(len(buckets), 64 * 10)
+        self.assertEqual(sum(1 for _ in range(3) if buckets.take("client:late", 1, 5, now=200.0) == 0), 3)
+        print("✅ Bucket eviction test passed")
+
+    def test_forwarded_for_uses_proxy_appended_address(self):
+        """Test that a spoofed X-Forwarded-For prefix does not change the client identity"""
+        with patch.dict(os.environ, {"TRUST_PROXY": "1"}):
+            proxied = main.create_app(preload=False)
+        client = proxied.test_client()
+        seen = []
+        with patch.object(proxied.extensions['restaurantflow'].rate_limiter, 'check', side_effect=lambda c, route: seen.append(c) or 0):
+            for spoofed in ('1.1.1.1', '2.2.2.2'):
+                client.get('/health', headers={'X-Forwarded-For': f'{spoofed}, 198.51.100.9'},
+                           environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        self.assertEqual(seen, ['198.51.100.9', '198.51.100.9'])
+        print("✅ Forwarded-for test passed")
+
+    def test_untrusted_forwarded_for_is_logged_once(self):
+        """Test the startup warning when a proxy is in front but TRUST_PROXY is unset"""
+        with patch.dict(os.environ):
+            os.environ.pop("TRUST_PROXY", None)
+            client = main.create_app(preload=False).test_client()
+        with self.assertLogs('main', 'WARNING') as logs:
+            for _ in range(3):
+                client.get('/health', headers={'X-Forwarded-For': '198.51.100.9'})
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("TRUST_PROXY", logs.output[0])
+        print("✅ Untrusted proxy warning test passed")
+
+    def test_admission_controller_sheds_and_recovers(self):
+        """Test shedding on queue depth and on latency, and recovery"""
+        controller = AdmissionController(max_in_flight=2, max_latency=0.5, decay_seconds=0.01)
+        self.assertTrue(controller.admit())
+        self.assertTrue(controller.admit())
+        self.assertFalse(controller.admit())
+        controller.release(5.0)
+        self.assertFalse(controller.admit())
+        import time
+        time.sleep(0.1)
+        self.assertTrue(controller.admit())
+        print("✅ Admission controller test passed")
+
+    def test_heavy_endpoints_do_not_drive_latency_shedding(self):
+        """Test that a slow analytics request does not shed the requests after it"""
+        import time
+        controller = AdmissionController(max_in_flight=2, max_latency=0.5)
+        self.assertTrue(controller.admit())
+        controller.release(5.0, sample=False)
+        self.assertEqual(controller.latency(), 0.0)
+        self.assertTrue(controller.admit())
+
+        with patch.dict(os.environ, {"SHED_MAX_LATENCY_MS": "50"}):
+            heavy = main.create_app(preload=False)
+        app_services = heavy.extensions['restaurantflow']
+        app_services.approx_analytics = MagicMock(report=lambda **kwargs: time.sleep(0.3) or {})
+        client = heavy.test_client()
+        self.assertEqual(client.get('/api/analytics?approx=1').status_code, 200)
+        self.assertEqual(app_services.admission.latency(), 0.0)
+        self.assertEqual(client.get('/api/restaurants').status_code, 200)
+        print("✅ Heavy endpoint latency test passed")
+
+    def test_admission_sheds_requests_queued_behind_the_proxy(self):
+        """Test shedding on the proxy's X-Request-Start queueing time"""
+        from ratelimit import queue_wait
+        now = 1_700_000_000.0
+        for header in ("t=1699999999.5", "t=1699999999500", "1699999999500000"):
+            self.assertAlmostEqual(queue_wait(header, now=now), 0.5, places=3)
+        self.assertEqual(queue_wait("t=soon", now=now), 0.0)
+        self.assertEqual(queue_wait(None, now=now), 0.0)
+        controller = AdmissionController(max_in_flight=10, max_latency=5.0, max_queue_wait=0.25)
+        self.assertTrue(controller.admit(0.1))
+        self.assertFalse(controller.admit(0.5))
+
+        import time
+        with patch.dict(os.environ, {"TRUST_PROXY": "1"}):
+            client = main.create_app(preload=False).test_client()
+            stale = f"t={int((time.time() - 10) * 1000)}"
+            response = client.get('/api/restaurants', headers={'X-Request-Start': stale})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(client.get('/health', headers={'X-Request-Start': stale}).status_code, 200)
+        print("✅ Queue wait shedding test passed")
+
+
+class RestaurantFlowJobTests(unittest.TestCase):
+    """Tests for background analytics jobs"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def wait_for(self, job_id, timeout=60):
+        import time
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = json.loads(self.app.get(f'/api/jobs/{job_id}').data)
+            if job['status'] in ('completed', 'failed', 'cancelled'):
+                return job
+            time.sleep(0.05)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_popular_items_job(self):
+        """Test submitting a job and polling for its result"""
+        response = self.app.post('/api/jobs', json={"type": "popular_items", "params": {"restaurant_id": 1}})
+        self.assertEqual(response.status_code, 202)
+        job = json.loads(response.data)
+        self.assertIn(job['status'], ('queued', 'running', 'completed'))
+
+        job = self.wait_for(job['id'])
+        self.assertEqual(job['status'], 'completed')
+        names = [entry['name'] for entry in job['result']]
+        self.assertIn('Butter Chicken', names)
+        self.assertNotIn('Fish & Chips', names)
+
+        self.assertEqual(self.app.post('/api/jobs', json={"type": "nope"}).status_code, 400)
+        self.assertEqual(self.app.post('/api/jobs', json={"type": "monthly_sales", "params": {"limit": 1}}).status_code, 400)
+        self.assertEqual(self.app.post('/api/jobs', json={"type": "popular_items", "params": [{"a": 1}]}).status_code, 400)
+        self.assertEqual(self.app.get('/api/jobs/missing').status_code, 404)
+        print("✅ Popular items job test passed")
+
+    def test_bounded_queue_and_cancellation(self):
+        """Test that the queue is bounded and queued jobs can be cancelled"""
+        manager = JobManager(max_workers=1, max_pending=2)
+        self.addCleanup(manager.shutdown)
+        orders = [dict(o, created_at="2024-08-05T10:00:00Z") for o in orders_data] * 20000
+        first = manager.submit("monthly_sales", orders)
+        second = manager.submit("monthly_sales", orders)
+        with self.assertRaises(JobQueueFull):
+            manager.submit("monthly_sales", orders)
+
+        cancelled = manager.cancel(second["id"])
+        self.assertEqual(cancelled["status"], "cancelled")
+        import time
+        deadline = time.time() + 60
+        while manager.get(first["id"])["status"] != "completed" and time.time() < deadline:
+            time.sleep(0.05)
+        result = manager.get(first["id"])
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual(result["result"][0]["orders"], len(orders))
+        self.assertEqual(manager.get(second["id"])["status"], "cancelled")
+        print("✅ Job queue test passed")
+
+
+    def test_job_reads_orders_from_the_log_and_archive(self):
+        """Test that a job given a source loads live and archived orders in the worker"""
+        import tempfile
+        from archive import OrderArchive, archive_orders
+        from analytics import monthly_sales
+        with tempfile.TemporaryDirectory() as wal_dir, tempfile.TemporaryDirectory() as archive_dir:
+            journal = WriteAheadLog(wal_dir, checkpoint_every=10**9)
+            journal.recover()
+            store = DataStore(restaurants_data, [dict(o) for o in orders_data], menu_items_data, journal=journal)
+            store.checkpoint()
+            for day in range(1, 29):
+                store.create_order({"restaurant_id": 1, "total": day, "items": [], "status": "completed",
+                                    "created_at": f"2024-0{1 + day % 3}-{day:02d}T12:00:00Z"})
+            self.assertEqual(archive_orders(store, OrderArchive(archive_dir), "2024-03-01"), 19)
+            store.create_order({"restaurant_id": 2, "total": 7.5, "items": []})
+
+            manager = JobManager(max_workers=1)
+            self.addCleanup(manager.shutdown)
+            source = {"wal_dir": wal_dir, "archive_dir": archive_dir, "columns": main.JOB_COLUMNS["monthly_sales"]}
+            job = manager.submit("monthly_sales", source=source)
+            import time
+            deadline = time.time() + 60
+            while manager.get(job["id"])["status"] not in ("completed", "failed") and time.time() < deadline:
+                time.sleep(0.05)
+            job = manager.get(job["id"])
+            journal.close()
+        self.assertEqual(job["status"], "completed", job["error"])
+        self.assertEqual(job["result"], monthly_sales(store.list_orders() + [
+            {"status": "completed", "restaurant_id": 1, "total": day, "created_at": f"2024-0{1 + day % 3}-{day:02d}"}
+            for day in range(1, 29) if 1 + day % 3 < 3
+        ]))
+        print("✅ Job source test passed")
+
+
+class RestaurantFlowChainAnalyticsTests(unittest.TestCase):
+    """Tests for sharded chain-wide analytics"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_chain_endpoint(self):
+        """Test the chain report matches the orders endpoint"""
+        response = self.app.get('/api/analytics/chain?top=2')
+        self.assertEqual(response.status_code, 200)
+        report = json.loads(response.data)
+        orders = json.loads(self.app.get('/api/orders').data)
+        self.assertEqual(report['orders'], len(orders))
+        self.assertLessEqual(len(report['top_restaurants']), 2)
+        self.assertEqual(sum(report['status_counts'].values()), len(orders))
+        print("✅ Chain analytics endpoint test passed")
+
+    def test_pool_reduction_matches_inline(self):
+        """Test that sharded reduction over shared memory equals a single pass"""
+        from array import array
+        restaurants = 50
+        sizes = [(r * 37) % 400 + 1 for r in range(restaurants)]
+        offsets = array('q', [0])
+        for size in sizes:
+            offsets.append(offsets[-1] + size)
+        rows = offsets[-1]
+        columns = OrderColumns(
+            array('q', range(1, restaurants + 1)), offsets,
+            array('q', (i % 5000 for i in range(rows))), bytes(i % 7 for i in range(rows)),
+            ("pending", "confirmed", "preparing", "ready", "completed", "delivered", "cancelled"),
+        )
+        self.addCleanup(columns.close)
+        chain = ChainAnalytics(None, workers=2, inline_rows=0)
+        self.addCleanup(chain.close)
+
+        shards = columns.shards(8)
+        self.assertEqual(shards[0][0], 0)
+        self.assertEqual(shards[-1][1], restaurants)
+        parallel = sorted(chain.reduce(columns, workers=2))
+        inline = sorted(chain.reduce(columns, workers=1))
+        self.assertEqual(parallel, inline)
+        self.assertEqual(sum(p[1] for p in parallel), rows)
+        self.assertEqual(sum(p[2] for p in parallel), sum(i % 5000 for i in range(rows)))
+        print("✅ Pool reduction test passed")
+
+    def test_column_rebuild_reuses_unchanged_chunks(self):
+        """Test that rebuilding after writes only re-encodes touched chunks and matches a fresh build"""
+        from chain_analytics import ColumnEncoder
+        orders = [{"id": i, "restaurant_id": i % 3 + 1, "status": "pending", "total": i % 40 + 1.5} for i in range(1, 3001)]
+        store = DataStore(restaurants_data, orders, menu_items_data)
+        encoder = ColumnEncoder()
+        encoded = []
+        original = encoder._encode
+        encoder._encode = lambda chunk: encoded.append(len(chunk)) or original(chunk)
+        encoder.columns(store.snapshot()).close()
+        self.assertEqual(sum(encoded), 3000)
+
+        encoded.clear()
+        store.update_order(4, {"status": "delivered"})
+        store.create_order({"restaurant_id": 2, "status": "weird", "total": 9.0})
+        columns = encoder.columns(store.snapshot())
+        self.addCleanup(columns.close)
+        self.assertEqual(len(encoded), 2)
+        fresh = OrderColumns.from_snapshot(store.snapshot())
+        self.addCleanup(fresh.close)
+        self.assertEqual(bytes(columns.shm.buf[:columns.shm.size]), bytes(fresh.shm.buf[:fresh.shm.size]))
+        self.assertEqual(columns.statuses, fresh.statuses)
+        print("✅ Incremental column build test passed")
+
+
+class RestaurantFlowSketchTests(unittest.TestCase):
+    """Tests for approximate analytics sketches"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_hyperloglog_accuracy_and_merge(self):
+        """Test distinct counts stay within the stated error and merge as a union"""
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(20000):
+            first.add(f"customer-{i}")
+        for i in range(10000, 30000):
+            second.add(f"customer-{i}")
+        tolerance = 4 * first.standard_error
+        self.assertAlmostEqual(first.count() / 20000, 1, delta=tolerance)
+        self.assertAlmostEqual(first.merge(second).count() / 30000, 1, delta=tolerance)
+        print("✅ HyperLogLog test passed")
+
+    def test_sparse_hyperloglog_matches_dense(self):
+        """Test that small sets stay sparse and estimate exactly as dense registers would"""
+        import pickle
+        sparse, dense = HyperLogLog(), HyperLogLog()
+        dense._densify()
+        for i in range(40):
+            sparse.add(f"c{i}")
+            dense.add(f"c{i}")
+        self.assertTrue(sparse.sparse)
+        self.assertEqual(sparse.count(), dense.count())
+        self.assertEqual(pickle.loads(pickle.dumps(sparse)).count(), sparse.count())
+        merged = pickle.loads(pickle.dumps(sparse)).merge(dense)
+        self.assertEqual(merged.count(), dense.count())
+        for i in range(1000):
+            sparse.add(f"d{i}")
+        self.assertFalse(sparse.sparse)
+        print("✅ Sparse HyperLogLog test passed")
+
+    def test_top_items_and_count_min_bounds(self):
+        """Test top-K over skewed counts and the Count-Min overcount bound"""
+        days = [ItemSketch(capacity=20, width=512), ItemSketch(capacity=20, width=512)]
+        truth = {}
+        for day, sketch in enumerate(days):
+            for rank in range(1, 300):
+                count = 1000 // rank + day
+                sketch.add(f"item-{rank}", count)
+                truth[f"item-{rank}"] = truth.get(f"item-{rank}", 0) + count
+        merged = days[0].merge(days[1])
+        top = merged.top(3)
+        self.assertEqual([name for name, _ in top], ["item-1", "item-2", "item-3"])
+        for name, estimate in top:
+            self.assertGreaterEqual(estimate, truth[name])
+            self.assertLessEqual(estimate - truth[name], merged.error_bound())
+
+        cms = CountMinSketch(width=64, depth=3)
+        cms.add("x", 5)
+        self.assertGreaterEqual(cms.estimate("x"), 5)
+        print("✅ Top items sketch test passed")
+
+    def test_reports_while_orders_stream_in(self):
+        """Test that reports merging day sketches are safe against concurrent inserts"""
+        import itertools
+        import threading
+        from sketches import ApproxAnalytics
+        analytics = ApproxAnalytics(capacity=50, width=64)
+        stop = threading.Event()
+
+        def writer():
+            for i in itertools.count():
+                if stop.is_set():
+                    return
+                analytics.add_order({"restaurant_id": i % 3, "customer_email": f"c{i}", "items": [f"item-{i}"],
+                                     "created_at": f"2024-09-0{i % 5 + 1}T12:00:00Z"})
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads often enough to hit a merge mid-insert
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for _ in range(300):
+                analytics.report(start="2024-09-01", end="2024-09-05")
+        finally:
+            stop.set()
+            thread.join()
+            sys.setswitchinterval(interval)
+        print("✅ Concurrent sketch report test passed")
+
+    def test_approx_analytics_endpoint(self):
+        """Test the approximate analytics mode reflects new orders"""
+        self.app.post('/api/orders', json={
+            "restaurant_id": 2, "customer_name": "Sketchy", "customer_email": "sketch@example.com",
+            "total": 30.0, "items": ["Grilled Salmon"], "created_at": "2024-09-01T12:00:00Z",
+        })
+        response = self.app.get('/api/analytics?approx=1&restaurant_id=2&start=2024-09-01&end=2024-09-01')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['approximate'])
+        self.assertIn('daily_orders', data)
+        self.assertIn('Grilled Salmon', [i['name'] for i in data['popular_items']])
+        self.assertEqual(data['unique_customers'], [{"restaurant_id": 2, "date": "2024-09-01", "unique_customers": 1}])
+        self.assertIn('max_overcount', data['error_bounds']['popular_items'])
+        self.assertEqual(data['popular_items_scope'], 'chain')
+        for top in (-1, 0, 1):
+            data = json.loads(self.app.get(f'/api/analytics?approx=1&top={top}').data)
+            self.assertEqual(len(data['popular_items']), 1)
+        self.assertNotIn('approximate', json.loads(self.app.get('/api/analytics').data))
+        print("✅ Approximate analytics endpoint test passed")
+
+
+class RestaurantFlowArchiveTests(unittest.TestCase):
+    """Tests for the columnar order archive"""
+
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def make_store(self):
+        orders = [
+            {"id": 1, "restaurant_id": 1, "customer_name": "A", "status": "completed", "total": 10.0,
+             "items": ["Naan"], "created_at": "2024-06-03T10:00:00Z"},
+            {"id": 2, "restaurant_id": 2, "customer_name": "B", "status": "delivered", "total_amount": 20.0,
+             "items": ["Fish & Chips"], "created_at": "2024-07-15T10:00:00Z"},
+            {"id": 3, "restaurant_id": 1, "customer_name": "C", "status": "pending", "total": 30.0,
+             "items": ["Samosa"], "created_at": "2024-06-20T10:00:00Z"},
+            {"id": 4, "restaurant_id": 1, "customer_name": "D", "status": "completed", "total": 40.0,
+             "items": ["Naan"], "created_at": "2024-09-01T10:00:00Z"},
+        ]
+        return DataStore(restaurants_data, orders, menu_items_data)
+
+    def test_archive_moves_finished_orders_and_prunes(self):
+        """Test archiving, partition pruning and column projection"""
+        store = self.make_store()
+        archive = OrderArchive(self.tmp.name)
+        self.assertEqual(archive_orders(store, archive, "2024-08-01"), 2)
+        self.assertEqual([o["id"] for o in store.list_orders()], [3, 4])
+        self.assertEqual(sorted(archive.stats()), ["2024-06", "2024-07"])
+        self.assertEqual(store.dashboard(1)["today_orders"], 2)
+
+        reads = []
+        original_read = ColumnFile.read
+        def counting_read(column_file, columns):
+            reads.append((os.path.basename(os.path.dirname(column_file.path)), tuple(columns)))
+            return original_read(column_file, columns)
+        with patch.object(ColumnFile, 'read', counting_read):
+            rows = list(archive.scan(["id", "total_amount"], start="2024-07-01", end="2024-07-31"))
+        self.assertEqual(rows, [{"id": 2, "total_amount": 20.0}])
+        self.assertEqual([month for month, _ in reads], ["month=2024-07"])
+        self.assertNotIn("items", reads[0][1])
+
+        self.assertEqual([r["id"] for r in archive.scan(["id"], restaurant_id=1)], [1])
+        print("✅ Archive pruning test passed")
+
+    def test_reports_include_archived_orders(self):
+        """Test that chain analytics and dashboards still count orders once they are archived"""
+        store = self.make_store()
+        archive = OrderArchive(self.tmp.name)
+        client = main.create_app(preload=False, app_services=main.Services(store, archive)).test_client()
+        with client:
+            chain = json.loads(client.get('/api/analytics/chain').data)
+            dashboard = json.loads(client.get('/api/analytics/dashboard/1').data)
+            self.assertEqual((chain["orders"], chain["revenue"]), (4, 100.0))
+            self.assertEqual((dashboard["today_orders"], dashboard["today_revenue"]), (3, 50.0))
+            response = client.post('/api/archive', json={"before": "2024-08-01"})
+            self.assertEqual(json.loads(response.data)["archived"], 2)
+            self.assertEqual(json.loads(client.get('/api/analytics/chain').data), dict(chain, data_version=store.snapshot().version))
+            self.assertEqual(json.loads(client.get('/api/analytics/dashboard/1').data), dashboard)
+
+        # Reopened, the totals are rebuilt from the files
+        reopened = main.Services(store, OrderArchive(self.tmp.name))
+        self.assertEqual(reopened.dashboard(1), dashboard)
+        self.assertEqual(reopened.chain_analytics.report()["status_counts"], chain["status_counts"])
+        reopened.chain_analytics.close()
+        print("✅ Archived report totals test passed")
+
+    def test_archive_run_interrupted_before_removal(self):
+        """Test that a rerun after a crash between writing and removing archives nothing twice"""
+        store = self.make_store()
+        archive = OrderArchive(self.tmp.name)
+        with patch.object(store, 'remove_orders', side_effect=RuntimeError("killed")):
+            with self.assertRaises(RuntimeError):
+                archive_orders(store, archive, "2024-08-01")
+        files = sum(month["files"] for month in archive.stats().values())
+        self.assertEqual(archive_orders(store, archive, "2024-08-01"), 2)
+        self.assertEqual(sum(month["files"] for month in archive.stats().values()), files)
+        self.assertEqual([o["id"] for o in store.list_orders()], [3, 4])
+        history = order_history(store.list_orders(), archive, lambda i: store.get_order(i) is not None, ["id"])
+        self.assertEqual(sorted(o["id"] for o in history), [1, 2, 3, 4])
+        print("✅ Interrupted archive run test passed")
+
+    def test_archive_keeps_orders_updated_meanwhile(self):
+        """Test that an update landing while its order is archived is neither lost nor counted twice"""
+        store = self.make_store()
+        archive = OrderArchive(self.tmp.name)
+        original_append = archive.append
+        def append_then_update(orders):
+            paths = original_append(orders)
+            store.update_order(2, {"status": "completed", "customer_name": "B2"})
+            return paths
+        with patch.object(archive, 'append', side_effect=append_then_update):
+            self.assertEqual(archive_orders(store, archive, "2024-08-01"), 1)
+        self.assertEqual(store.get_order(2)["customer_name"], "B2")
+        self.assertEqual(archive_orders(store, archive, "2024-08-01"), 1)
+        self.assertIsNone(store.get_order(2))
+        self.assertEqual(archive.find(2)["customer_name"], "B2")
+        history = order_history(store.list_orders(), archive, lambda i: store.get_order(i) is not None, ["id", "customer_name"])
+        self.assertEqual(sorted((o["id"], o["customer_name"]) for o in history),
+                         [(1, "A"), (2, "B2"), (3, "C"), (4, "D")])
+        print("✅ Archive concurrent update test passed")
+
+    def test_archive_keeps_file_headers_in_memory(self):
+        """Test that lookups only read files whose id range can match"""
+        archive_orders(self.make_store(), OrderArchive(self.tmp.name), "2024-08-01")
+        archive = OrderArchive(self.tmp.name)
+        archive.append([{"id": 7, "restaurant_id": 2, "status": "completed", "total": 7.0,
+                         "created_at": "2024-07-20T10:00:00Z"}])
+        opened, reads = [], []
+        original_init, original_read = ColumnFile.__init__, ColumnFile.read
+        def counting_init(column_file, path):
+            opened.append(path)
+            original_init(column_file, path)
+        def counting_read(column_file, columns):
+            reads.append(column_file.month)
+            return original_read(column_file, columns)
+        with patch.object(ColumnFile, '__init__', counting_init), patch.object(ColumnFile, 'read', counting_read):
+            self.assertIsNone(archive.find(99))
+            self.assertEqual(archive.find(7)["total"], 7.0)
+            self.assertEqual(archive.stats()["2024-07"]["files"], 2)
+        self.assertEqual(opened, [])
+        self.assertEqual(reads, ["2024-07", "2024-07"])
+        print("✅ Archive header catalog test passed")
+
+    def test_history_endpoints_include_archive(self):
+        """Test that export and history analytics read live and archived orders"""
+        store = self.make_store()
+        archive = OrderArchive(self.tmp.name)
+        archive_orders(store, archive, "2024-08-01")
+        client = main.create_app(preload=False, app_services=main.Services(store, archive)).test_client()
+        with client:
+            exported = json.loads(client.get('/api/orders/export?columns=id,status').data)
+            self.assertEqual(sorted(o['id'] for o in exported), [1, 2, 3, 4])
+            self.assertEqual(set(exported[0]), {"id", "status"})
+
+            months = json.loads(client.get('/api/analytics/history?start=2024-06-01&end=2024-07-31').data)
+            self.assertEqual([(m['month'], m['revenue']) for m in months], [("2024-06", 40.0), ("2024-07", 20.0)])
+
+            archived = json.loads(client.get('/api/orders/2').data)
+            self.assertEqual(archived, dict(self.make_store().get_order(2)))
+            status = json.loads(client.get('/api/orders/1/status').data)
+            self.assertEqual(status['status'], 'completed')
+            self.assertEqual(client.get('/api/orders/99').status_code, 404)
+        print("✅ History endpoints test passed")
+
+
+class RestaurantFlowChangeTests(unittest.TestCase):
+    """Tests for delta sync and conditional list requests"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_changes_since_with_tombstones(self):
+        """Test created/updated/deleted classification and tombstone compaction"""
+        store = DataStore(restaurants_data, [dict(o) for o in orders_data], menu_items_data)
+        changes = ChangeLog(store, tombstone_limit=4)
+        start = changes.seq("orders")
+        self.assertEqual(changes.since("orders", start)["created"], [])
+
+        created = store.create_order({"restaurant_id": 1, "customer_name": "New", "status": "pending", "total": 5.0})
+        store.update_order(orders_data[0]["id"], {"status": "completed"})
+        store.remove_orders([orders_data[1]["id"]])
+        delta = changes.since("orders", start)
+        self.assertEqual([o["id"] for o in delta["created"]], [created["id"]])
+        self.assertEqual([o["id"] for o in delta["updated"]], [orders_data[0]["id"]])
+        self.assertEqual(delta["deleted"], [orders_data[1]["id"]])
+        self.assertEqual(delta["seq"], changes.seq("orders"))
+
+        # Only changes after the client's last sync come back
+        store.update_order(created["id"], {"status": "preparing"})
+        later = changes.since("orders", delta["seq"])
+        self.assertEqual([o["status"] for o in later["updated"]], ["preparing"])
+        self.assertEqual(later["created"] + later["deleted"], [])
+
+        # Once old tombstones are dropped, syncing from before them needs a full resync
+        ids = [store.create_order({"restaurant_id": 1, "status": "completed", "total": 1.0})["id"] for _ in range(6)]
+        store.remove_orders(ids)
+        self.assertIsNone(changes.since("orders", start))
+        self.assertIsNone(changes.since("orders", changes.seq("orders") + 1))
+        self.assertIsNotNone(changes.since("orders", changes.seq("orders")))
+        print("✅ Change log test passed")
+
+    def test_slow_delta_walk_does_not_block_writers(self):
+        """Test that writes go through while a ?since= delta is being assembled"""
+        import threading
+        import changes as changes_module
+        store = DataStore(restaurants_data, [dict(o) for o in orders_data], menu_items_data)
+        changes = ChangeLog(store)
+        start = changes.seq("orders")
+        first = store.create_order({"restaurant_id": 1, "total": 1.0})
+
+        walking, release = threading.Event(), threading.Event()
+        original_split = changes_module.split_changes
+        def slow_split(tail, seq):
+            walking.set()
+            release.wait(10)
+            return original_split(tail, seq)
+
+        results = []
+        with patch.object(changes_module, 'split_changes', slow_split):
+            reader = threading.Thread(target=lambda: results.append(changes.since("orders", start)))
+            reader.start()
+            self.assertTrue(walking.wait(10))
+            writer = threading.Thread(target=store.create_order, args=({"restaurant_id": 1, "total": 2.0},))
+            writer.start()
+            writer.join(5)
+            blocked = writer.is_alive()
+            release.set()
+            reader.join()
+            writer.join()
+        self.assertFalse(blocked)
+        self.assertEqual([o["id"] for o in results[0]["created"]], [first["id"]])
+        print("✅ Non-blocking delta test passed")
+
+    def test_etag_and_since_endpoints(self):
+        """Test 304s on unchanged lists and delta responses on ?since="""
+        store = DataStore(restaurants_data, [dict(o) for o in orders_data], menu_items_data)
+        client = main.create_app(preload=False, app_services=main.Services(store)).test_client()
+        with client:
+            response = client.get('/api/orders')
+            etag = response.headers['ETag']
+            seq = int(response.headers['X-Change-Seq'])
+            self.assertEqual(len(json.loads(response.data)), len(orders_data))
+
+            repeat = client.get('/api/orders', headers={'If-None-Match': etag})
+            self.assertEqual(repeat.status_code, 304)
+            self.assertEqual(repeat.data, b'')
+
+            store.create_order({"restaurant_id": 2, "customer_name": "Late", "status": "pending", "total": 9.0})
+            self.assertEqual(client.get('/api/orders', headers={'If-None-Match': etag}).status_code, 200)
+            delta = json.loads(client.get(f'/api/orders?since={seq}').data)
+            self.assertFalse(delta['full'])
+            self.assertEqual([o['customer_name'] for o in delta['created']], ["Late"])
+
+            resync = json.loads(client.get('/api/orders?since=1').data)
+            self.assertTrue(resync['full'])
+            self.assertEqual(len(resync['created']), len(orders_data) + 1)
+
+            menu = client.get('/api/menu-items/1')
+            self.assertEqual(client.get('/api/menu-items/1', headers={'If-None-Match': menu.headers['ETag']}).status_code, 304)
+        print("✅ Conditional list test passed")
+
+
+class RestaurantFlowDataGenTests(unittest.TestCase):
+    """Tests for the synthetic data generator"""
+
+    def test_deterministic_and_consistent(self):
+        """Test seeded output, exact counts, contiguous ids and order totals"""
+        data = SyntheticData(3000, restaurants=20, days=7, seed=7)
+        first = list(data.batches())
+        self.assertEqual(first, list(SyntheticData(3000, restaurants=20, days=7, seed=7).batches()))
+        self.assertNotEqual(first, list(SyntheticData(3000, restaurants=20, days=7, seed=8).batches()))
+
+        orders = [json.loads(o) for batch, _ in first for o in batch]
+        items = [json.loads(i) for _, batch in first for i in batch]
+        self.assertEqual([o["id"] for o in orders], list(range(1, 3001)))
+        self.assertEqual([i["id"] for i in items], list(range(1, len(items) + 1)))
+        self.assertEqual([o["created_at"] for o in orders], sorted(o["created_at"] for o in orders))
+        totals = {}
+        for item in items:
+            totals[item["order_id"]] = totals.get(item["order_id"], 0) + round(item["total_price"] * 100)
+        self.assertTrue(all(round(o["total_amount"] * 100) == totals[o["id"]] for o in orders))
+        menu = {m["id"]: m["restaurant_id"] for m in data.menu_items}
+        by_order = {o["id"]: o["restaurant_id"] for o in orders}
+        self.assertTrue(all(menu[i["menu_item_id"]] == by_order[i["order_id"]] for i in items))
+        print("✅ Data generator consistency test passed")
+
+    def test_skewed_distributions(self):
+        """Test popular restaurants and meal-time peaks"""
+        orders = [o for batch, _ in SyntheticData(5000, restaurants=50, days=14).rows() for o in batch]
+        per_restaurant = sorted(
+            (sum(1 for o in orders if o["restaurant_id"] == rid) for rid in range(1, 51)), reverse=True)
+        self.assertGreater(per_restaurant[0], 4 * per_restaurant[25])
+        meal_times = sum(1 for o in orders if o["created_at"][11:13] in ("12", "13", "18", "19", "20"))
+        self.assertGreater(meal_times, len(orders) * 0.4)
+        print("✅ Data generator distribution test passed")
+
+    def test_store_output_recovers(self):
+        """Test that the store format loads through the write-ahead log"""
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            write_store(SyntheticData(2000, restaurants=10, days=5), directory)
+            journal = WriteAheadLog(directory)
+            store = DataStore(**journal.recover(), journal=journal)
+            journal.close()
+        self.assertEqual(len(store.list_orders()), 2000)
+        self.assertEqual(len(store.list_restaurants()), 10)
+        self.assertTrue(all(o["order_items"] for o in store.list_orders()))
+        print("✅ Data generator store output test passed")
+
+
+class RestaurantFlowStartupTests(unittest.TestCase):
+    """Tests for the app factory and lazily built subsystems"""
+
+    def test_attach_catches_up_on_writes_during_build(self):
+        """Test that a structure built after startup sees every write exactly once"""
+        store = DataStore(restaurants_data, [dict(o) for o in orders_data], menu_items_data)
+        late = []
+
+        def build(pinned):
+            changes = ChangeLog(pinned)
+            # A write that lands while the structure is being built
+            late.append(store.create_order({"restaurant_id": 1, "customer_name": "Mid", "status": "pending", "total": 4.0}))
+            return changes
+
+        changes = store.attach(build)
+        start = changes.collections["orders"].horizon
+        store.create_order({"restaurant_id": 2, "customer_name": "After", "status": "pending", "total": 6.0})
+        delta = changes.since("orders", start)
+        self.assertEqual([o["customer_name"] for o in delta["created"]], ["Mid", "After"])
+        self.assertEqual(delta["updated"] + delta["deleted"], [])
+        print("✅ Attach catch-up test passed")
+
+    def test_lazy_subsystems_and_preload(self):
+        """Test that subsystems build on first use, or all at once with preload"""
+        import gc
+        app_services = main.Services(DataStore(restaurants_data, orders_data, menu_items_data))
+        lazies = {name: getattr(app_services, name) for name in ("menu_cache", "change_log", "approx_analytics", "geo_index")}
+        fresh = main.create_app(preload=False, app_services=app_services).test_client()
+        self.assertFalse(any(lazy.built for lazy in lazies.values()))
+        self.assertEqual(fresh.get('/api/menu-items/1').status_code, 200)
+        self.assertTrue(lazies["menu_cache"].built)
+        self.assertFalse(lazies["approx_analytics"].built)
+
+        try:
+            main.create_app(preload=True, app_services=app_services)
+        finally:
+            gc.unfreeze()
+        self.assertTrue(all(lazy.built for lazy in lazies.values()))
+        self.assertIsNotNone(app_services.chain_analytics._columns)
+        print("✅ Lazy startup test passed")
+
+    def test_apps_do_not_share_state(self):
+        """Test that each create_app call gets its own store and limits"""
+        first = main.create_app(preload=False)
+        second = main.create_app(preload=False)
+        created = json.loads(first.test_client().post('/api/orders', json={
+            "restaurant_id": 1, "customer_name": "Only here", "items": ["Naan"]}).data)
+        self.assertEqual(second.test_client().get(f"/api/orders/{created['id']}").status_code, 404)
+        for name in ("store", "job_manager", "chain_analytics", "rate_limiter", "admission"):
+            self.assertIsNot(getattr(first.extensions['restaurantflow'], name),
+                             getattr(second.extensions['restaurantflow'], name))
+        print("✅ App isolation test passed")
+
+
+    def test_importing_main_leaves_the_log_alone(self):
+        """Test that importing main (as spawned pool workers do) opens no store"""
+        import subprocess
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            wal_dir = os.path.join(directory, "wal")
+            env = dict(os.environ, WAL_DIR=wal_dir, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+            subprocess.run([sys.executable, "-c", "import main"], env=env, check=True)
+            self.assertFalse(os.path.exists(wal_dir))
+            with patch.dict(os.environ, {"WAL_DIR": wal_dir}):
+                first = main.create_app(preload=False)
+            self.assertTrue(os.listdir(wal_dir))
+            first.extensions['restaurantflow'].store._journal.close()
+        print("✅ Side-effect free import test passed")
+
+    def test_forked_change_log_never_reuses_etags(self):
+        """Test that a forked process moves change sequences past the parent's"""
+        store = DataStore(restaurants_data, [dict(o) for o in orders_data], menu_items_data)
+        changes = ChangeLog(store)
+        before = changes.seq("orders")
+        changes._restart()
+        self.assertGreater(changes.seq("orders"), before)
+        self.assertIsNone(changes.since("orders", before))
+        store.create_order({"restaurant_id": 1, "customer_name": "Child", "status": "pending", "total": 4.0})
+        self.assertNotEqual(changes.etag("orders"), f"orders-{before + 1}")
+        print("✅ Forked change log test passed")
+
+    def test_gunicorn_refuses_several_workers(self):
+        """Test that the gunicorn config fails fast with more than one worker"""
+        import runpy
+        config = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "2"}):
+            with self.assertRaises(SystemExit):
+                runpy.run_path(config)
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "1", "PRELOAD_APP": "1"}):
+            self.assertEqual(runpy.run_path(config)["workers"], 1)
+        print("✅ Gunicorn worker count test passed")
+
+
+class RestaurantFlowGeoTests(unittest.TestCase):
+    """Tests for the restaurant spatial index and delivery zones"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_nearby_matches_brute_force(self):
+        """Test that the ring search returns exactly the closest restaurants"""
+        import random
+        rng = random.Random(3)
+        restaurants = [{"id": i, "name": f"R{i}", "latitude": 40.7 + rng.uniform(-0.2, 0.2),
+                        "longitude": -74.0 + rng.uniform(-0.2, 0.2), "delivery_radius_km": rng.choice((2.0, 5.0))}
+                       for i in range(1, 3001)]
+        index = GeoIndex(DataStore(restaurants, [], []), cell_km=0.5)
+        for _ in range(25):
+            lat, lon = 40.7 + rng.uniform(-0.25, 0.25), -74.0 + rng.uniform(-0.25, 0.25)
+            expected = sorted((haversine_km(lat, lon, r["latitude"], r["longitude"]), r["id"]) for r in restaurants)
+            within = [rid for d, rid in expected if d <= 3.0][:10]
+            self.assertEqual([r["id"] for _, _, r in index.nearby(lat, lon, 3.0, limit=10)], within)
+            delivering = [rid for d, rid in expected if d <= restaurants[rid - 1]["delivery_radius_km"]][:5]
+            self.assertEqual([r["id"] for _, _, r in index.delivering_to(lat, lon, limit=5)], delivering)
+        print("✅ Geo nearby search test passed")
+
+    def test_index_follows_store_and_geocodes_addresses(self):
+        """Test that new restaurants are indexed, geocoded when they have no coordinates"""
+        geocoder = OfflineGeocoder()
+        self.assertEqual(geocoder.geocode("1 Main St"), geocoder.geocode(" 1 MAIN ST"))
+        self.assertLess(haversine_km(*geocoder.geocode("1 Main St"), 40.7128, -74.0060), 25.01)
+
+        store = DataStore([], [], [])
+        index = GeoIndex(store, geocoder, delivery_radius_km=4.0)
+        store.add_restaurant({"name": "Pinned", "latitude": 40.75, "longitude": -73.99})
+        store.add_restaurant({"name": "Geocoded", "address": "1 Main St"})
+        pinned, geocoded = store.list_restaurants()
+        self.assertEqual(index.location(pinned["id"]), (40.75, -73.99, 4.0))
+        self.assertEqual(index.location(geocoded["id"])[:2], geocoder.geocode("1 Main St"))
+        inside, distance = index.delivers(pinned["id"], 40.76, -73.99)
+        self.assertTrue(inside)
+        self.assertAlmostEqual(distance, 1.11, places=2)
+        self.assertFalse(index.delivers(pinned["id"], 40.80, -73.99)[0])
+        print("✅ Geo index update test passed")
+
+    def test_nearby_and_delivery_endpoints(self):
+        """Test the nearby and delivery zone endpoints"""
+        restaurant = services.store.list_restaurants()[0]
+        lat, lon, _ = services.geo_index.location(restaurant["id"])
+        response = self.app.get(f'/api/restaurants/nearby?lat={lat}&lon={lon}&radius=1')
+        self.assertEqual(response.status_code, 200)
+        nearest = json.loads(response.data)[0]
+        self.assertEqual(nearest["id"], restaurant["id"])
+        self.assertEqual(nearest["distance_km"], 0)
+        self.assertTrue(nearest["delivers"])
+        self.assertEqual(nearest["estimated_delivery_minutes"], 20)
+
+        response = self.app.get(f'/api/restaurants/{restaurant["id"]}/delivery?lat={lat + 0.5}&lon={lon}')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(json.loads(response.data)["delivers"])
+        self.assertEqual(self.app.get(f'/api/restaurants/99999/delivery?lat={lat}&lon={lon}').status_code, 404)
+        nowhere = services.store.add_restaurant({"name": "No Address"})
+        response = self.app.get(f'/api/restaurants/{nowhere["id"]}/delivery?lat={lat}&lon={lon}')
+        self.assertEqual(response.status_code, 422)
+        self.assertIn("address", json.loads(response.data)["error"])
+        for query in ('', 'lat=91&lon=0', f'lat={lat}&lon={lon}&radius=0', f'lat={lat}&lon={lon}&limit=500'):
+            self.assertEqual(self.app.get(f'/api/restaurants/nearby?{query}').status_code, 400)
+        self.assertEqual(self.app.get('/api/restaurants/nearby?address=1%20Main%20St').status_code, 200)
+        print("✅ Geo endpoints test passed")
+
+    def test_nearby_near_the_poles(self):
+        """Test that searches at the poles stay bounded and still find close restaurants"""
+        import time
+        index = GeoIndex(DataStore([{"id": 1, "latitude": 89.95, "longitude": 0.5},
+                                    {"id": 2, "latitude": 40.7, "longitude": -74.0}], [], []))
+        for lat in (89.9, 90, -90):
+            started = time.perf_counter()
+            found = index.nearby(lat, 0, 50)
+            self.assertLess(time.perf_counter() - started, 2)
+            self.assertEqual([r["id"] for _, _, r in found], [] if lat < 0 else [1])
+        for lat in (89.9, 90):
+            response = self.app.get(f'/api/restaurants/nearby?lat={lat}&lon=0&radius=50')
+            self.assertEqual(response.status_code, 200)
+        print("✅ Geo polar search test passed")
+
+    def test_nearby_across_the_antimeridian(self):
+        """Test that searches wrap around at 180 degrees longitude"""
+        index = GeoIndex(DataStore([{"id": 1, "latitude": -17.8, "longitude": 179.99},
+                                    {"id": 2, "latitude": -17.8, "longitude": -179.98}], [], []))
+        found = index.nearby(-17.8, -179.99, 5)
+        self.assertEqual([r["id"] for _, _, r in found], [2, 1])
+        self.assertLess(found[1][1], 2.2)
+        self.assertEqual([r["id"] for _, _, r in index.nearby(-17.8, 180, 2.5)], [1, 2])
+        self.assertTrue(index.delivers(1, -17.8, -179.99)[0])
+        print("✅ Geo antimeridian search test passed")
+
+    def test_nearby_query_speed(self):
+        """Test sub-millisecond lookups over 100k restaurants"""
+        import random
+        import time
+        rng = random.Random(5)
+        index = GeoIndex(DataStore([{"id": i, "latitude": 40.7 + rng.uniform(-0.2, 0.2),
+                                     "longitude": -74.0 + rng.uniform(-0.25, 0.25)} for i in range(1, 100001)], [], []))
+        started = time.perf_counter()
+        for i in range(200):
+            index.nearby(40.6 + i * 0.001, -74.1 + i * 0.001, 5.0, limit=20)
+            index.delivers(i + 1, 40.7, -74.0)
+        per_query = (time.perf_counter() - started) / 200
+        # Loose bound so slow CI machines pass; typically well under 1 ms
+        self.assertLess(per_query, 0.01)
+        print(f"✅ Geo query speed test passed ({per_query * 1000:.3f} ms)")
+
+
+class RestaurantFlowWALTests(unittest.TestCase):
+    """Durability tests for the write-ahead log"""
+
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def open_store(self):
+        journal = WriteAheadLog(self.tmp.name, checkpoint_every=10**9)
+        recovered = journal.recover()
+        if recovered is None:
+            return DataStore(restaurants_data, orders_data, menu_items_data, journal=journal), journal
+        return DataStore(**recovered, journal=journal), journal
+
+    def test_recovery_replays_snapshot_and_log_tail(self):
+        """Test that a restarted store sees every acknowledged write"""
+        store, journal = self.open_store()
+        store.checkpoint()
+        first = store.create_order({"restaurant_id": 1, "total": 9.5, "items": ["Naan"]})
+        store.checkpoint()
+        second = store.create_order({"restaurant_id": 2, "total": 20.0, "items": []})
+        store.update_order(first["id"], {"status": "completed"})
+        store.upsert_menu_item({"id": 2, "restaurant_id": 1, "name": "Naan", "price": 4.49, "category": "Bread"})
+        store.add_restaurant({"name": "Night Market", "address": "1 Late St", "phone": "555-0999", "cuisine": "Thai"})
+        store.remove_orders([2])
+        journal.close()
+
+        # Simulate a crash in the middle of the next append
+        segment = sorted(n for n in os.listdir(self.tmp.name) if n.startswith("wal-"))[-1]
+        with open(os.path.join(self.tmp.name, segment), "a") as f:
+            f.write('{"seq":99,"op":"order","da')
+
+        recovered, journal = self.open_store()
+        self.assertEqual(recovered.list_orders(), store.list_orders())
+        self.assertIsNone(recovered.get_order(2))
+        self.assertEqual(recovered.get_order(first["id"])["status"], "completed")
+        self.assertEqual(recovered.get_order(second["id"])["total"], 20.0)
+        self.assertEqual(recovered.list_menu_items(), store.list_menu_items())
+        self.assertEqual(recovered.list_restaurants(), store.list_restaurants())
+        self.assertEqual(recovered.dashboard(1), store.dashboard(1))
+
+        # New writes after recovery continue the sequence and survive another restart
+        third = recovered.create_order({"restaurant_id": 1, "total": 5.0, "items": []})
+        self.assertGreater(third["id"], second["id"])
+        journal.close()
+        again, journal = self.open_store()
+        self.assertEqual(again.get_order(third["id"])["total"], 5.0)
+        journal.close()
+        print("✅ WAL recovery test passed")
+
+    def test_ids_of_removed_orders_are_not_reused(self):
+        """Test that a restart after archiving the newest orders keeps handing out new ids"""
+        store, journal = self.open_store()
+        store.checkpoint()
+        newest = store.create_order({"restaurant_id": 1, "total": 5.0, "items": []})
+        store.remove_orders([newest["id"]])
+        journal.close()
+        recovered, journal = self.open_store()
+        self.assertGreater(recovered.create_order({"restaurant_id": 1, "total": 1.0, "items": []})["id"], newest["id"])
+
+        # The same holds once a checkpoint has dropped the log records
+        latest = recovered.create_order({"restaurant_id": 2, "total": 2.0, "items": []})
+        recovered.remove_orders([latest["id"]])
+        recovered.checkpoint()
+        journal.close()
+        again, journal = self.open_store()
+        self.assertGreater(again.create_order({"restaurant_id": 1, "total": 3.0, "items": []})["id"], latest["id"])
+        journal.close()
+        print("✅ Order id high-water mark test passed")
+
+
 def run_all_tests():
     """Run all backend tests and provide a summary"""
     print("🧪 Starting RestaurantFlow Backend Test Suite")
@@ -360,6 +1665,19 @@ def run_all_tests():
     # Add all test methods from RestaurantFlowBackendTestSuite
     test_suite.addTest(unittest.makeSuite(RestaurantFlowBackendTestSuite))
     test_suite.addTest(unittest.makeSuite(RestaurantFlowPerformanceTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowStoreTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowMenuCacheTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowPricingTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowRateLimitTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowJobTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowChainAnalyticsTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowSketchTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowArchiveTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowChangeTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowDataGenTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowStartupTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowGeoTests))
+    test_suite.addTest(unittest.makeSuite(RestaurantFlowWALTests))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
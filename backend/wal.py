@@ -0,0 +1,257 @@
+"""
+Write-ahead log for the RestaurantFlow_bhatiyani data store
+
+Every order, menu item and restaurant mutation is appended to the log as a
+full post-image (order removals as an ``order_deleted`` id) before it is
+acknowledged, so replaying the records in order rebuilds the store exactly.
+Concurrent writers share fsyncs (group commit): whoever finds no flush in
+progress syncs everything written so far and wakes the others. Periodic
+checkpoints write a compact JSON snapshot and drop the log segments it
+covers, so recovery only replays the snapshot plus the tail.
+
+The log assumes a single writing process; run gunicorn with one worker and
+several threads when ``WAL_DIR`` is enabled.
+"""
+
+import json
+import os
+import threading
+
+SEGMENT_PREFIX = "wal-"
+SNAPSHOT_PREFIX = "snapshot-"
+
+
+def _seq_from_name(name, prefix, suffix):
+    return int(name[len(prefix):-len(suffix)])
+
+
+def _list(directory, prefix, suffix):
+    names = [n for n in os.listdir(directory) if n.startswith(prefix) and n.endswith(suffix)]
+    return sorted(names, key=lambda n: _seq_from_name(n, prefix, suffix))
+
+
+def _replay(directory, contiguous=False):
+    """Replay the latest snapshot and the log after it.
+
+    Returns ``(state, last_seq, torn)``: ``state`` as documented on
+    ``WriteAheadLog.recover``, and ``torn`` as ``(segments, index, good
+    bytes)`` when a segment ends in a partial record. With ``contiguous``,
+    raises FileNotFoundError if a checkpoint removed log segments the chosen
+    snapshot does not cover.
+    """
+    collections = {"restaurant": {}, "order": {}, "menu_item": {}}
+    snapshot_seq = 0
+    last_order_id = 0
+    found = False
+    for name in reversed(_list(directory, SNAPSHOT_PREFIX, ".json")):
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        snapshot_seq = snapshot["seq"]
+        last_order_id = snapshot.get("last_order_id", 0)
+        for op, key in (("restaurant", "restaurants"), ("order", "orders"), ("menu_item", "menu_items")):
+            collections[op] = {row["id"]: row for row in snapshot[key]}
+        found = True
+        break
+
+    last_seq = snapshot_seq
+    torn = None
+    segments = _list(directory, SEGMENT_PREFIX, ".log")
+    if contiguous and segments and _seq_from_name(segments[0], SEGMENT_PREFIX, ".log") > snapshot_seq + 1:
+        raise FileNotFoundError(f"log segments after {snapshot_seq} were checkpointed away")
+    for index, name in enumerate(segments):
+        good = 0
+        with open(os.path.join(directory, name), "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                if record["seq"] <= snapshot_seq:
+                    continue
+                if record["op"] == "order_deleted":
+                    collections["order"].pop(record["data"]["id"], None)
+                else:
+                    collections[record["op"]][record["data"]["id"]] = record["data"]
+                if record["op"] in ("order", "order_deleted"):
+                    last_order_id = max(last_order_id, record["data"]["id"])
+                last_seq = record["seq"]
+                found = True
+            else:
+                continue
+        torn = (segments, index, good)
+        break
+
+    if not found:
+        return None, last_seq, torn
+    state = {
+        "restaurants": list(collections["restaurant"].values()),
+        "orders": sorted(collections["order"].values(), key=lambda o: o["id"]),
+        "menu_items": list(collections["menu_item"].values()),
+        "last_order_id": max([last_order_id, *collections["order"]]),
+    }
+    return state, last_seq, torn
+
+
+def read_state(directory, attempts=5):
+    """Store state as seen by another process, e.g. a background job.
+
+    Read-only: records the writer has not flushed yet, or a partial last
+    record, are not included. Retries when a concurrent checkpoint removes
+    files mid-read. Returns None when the directory holds no data yet.
+    """
+    for _ in range(attempts - 1):
+        try:
+            return _replay(directory, contiguous=True)[0]
+        except FileNotFoundError:
+            continue
+    return _replay(directory, contiguous=True)[0]
+
+
+class WriteAheadLog:
+    """Segmented append-only log with group commit and checkpoints."""
+
+    def __init__(self, directory, checkpoint_every=100_000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self._cond = threading.Condition()
+        self._file = None
+        self._written_seq = 0
+        self._durable_seq = 0
+        self._flushing = False
+        self._since_checkpoint = 0
+
+    # Files ---------------------------------------------------------------
+
+    def _list(self, prefix, suffix):
+        return _list(self.directory, prefix, suffix)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open_segment(self):
+        name = f"{SEGMENT_PREFIX}{self._written_seq + 1:012d}.log"
+        self._file = open(self._path(name), "a", encoding="utf-8", buffering=1 << 20)
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # Recovery ------------------------------------------------------------
+
+    def recover(self):
+        """Rebuild store state from the latest snapshot and the log tail.
+
+        Returns a dict with ``restaurants``, ``orders`` and ``menu_items``
+        lists and the highest order id ever assigned (``last_order_id``, so
+        ids of orders removed since are not handed out again), or None when
+        the directory holds no data yet. A torn record at
+        the end of the log (crash mid-write) is ignored. Must be called once,
+        before the first append.
+        """
+        state, last_seq, torn = _replay(self.directory)
+        if torn is not None:
+            # Torn write: cut the partial record so new appends stay readable
+            segments, index, good = torn
+            os.truncate(self._path(segments[index]), good)
+            for later in segments[index + 1:]:
+                os.remove(self._path(later))
+        self._written_seq = self._durable_seq = last_seq
+        self._open_segment()
+        return state
+
+    # Appends -------------------------------------------------------------
+
+    def append(self, op, data):
+        """Buffer a record and return its sequence number (not yet durable)."""
+        line = json.dumps({"seq": 0, "op": op, "data": data}, separators=(",", ":"))
+        with self._cond:
+            if self._file is None:
+                self._open_segment()
+            self._written_seq += 1
+            seq = self._written_seq
+            # Patch the placeholder instead of re-encoding under the lock
+            self._file.write(f'{{"seq":{seq}{line[8:]}\n')
+            self._since_checkpoint += 1
+            return seq
+
+    def sync(self, seq):
+        """Block until record ``seq`` has been fsynced to disk."""
+        with self._cond:
+            while self._durable_seq < seq:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flushing = True
+                target = self._written_seq
+                self._file.flush()
+                fd = self._file.fileno()
+                self._cond.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    self._durable_seq = max(self._durable_seq, target)
+                    self._cond.notify_all()
+
+    def needs_checkpoint(self):
+        return self._since_checkpoint >= self.checkpoint_every
+
+    # Checkpoints ---------------------------------------------------------
+
+    def roll(self):
+        """Start a new segment and return the last sequence in the old ones.
+
+        The caller must make sure no records are appended between capturing
+        the state it is going to checkpoint and calling this.
+        """
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+            self._durable_seq = self._written_seq
+            self._since_checkpoint = 0
+            self._open_segment()
+            return self._written_seq
+
+    def write_checkpoint(self, state, seq):
+        """Persist ``state`` as of ``seq`` and drop the segments it covers."""
+        name = f"{SNAPSHOT_PREFIX}{seq:012d}.json"
+        tmp = self._path(name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq, **state}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(name))
+        self._fsync_directory()
+
+        for old in self._list(SNAPSHOT_PREFIX, ".json"):
+            if _seq_from_name(old, SNAPSHOT_PREFIX, ".json") < seq:
+                os.remove(self._path(old))
+        for segment in self._list(SEGMENT_PREFIX, ".log"):
+            if _seq_from_name(segment, SEGMENT_PREFIX, ".log") <= seq:
+                os.remove(self._path(segment))
+
+    def close(self):
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            self._durable_seq = self._written_seq
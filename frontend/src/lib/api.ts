@@ -10,6 +10,8 @@ import {
   Order,
   SalesAnalytics,
   DashboardData,
+  ChangeSet,
+  NearbyRestaurant,
   CreateOrderForm,
   UpdateOrderForm,
   CreateRestaurantForm,
@@ -53,6 +55,16 @@ export const restaurantAPI = {
     return response.data
   },
 
+  /**
+   * Get restaurants near a point, nearest first.
+   */
+  getNearby: async (lat: number, lon: number, radius = 5, deliversOnly = false): Promise<NearbyRestaurant[]> => {
+    const response = await apiClient.get('/restaurants/nearby', {
+      params: { lat, lon, radius, delivers_only: deliversOnly || undefined },
+    })
+    return response.data
+  },
+
   /**
    * Create a new restaurant.
    */
@@ -131,6 +143,14 @@ export const menuItemAPI = {
     await apiClient.delete(`/menu-items/${id}`)
   },
 
+  /**
+   * Get menu items created, updated or deleted after sequence number `since`.
+   */
+  getChanges: async (since: number): Promise<ChangeSet<MenuItem>> => {
+    const response = await apiClient.get(`/menu-items?since=${since}`)
+    return response.data
+  },
+
   /**
    * Get menu categories for a restaurant.
    */
@@ -161,6 +181,14 @@ export const orderAPI = {
     return response.data
   },
 
+  /**
+   * Get orders created, updated or deleted after sequence number `since`.
+   */
+  getChanges: async (since: number): Promise<ChangeSet<Order>> => {
+    const response = await apiClient.get(`/orders?since=${since}`)
+    return response.data
+  },
+
   /**
    * Get order by ID.
    */
@@ -10,6 +10,9 @@ export interface Restaurant {
   phone: string;
   email: string;
   description?: string;
+  latitude?: number;
+  longitude?: number;
+  delivery_radius_km?: number;
   is_active: boolean;
   created_at: string;
   updated_at: string;
@@ -139,6 +142,21 @@ export interface PaginatedResponse<T> {
   limit: number;
 }
 
+// Delta sync: rows changed after `since`; `full` means `created` holds the whole collection
+export interface ChangeSet<T> {
+  seq: number;
+  full: boolean;
+  created: T[];
+  updated: T[];
+  deleted: number[];
+}
+
+export interface NearbyRestaurant extends Restaurant {
+  distance_km: number;
+  delivers: boolean;
+  estimated_delivery_minutes: number | null;
+}
+
 // Form types
 export interface CreateOrderForm {
   restaurant_id: number;